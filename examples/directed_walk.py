@@ -1,6 +1,4 @@
 
-from random import randint
-
 from simulated_agency.simulation import Simulation
 from simulated_agency.agents import Mobile
 from simulated_agency.states import *
@@ -9,6 +7,10 @@ from simulated_agency.states import *
 # Initialise simulation
 simulation = Simulation(name='DirectedWalk')
 
+# Walkers all head for the same target, so they can
+# share one distance field and route around each other
+simulation.routing_strategy = 'flow_field'
+
 # Create custom version of base agent model
 class Walker(Mobile):
     # Allow two Walkers to occupy the same location
@@ -31,7 +33,7 @@ def maybe_move_target():
     ''' Change the target from time to time '''
     change_target = False
     target_location = None
-    dice_roll = randint(1, 50)
+    dice_roll = simulation.rng.randint(1, 50)
     if dice_roll == 1:
         change_target = True
         target_location = simulation.random_location()
@@ -1,5 +1,5 @@
 
-from random import randint, choice
+from math import log
 
 from simulated_agency.simulation import Simulation
 from simulated_agency.agents import Locatable as Tree
@@ -7,6 +7,23 @@ from simulated_agency import glyphs
 from simulated_agency.states import State
 
 
+# Chance each tick of a tree being struck by lightning,
+# and otherwise of it trying to spawn another tree
+LIGHTNING = 1 / 100
+SPAWNING = 1 / 10
+
+# Chance each tick of either of those happening
+EVENTFUL = LIGHTNING + (1 - LIGHTNING) * SPAWNING
+
+
+def quiet_ticks(chance):
+    '''
+    How many ticks pass before something with
+    this chance each tick next happens
+    '''
+    return int(log(1 - simulation.rng.random()) / log(1 - chance))
+
+
 # Define some custom states for this simulation
 
 class NotOnFire(State):
@@ -18,37 +35,47 @@ class NotOnFire(State):
     colour = (0, 255, 0)
     glyph = glyphs.BLACK_UP_POINTING_TRIANGLE
 
+    # Set once the tree has slept through the quiet
+    # ticks, so that something is sure to happen
+    due = False
 
     def handle(self):
         '''
         A tree not on fire may:
         (a) try to create a new adjancent tree
         (b) spontaneously set on fire (i.e. lightning strike)
+
+        Most ticks neither happens, so rather than rolling the dice
+        every tick the tree works out how many quiet ticks there will
+        be before something does, and sleeps through them.
         '''
         
         super().handle()
 
         tree = self.agent
 
-       
-        # Did lightning strike?
-        if randint(1, 100) == 1:
-            # Oh no! The tree was struck by lightning.
-            # It will burn for a variable amount of time.
-            tree.replace_state(OnFire, timer=randint(6,10))
-            return
+        if self.due or self.rng.bernoulli(EVENTFUL):
 
-        # Did the tree spawn another tree?
-        if randint(1, 10) == 1:
-            # Trees aren't fertile until they are 3
-            if tree.age < 3:
+            # Did lightning strike?
+            if self.rng.bernoulli(LIGHTNING / EVENTFUL):
+                # Oh no! The tree was struck by lightning.
+                # It will burn for a variable amount of time.
+                tree.replace_state(OnFire, timer=self.rng.randint(6, 10))
                 return
-            # Pick a direction to try to spread in
-            location = choice(tuple(tree.location.neighbourhood()))
-            # If that location is empty, spawn a new tree there
-            Tree(location, NotOnFire)
 
-            
+            # Otherwise the tree spawns another tree,
+            # but trees aren't fertile until they are 3
+            if tree.age >= 3:
+                # Pick a direction to try to spread in
+                index = self.rng.choice(tree.location.neighbourhood_indices())
+                location = simulation.world.location(index)
+                # If that location is empty, spawn a new tree there
+                Tree(location, NotOnFire)
+
+        # Sleep until the next thing happens. Being set
+        # on fire by a neighbour will wake the tree up.
+        self.due = True
+        tree.sleep(ticks=quiet_ticks(EVENTFUL))
 
 
 class OnFire(State):
@@ -89,9 +116,9 @@ class OnFire(State):
 
         # See if the fire spreads to neighbouring trees that are not on fire already
         for target in [t for t in tree.location.neighbours() if not t.is_in_state(OnFire)]:
-            if randint(1, 4) == 1:
+            if self.rng.bernoulli(1 / 4):
                 # The tree_to_burn will burn for a variable amount of time
-                target.replace_state(OnFire, timer=randint(6, 10))
+                target.replace_state(OnFire, timer=self.rng.randint(6, 10))
 
     def handle_timeout(self):
         ''' When tree is finished burning we should remove it from the simulation '''
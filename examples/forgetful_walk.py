@@ -1,6 +1,4 @@
 
-from random import randint
-
 from simulated_agency.simulation import Simulation
 from simulated_agency.agents import Mobile as ForgetfulWalker
 from simulated_agency.states import *
@@ -16,7 +14,7 @@ simulation.bind(ForgetfulWalker)
 target_location = simulation.random_location()
 
 # Add some walkers to the simulation
-simulation.seed(ForgetfulWalker, 0.1, MoveTowardsLocation, location=target_location, timer=randint(10,30))
+simulation.seed(ForgetfulWalker, 0.1, MoveTowardsLocation, location=target_location, timer=simulation.rng.randint(10,30))
 
 # Define a function to run at the start of every loop.
 # You only need to do this if you want to introduce
@@ -26,7 +24,7 @@ def maybe_move_target():
     ''' Change the target from time to time '''
     change_target = False
     target_location = None
-    dice_roll = randint(1, 100)
+    dice_roll = simulation.rng.randint(1, 100)
     if dice_roll == 1:
         change_target = True
         target_location = simulation.random_location()
@@ -49,8 +47,8 @@ def update_agent_target(walker, maybe_move_target_return_vars):
         # and then (3) forget what they are doing and MoveRandomly (until this code
         # branch is executed again by the target changing).
         walker.add_state(MoveRandomly)
-        walker.add_state(MoveTowardsLocation, location=target_location, timer=randint(10,30))
-        walker.add_state(Wait, timer=randint(1, 10))
+        walker.add_state(MoveTowardsLocation, location=target_location, timer=simulation.rng.randint(10,30))
+        walker.add_state(Wait, timer=simulation.rng.randint(1, 10))
 
 # Run the simulation
 simulation.execute(before_each_loop=maybe_move_target, before_each_agent=update_agent_target, draw_locations=False)
@@ -1,57 +1,39 @@
 
 from simulated_agency.simulation import Simulation
 from simulated_agency.agents import Locatable as Cell
-from simulated_agency.states import State
+from simulated_agency.states import Rule, State
 
 
 # Define some custom states for this simulation
 
 class Alive(State):
     '''
-    Represents a Cell that is alive
+    Represents a Cell that is alive.
+    Any live Cell with two or three live neighbours remains alive.
+    Otherwise the Cell dies.
     '''
 
     name = 'ALIVE'
     colour = (255, 255, 255)
+    rules = [Rule('Dead', counting='Alive', count_not_in=(2, 3))]
 
     def handle(self):
-        '''
-        Any live Cell with two or three live neighbours remains alive.
-        Otherwise the Cell dies.
-        '''
-        
         super().handle()
 
-        agent = self.agent
-
-        neighbour_count = len([x for x in agent.location.neighbours() if x.is_in_state(Alive)])
-        
-        if neighbour_count not in [2, 3]:
-            agent.replace_state(Dead)
-
 
 class Dead(State):
     '''
-    Represents a Cell that is dead
+    Represents a Cell that is dead.
+    Any dead Cell with exactly three live neighbors becomes a live Cell.
     '''
 
     name = 'DEAD'
     colour = (0, 0, 0)
+    rules = [Rule('Alive', counting='Alive', count_in=(3,))]
 
     def handle(self):
-        '''
-        Any dead Cell with exactly three live neighbors becomes a live Cell.
-        '''
-        
         super().handle()
 
-        agent = self.agent
-
-        neighbour_count = len([x for x in agent.location.neighbours() if x.is_in_state(Alive)])
-        
-        if neighbour_count == 3:
-            agent.replace_state(Alive)
-
 
 
 # Initialise simulation
@@ -13,6 +13,11 @@ simulation.bind(Walker)
 # Add obstacle
 simulation.create_obstruction_rectangle(5, 10, 20, 5)
 
+# Add some walkers which head for places of their own,
+# finding their way around the obstacle
+for _ in range(50):
+    simulation.seed(Walker, 1, MoveTowardsLocation, location=simulation.random_location(), routing='hpa')
+
 # Add some walkers to the simulation
 simulation.seed(Walker, 0.3, MoveRandomly)
 
@@ -1,11 +1,16 @@
 
-from random import choice, randint
+import numpy as np
 
 from simulated_agency.simulation import Simulation
-from simulated_agency.agents import Mobile
+from simulated_agency.agents import Column, Mobile
 from simulated_agency.states import *
 
 
+# Targets worked out for the whole population at the start
+# of each tick (see plan_targets at the bottom of this file)
+plan = {'wolf_targets': {}, 'nearest_wolves': {}}
+
+
 class WolfChasingTarget(State):
     '''
     A wolf in this state will move towards its
@@ -19,8 +24,12 @@ class WolfChasingTarget(State):
 
     def handle(self):
         super().handle()
-        target = self.context['target']
         agent = self.agent
+        # We hold a reference to the target, which tells us if it's gone
+        target = self.context['target'].get()
+        if target is None:
+            agent.replace_state(WolfSelectingTarget)
+            return
         agent.move_towards_target(target, adjacent_ok=True)
         # Can it kill the sheep it is chasing?
         neighbours = agent.location.neighbours()
@@ -31,7 +40,7 @@ class WolfChasingTarget(State):
         else:
             careless_sheep = [s for s in neighbours if isinstance(s, Sheep)]
             if careless_sheep:
-                target = choice(careless_sheep)
+                target = self.rng.choice(careless_sheep)
                 target.replace_state(Dead)
                 agent.replace_state(WolfSelectingTarget)
 
@@ -48,20 +57,29 @@ class WolfSelectingTarget(State):
 
     def handle(self):
         super().handle()
-        target_list = Sheep.objects
-        # Wolves will only chase Sheep that are alive
-        live_target_list = [x for x in target_list if not x.is_in_state(Dead)]
+        agent = self.agent
+        # Use the planned target, unless it has been killed since
+        target = plan['wolf_targets'].get(agent)
+        if target is None or target.is_in_state(Dead):
+            # Wolves will only chase Sheep that are alive
+            target = agent.nearest(Sheep, where=SheepAlive)
         # Choose target
-        if live_target_list:
-            # Choose the nearest live target and pursue it
-            target = self.agent.nearest(live_target_list)
-            self.agent.add_state(WolfChasingTarget, target=target)
+        if target is not None:
+            # Pursue the nearest live target
+            self.agent.add_state(WolfChasingTarget, target=target.ref)
         else:
             # No sheep left to chase
             self.agent.add_state(MoveRandomly)
 
 
-class SheepGrazing(State):
+class SheepAlive(State):
+    '''
+    Every state of a live sheep derives from this, so that
+    wolves can search for sheep which are SheepAlive.
+    '''
+
+
+class SheepGrazing(SheepAlive):
     '''
     Sheep that are grazing occasionally move around.
     But mainly they are recovering their energy.
@@ -77,16 +95,19 @@ class SheepGrazing(State):
         if agent.energy < 5:
             agent.energy += 1
         # Is there a wolf nearby?
-        nearest_wolf = agent.nearest(Wolf, radius=3)
+        if agent in plan['nearest_wolves']:
+            nearest_wolf = plan['nearest_wolves'][agent]
+        else:
+            nearest_wolf = agent.nearest(Wolf, radius=3)
         if nearest_wolf:
             agent.replace_state(SheepFleeing, enemy=nearest_wolf)
             return
         # Occasionally move
-        if randint(1, 10) <= 3:
+        if self.rng.bernoulli(0.3):
             self.agent.move_randomly()
 
 
-class SheepFleeing(State):
+class SheepFleeing(SheepAlive):
     '''
     Sheep that are fleeing will do so until they tire.
     '''
@@ -115,7 +136,7 @@ class SheepFleeing(State):
 simulation = Simulation(name='SheepAndWolves')
 
 # Use same base model for two types of object
-class Sheep(Mobile): energy = 5
+class Sheep(Mobile): energy = Column(np.int8, default=5)
 class Wolf(Mobile): pass
 
 # Bind models to simulation
@@ -127,5 +148,17 @@ simulation.seed(Sheep, 0.15, SheepGrazing)
 # Add some wolves to the simulation
 simulation.seed(Wolf, 20, WolfSelectingTarget)
 
+# Work out the nearest targets for everyone in one go at the start
+# of each tick, rather than with one query per agent
+def plan_targets():
+    selecting_wolves = list(simulation.agents_in_state(Wolf, WolfSelectingTarget))
+    plan['wolf_targets'] = dict(zip(
+        selecting_wolves, simulation.nearest_many(selecting_wolves, Sheep, where=SheepAlive)
+    ))
+    grazing_sheep = list(simulation.agents_in_state(Sheep, SheepGrazing))
+    plan['nearest_wolves'] = dict(zip(
+        grazing_sheep, simulation.nearest_many(grazing_sheep, Wolf, radius=3)
+    ))
+
 # Run the simulation
-simulation.execute(draw_locations=False)
+simulation.execute(before_each_loop=plan_targets, draw_locations=False)
@@ -0,0 +1,64 @@
+'''
+Reports how much memory a fully populated world takes,
+in bytes per location and per agent.
+
+Usage:
+    PYTHONPATH=. python scripts/memory_benchmark.py [size]
+
+The world is size x size (1000 x 1000 by default), with one agent in
+every location, as made by seed_all.
+'''
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from simulated_agency.agents import Locatable
+from simulated_agency.simulation import Simulation
+from simulated_agency.states import Dead, MoveRandomly
+
+
+def measure(size):
+    gc.collect()
+    tracemalloc.start()
+
+    started = time.perf_counter()
+    simulation = Simulation(width=size, height=size)
+
+    class Cell(Locatable):
+        pass
+
+    simulation.bind(Cell)
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    # Every location view
+    world = simulation.world
+    for index in range(world.size):
+        world.location(index)
+    after_locations = tracemalloc.get_traced_memory()[0]
+
+    # An agent in every location
+    simulation.seed_all(Cell, [Dead, MoveRandomly])
+    after_agents = tracemalloc.get_traced_memory()[0]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    cells = size * size
+    return {
+        'cells': cells,
+        'bytes_per_location': (after_locations - baseline) / cells,
+        'bytes_per_agent': (after_agents - after_locations) / len(Cell.objects),
+        'total_mb': after_agents / 2 ** 20,
+        'peak_mb': peak / 2 ** 20,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    results = measure(size)
+    print('%(cells)s cells in %(seconds).1fs' % results)
+    print('%(bytes_per_location)8.1f bytes per location' % results)
+    print('%(bytes_per_agent)8.1f bytes per agent' % results)
+    print('%(total_mb)8.1f MB in total (peak %(peak_mb).1f MB)' % results)
@@ -1,3 +1,6 @@
+from .buffered import *
+from .column import *
+from ..slot_map import Handle, SlotMap
 
 from .locatable import *
 from .mobile import *
@@ -0,0 +1,34 @@
+class Buffered(object):
+    '''
+    An agent attribute which is double buffered in synchronous execution
+    (see DoubleBuffer), so that every agent sees the values as they were
+    at the start of the tick, and all the changes are applied together.
+
+    Example:
+        class Sheep(Mobile):
+            energy = Buffered(5)
+
+    Outside synchronous execution it behaves like any other attribute.
+    '''
+
+    def __init__(self, default=None):
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Buffered(%s)' % self.name
+
+    def __get__(self, agent, owner):
+        if agent is None:
+            return self
+        return agent.__dict__.get(self.name, self.default)
+
+    def __set__(self, agent, value):
+        buffer = agent.simulation.buffer
+        if buffer.active:
+            buffer.write(agent, self.name, value)
+        else:
+            agent.__dict__[self.name] = value
@@ -0,0 +1,48 @@
+class Column(object):
+    '''
+    An agent attribute which is stored in a NumPy array shared by every
+    agent of the class, indexed by the agents' slots (see SlotMap),
+    rather than on each agent.
+
+    Example:
+        class Sheep(Mobile):
+            energy = Column(np.int8, default=5)
+
+    sheep.energy reads and writes the sheep's entry like any other
+    attribute, while Sheep.objects.column('energy') is the whole array,
+    so that the population can be updated in one go:
+
+        grazing = Sheep.objects.slots(simulation.agents_in_state(Sheep, SheepGrazing))
+        Sheep.objects.column('energy')[grazing] += 1
+
+    Like Buffered attributes, columns are double buffered in
+    synchronous execution (see DoubleBuffer).
+    '''
+
+    def __init__(self, dtype, default=0):
+        self.dtype = dtype
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Column(%s)' % self.name
+
+    def __get__(self, agent, owner):
+        if agent is None:
+            return self
+        if agent.destroyed:
+            # Our slot may belong to somebody else by now
+            return agent.__dict__.get(self.name, self.default)
+        return agent.objects.columns[self.name].item(agent.slot)
+
+    def __set__(self, agent, value):
+        buffer = agent.simulation.buffer
+        if buffer.active:
+            buffer.write(agent, self.name, value)
+        elif agent.destroyed:
+            agent.__dict__[self.name] = value
+        else:
+            agent.objects.columns[self.name][agent.slot] = value
@@ -21,21 +21,24 @@ class Locatable(Stateful):
     def __init__(self, initial_location, initial_state=None, **kwargs):
         super().__init__(initial_state, **kwargs)     
         self.location = initial_location
-        self.location.contents.append(self)
+        self.location.add(self)
 
     def __repr__(self):
         return 'Locatable %s at (%s, %s)' % (self._state_stack.peek(), self.location.x, self.location.y)
         
     def destroy(self):
-        # The object may have been destroyed already
-        # this turn, so we proceed carefully
-        try:
-            self.location.contents.remove(self)
-        except:
-            pass
+        # The object may have been destroyed already this turn
+        if self.destroyed:
+            return
+        self.location.remove(self)
         # We need to delete the object last
         super().destroy()
 
+    @property
+    def rng(self):
+        ''' The random numbers of the simulation our location is in '''
+        return self.location.world.simulation.rng
+
     #
     # Distance functions
     #
@@ -50,7 +53,7 @@ class Locatable(Stateful):
         '''
         return self.simulation.distance_between(self, other)
 
-    def nearest(self, candidate_list, radius=None):
+    def nearest(self, candidate_list, radius=None, where=None):
         ''' Returns the nearest of the candidates
         '''
-        return self.simulation.nearest(self, candidate_list, radius=radius)
+        return self.simulation.nearest(self, candidate_list, radius=radius, where=where)
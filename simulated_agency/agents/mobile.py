@@ -1,6 +1,4 @@
-
 from collections import defaultdict
-from random import choice, choices, randint
 
 from ..location import Location
 from ..states import State, MoveRandomly
@@ -27,11 +25,9 @@ class Mobile(Locatable):
         Internal method to perform a known-successful relocation.
         Use move_to_location instead of calling this directly.
         '''
-        # Remove from current location
-        self.location.contents.remove(self)
-        # Add to new location
+        # Move between locations in one step
+        new_location.world.move(self.location.index, new_location.index, self)
         self.location = new_location
-        new_location.contents.append(self)
 
     def move_to_location(self, new_location, alt_moves=[], alt_moves_final=[]):
         '''
@@ -48,37 +44,61 @@ class Mobile(Locatable):
         elif alt_moves:
             viable_alt_moves = [alt for alt in alt_moves if alt is None or alt.can_fit(self)]
             if viable_alt_moves:
-                new_location = choice(viable_alt_moves)
+                new_location = self.rng.choice(viable_alt_moves)
             elif alt_moves_final:
                 # Select from the moves of last resort
                 viable_alt_moves_final = [alt for alt in alt_moves_final if alt is None or alt.can_fit(self)]
                 if viable_alt_moves_final:
-                    new_location = choice(viable_alt_moves_final)
+                    new_location = self.rng.choice(viable_alt_moves_final)
             # None means stay put
             if new_location is not None:
                 self._relocate(new_location)
 
-    def move_towards_location(self, location, adjacent_ok=False):
+    def move_towards_location(self, location, adjacent_ok=False, routing=None):
 
         # If it is OK to stop when adjacent then do so
         if adjacent_ok:
             if self.location in location.neighbourhood():
                 return
 
-        self.move_towards(location.x, location.y)
+        self.move_along_route(location, routing)
 
-    def move_towards_target(self, target, adjacent_ok=False):
+    def move_towards_target(self, target, adjacent_ok=False, routing=None):
 
         # If it is OK to stop when adjacent then do so
         if adjacent_ok:
             if self.location in target.location.neighbourhood():
                 return
         
-        self.move_towards(target.location.x, target.location.y)
+        self.move_along_route(target.location, routing)
+
+    def move_along_route(self, location, routing=None):
+        '''
+        Move towards a location using a routing strategy,
+        which defaults to the simulation's routing_strategy
+        '''
+
+        routing = routing or self.simulation.routing_strategy
+
+        if routing != 'greedy':
+            steps = self.simulation.next_steps(self.location, location, routing)
+            # No route means we fall back to greedy movement
+            if steps is not None:
+                # Prefer moves which bring us closer, then moves
+                # which at least don't take us further away
+                for options in steps:
+                    for option in options:
+                        if option.can_fit(self):
+                            self._relocate(option)
+                            return
+                return
+
+        self.move_towards(location.x, location.y)
 
     def move_randomly(self):
-        location = choice(tuple(self.location.neighbourhood()))
-        self.move_towards_location(location)
+        location = self.location
+        location = location.world.location(self.rng.choice(location.neighbourhood_indices()))
+        self.move_towards(location.x, location.y)
 
     def move_away_from_target(self, target):
         '''
@@ -104,7 +124,7 @@ class Mobile(Locatable):
 
         # Choose randomly from desirable locations
         if desirable_locations:
-            new_location = choice(desirable_locations)
+            new_location = self.rng.choice(desirable_locations)
             self.move_to_location(new_location)
         else:
             # There are no suitable moves
@@ -127,12 +147,12 @@ class Mobile(Locatable):
         # on the magnitudes of the component parts of the vector
         #
 
-        selections = choices(
+        selections = self.rng.choices(
             [ self.move_horizontal, self.move_vertical ],
             weights=[abs(dx), abs(dy)]    
         )
 
-        # Note that random.choices returns a list
+        # Note that rng.choices returns a list
         # (and assumes k=1 selections unless told otherwise)
         move_to_make = selections[0]
 
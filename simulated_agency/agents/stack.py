@@ -1,27 +1,66 @@
-
 class Stack(object):
     '''
     Simple stack implementation.
     Used to manage agent states.
+
+    Most agents only ever have one state, so the top item is
+    held inline and a list is only made for the items below it.
     '''
 
+    __slots__ = ('_top', '_below')
+
     def __init__(self):
-        self.items = []
+        self._top = None
+        self._below = None
+
+    @property
+    def items(self):
+        ''' The items, from the bottom of the stack to the top '''
+        if self._top is None:
+            return []
+        if not self._below:
+            return [self._top]
+        return self._below + [self._top]
+
+    @items.setter
+    def items(self, items):
+        self._top = items[-1] if items else None
+        self._below = list(items[:-1]) or None
 
     def is_empty(self):
-        return self.items == []
+        return self._top is None
 
     def push(self, item):
-        self.items.append(item)
+        if self._top is not None:
+            if self._below is None:
+                self._below = [self._top]
+            else:
+                self._below.append(self._top)
+        self._top = item
 
     def pop(self):
-        return self.items.pop()
+        item = self._top
+        if item is None:
+            raise IndexError('pop from empty stack')
+        self._top = self._below.pop() if self._below else None
+        return item
 
     def peek(self):
-        return self.items[len(self.items)-1]
+        if self._top is None:
+            raise IndexError('peek at empty stack')
+        return self._top
 
     def size(self):
-        return len(self.items)
+        if self._top is None:
+            return 0
+        return len(self._below) + 1 if self._below else 1
 
     def flush(self):
-        self.items = []
+        self._top = None
+        self._below = None
+
+    def copy(self):
+        stack = Stack()
+        stack._top = self._top
+        stack._below = list(self._below) if self._below else None
+        return stack
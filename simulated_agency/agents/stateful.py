@@ -1,4 +1,5 @@
 
+from ..slot_map import Handle
 from ..states import *
 from .types import *
 from .stack import *
@@ -11,6 +12,9 @@ class Stateful(object, metaclass=HasOwnObjectList):
     '''
 
     simulation = None
+    destroyed = False
+    # The state to fall back on when the stack is empty
+    default_state = MoveRandomly
 
     def __init__(self, initial_state=None, **kwargs):
         # Ensure simulation is set
@@ -18,27 +22,52 @@ class Stateful(object, metaclass=HasOwnObjectList):
             raise Exception("Creatable objects must have 'simulation' property set!")
         # Track agent age
         self.age = 0
-        # Init
-        self.objects.append(self)
+        # Init, keeping our slot in objects (see ref)
+        self.slot = self.objects.add(self).slot
         self._state_stack = Stack()
-        # Default state
-        self.default_state = MoveRandomly
+        # Join the active set (see Scheduler)
+        self.simulation.scheduler.added(self)
         # Initial state
         if initial_state:
             self.add_state(initial_state, **kwargs)
 
+    @property
+    def ref(self):
+        ''' A reference (see Handle) which can tell when we've been destroyed '''
+        if self.destroyed:
+            # Our slot may belong to somebody else by now
+            return Handle(self.objects, self.slot, None)
+        return self.objects.handle(self.slot)
+
     def destroy(self):
-        # The object may have been destroyed already
-        # this turn, so we proceed carefully
+        '''
+        Take the agent out of the simulation. It disappears from
+        `objects` at once, and isn't executed again, but is only
+        purged from the list at the end of the tick (see SlotMap)
+        '''
+        # The object may have been destroyed already this turn
+        if self.destroyed:
+            return
+        # Hang on to our column values, since our slot will be reused
+        for name in self.objects.columns:
+            self.__dict__[name] = getattr(self, name)
+        self.destroyed = True
+        self.objects.discard(self.objects.handle(self.slot))
+        # The rest may not have been set up yet, so we proceed carefully
         try:
-            self.objects.remove(self)
-            del self
+            if not self._state_stack.is_empty():
+                self._top_state()._stop_timer()
+            self.simulation.scheduler.removed(self)
+            self.simulation.buffer.discard(self)
+            self.simulation.memberships.update(self, self._top_state(), None)
+            for state in self._state_stack.items:
+                self.simulation.state_pool.retire(state)
         except:
             pass
 
     def execute(self):
         if self._state_stack.is_empty():
-            self._state_stack.push(self.default_state)
+            self.add_state(self.default_state)
         # Delegate to state machine
         self._state_stack.peek().handle()
 
@@ -49,35 +78,115 @@ class Stateful(object, metaclass=HasOwnObjectList):
         ''' Return the top entry of the state stack '''
         return self._state_stack.peek()
 
+    def _top_state(self):
+        ''' Return the top entry of the state stack, or None if it is empty '''
+        return self._state_stack._top
+
+    def _writable_stack(self):
+        '''
+        Return the state stack that changes should be made to, which
+        during synchronous execution is the double buffer's copy
+        '''
+        if self.simulation.buffer.active:
+            return self.simulation.buffer.stack(self)
+        return self._state_stack
+
+    def _state_changed(self, old_state):
+        ''' Keep the simulation's state memberships up to date '''
+        scheduler = self.simulation.scheduler
+        if scheduler.dormant:
+            # A new state means new behaviour, and something for
+            # any dormant agents watching us to wake up for
+            scheduler.wake(self)
+            location = getattr(self, 'location', None)
+            if location is not None:
+                scheduler.disturb(location.index)
+        if self in self.simulation.buffer.stacks:
+            # Brought up to date when the buffer is committed
+            return
+        self._top_changed(old_state)
+
+    def _top_changed(self, old_state):
+        '''
+        Keep the simulation's state memberships up to date, and only
+        run the timer of the state at the top of the stack
+        '''
+        new_state = self._top_state()
+        if old_state is not new_state:
+            if old_state is not None:
+                old_state._stop_timer()
+            if new_state is not None:
+                new_state._start_timer()
+        self.simulation.memberships.update(self, old_state, new_state)
+
+    def _new_state(self, state_class, kwargs):
+        ''' Returns a new state instance, recycled where possible (see StatePool) '''
+        return self.simulation.state_pool.create(state_class, self, kwargs)
+
     def replace_state(self, state_class, **kwargs):
         ''' Replace the top entry of the state stack with a new state '''
-        state_instance = state_class(self, **kwargs)
-        if self._state_stack.size():
-            self._state_stack.pop()
-        self._state_stack.push(state_instance)
+        state_instance = self._new_state(state_class, kwargs)
+        self.replace_state_instance(state_instance)
 
     def replace_state_instance(self, state_instance):
         ''' Replace the top entry of the state stack with a new state '''
-        if self._state_stack.size():
-            self._state_stack.pop()
-        self._state_stack.push(state_instance)
+        old_state = self._top_state()
+        stack = self._writable_stack()
+        if stack.size():
+            self.simulation.state_pool.retire(stack.pop())
+        stack.push(state_instance)
+        self._state_changed(old_state)
 
     def add_state(self, state_class, **kwargs):
         ''' Change state by addind a new state to the state stack '''
-        state_instance = state_class(self, **kwargs)
-        self._state_stack.push(state_instance)
+        state_instance = self._new_state(state_class, kwargs)
+        old_state = self._top_state()
+        self._writable_stack().push(state_instance)
+        self._state_changed(old_state)
 
     def remove_state(self):
         ''' Change state by removing the top state from the stack '''
-        self._state_stack.pop()
+        stack = self._writable_stack()
+        old_state = stack.pop()
+        self.simulation.state_pool.retire(old_state)
         # Ensure there's always something in the state stack
-        if self._state_stack.is_empty():
-            self.add_state(self.default_state)
+        if stack.is_empty():
+            stack.push(self._new_state(self.default_state, {}))
+        self._state_changed(old_state)
 
     def flush_state_stack(self):
         ''' Remove all states and replace with default state '''
-        self._state_stack.flush()
-        self._state_stack.push(self.default_state)
+        old_state = self._top_state()
+        stack = self._writable_stack()
+        for state in stack.items:
+            self.simulation.state_pool.retire(state)
+        stack.flush()
+        stack.push(self._new_state(self.default_state, {}))
+        self._state_changed(old_state)
+
+    #
+    # Scheduling
+    #
+
+    def sleep(self, ticks=None, watch=None):
+        '''
+        Stop being executed until woken up (see Scheduler), optionally
+        after a number of ticks, or when anything changes within a
+        radius of our location (0 meaning our own location)
+        '''
+        self.simulation.scheduler.sleep(self, ticks, watch)
+
+    def wake(self):
+        ''' Start being executed again '''
+        self.simulation.scheduler.wake(self)
+
+    def is_dormant(self):
+        return self.simulation.scheduler.is_dormant(self)
+
+    @property
+    def rng(self):
+        ''' The simulation's random numbers (see Random) '''
+        return self.simulation.rng
 
     def colour(self):
         return self._state_stack.peek().colour
@@ -1,10 +1,13 @@
+from ..slot_map import SlotMap
+from .column import Column
+
 
 class HasOwnObjectList(type):
     '''
     Metaclass to ensure that each class derived from
     the Stateful class has it's own copy of an
-    `objects` list. Otherwise the derived classes would
-    share the same list, which isn't what you'd want.
+    `objects` list (a SlotMap). Otherwise the derived classes
+    would share the same list, which isn't what you'd want.
 
     Example:
         class Sheep(Mobile): pass
@@ -12,8 +15,16 @@ class HasOwnObjectList(type):
 
     Now when you create Sheep they appear in Sheep.objects but
     they do not appear in Wolves.objects, as you would expect.    
+
+    Each list also holds the arrays for the class's Columns.
     '''
 
     def __init__(cls, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        cls.objects = []
+        columns = {
+            name: (value.dtype, value.default)
+            for klass in reversed(cls.__mro__)
+            for name, value in vars(klass).items()
+            if isinstance(value, Column)
+        }
+        cls.objects = SlotMap(columns)
@@ -1,14 +1,20 @@
 
 from collections import defaultdict
-from functools import lru_cache as cache
     
 class Location(object):
     '''
     Represents a location within the Simulation.
+
+    A Location is a thin view onto one cell of the Simulation's World,
+    which holds the actual data in flat arrays. There may be a view for
+    every cell, so it has slots rather than a __dict__, and it finds its
+    simulation through its world.
     '''
-    
+
+    __slots__ = ('world', 'x', 'y', 'index', '__weakref__')
+
+    # The simulation which new locations belong to
     simulation = None
-    colour = None
     
     def __init__(self, x, y, capacity=None):
         '''
@@ -17,139 +23,227 @@ class Location(object):
         
         # Ensure simulation is set
         assert self.simulation is not None, "Location must have 'simulation' property set!"
+
+        # Pin the view to the current simulation's world
+        self.world = self.simulation.world
         
         # Basic properties
         self.x = x
         self.y = y
+        self.index = self.world.index(x, y)
         
         # Location capacity
         # Setting this to zero effectively defines an impassable location
-        self.capacity = capacity or 1
-
-        # Contents
-        self.contents = []
+        if capacity is not None:
+            self.capacity = capacity
 
-        # Memoised results
-        self._up = self._down = self._left = self._right = None
-        self._neighbours = None
-        self._neighbourhood = None
+    @classmethod
+    def view(cls, simulation, index, x, y):
+        '''
+        Create a view onto an existing cell of the simulation's world.
+        Used by the World - there should be no need to call this directly.
+        '''
+        location = cls.__new__(cls)
+        location.world = simulation.world
+        location.x = x
+        location.y = y
+        location.index = index
+        return location
 
     def __repr__(self):
         return 'Location(%s, %s)' % (self.x, self.y)
 
+    #
+    # Cell data, stored in the world arrays
+    #
+
+    @property
+    def capacity(self):
+        return self.world.capacity_at(self.index)
+
+    @capacity.setter
+    def capacity(self, value):
+        self.world.set_capacity(self.index, value)
+        self.world.simulation.invalidate_area(self.x, self.y, 1, 1)
+
+    @property
+    def colour(self):
+        return self.world.get_colour(self.index)
+
+    @colour.setter
+    def colour(self, value):
+        self.world.set_colour(self.index, value)
+
+    @property
+    def contents(self):
+        return self.world.contents_at(self.index)
+
+    def add(self, agent):
+        '''
+        Place an agent in this location.
+        Callers are responsible for checking can_fit first.
+        '''
+        self.world.add(self.index, agent)
+
+    def remove(self, agent):
+        '''
+        Take an agent out of this location.
+        '''
+        self.world.remove(self.index, agent)
+
     def mass(self):
         '''
         How much mass is concentrated in this location?
         '''
-        return sum([ a.mass for a in self.contents ])
+        return self.world.mass_at(self.index)
+
+    def count(self, agent_class):
+        '''
+        How many agents of exactly agent_class are in this location?
+        '''
+        return self.world.count_at(self.index, agent_class)
 
     def can_fit(self, other):
         '''
         Can some other thing fit in this location?
         '''
-        return (self.mass() + other.mass <= self.capacity)
+        return self.world.can_fit(self.index, other.mass)
 
     #
     # Utility methods to make movement simpler to code.
-    # Note that we memoise the locations so that we only
-    # have to calculate them once.
     #
     
-    @cache(maxsize=None)
     def up(self):
-        y = self.simulation.normalise_height(self.y - 1)
-        return self.simulation.locations[self.x, y]
+        world = self.world
+        if self.y > 0:
+            return world.location(self.index - world.width)
+        y = self.world.simulation.normalise_height(self.y - 1)
+        return world.location(world.index(self.x, y))
     
-    @cache(maxsize=None)
     def down(self):
-        y = self.simulation.normalise_height(self.y + 1)
-        return self.simulation.locations[self.x, y]
+        world = self.world
+        if self.y < world.height - 1:
+            return world.location(self.index + world.width)
+        y = self.world.simulation.normalise_height(self.y + 1)
+        return world.location(world.index(self.x, y))
 
-    @cache(maxsize=None)    
     def left(self):
-        x = self.simulation.normalise_width(self.x - 1)
-        return self.simulation.locations[x, self.y]
+        world = self.world
+        if self.x > 0:
+            return world.location(self.index - 1)
+        x = self.world.simulation.normalise_width(self.x - 1)
+        return world.location(world.index(x, self.y))
     
-    @cache(maxsize=None)
     def right(self):   
-        x = self.simulation.normalise_width(self.x + 1)
-        return self.simulation.locations[x, self.y]
+        world = self.world
+        if self.x < world.width - 1:
+            return world.location(self.index + 1)
+        x = self.world.simulation.normalise_width(self.x + 1)
+        return world.location(world.index(x, self.y))
 
     #
     # Definition of neighbours and neighbourhoods
     #
 
-    def neighbours(self, radius=1, border_only=False, include_self=False, include_self_location=False):
+    def neighbours(self, radius=1, border_only=False, include_self=False, include_self_location=False, agent_class=None, where=None):
         '''
         Returns the neighbours of a given cell.
         This is a aggregate list of the contents of its neighbourhood, less itself.
         Note that this will include any other agents in the same location as us.
+        If agent_class is given then only agents of exactly that class are returned.
+        If where is given then only agents matching it are returned. It may be a
+        state class or a function of an agent returning a bool.
         '''
+
+        predicate = self.world.simulation.memberships.predicate(where)
+
+        if agent_class is not None:
+            return self._neighbours_of_class(agent_class, radius, border_only, include_self_location, predicate)
+
+        contents = self.world.contents
     
         neighbours_list = [
             neighbour
-            for cell in self.neighbourhood(radius=radius, border_only=border_only, include_self_location=include_self_location)
-            for neighbour in cell.contents
+            for index in self.neighbourhood_indices(radius=radius, border_only=border_only, include_self_location=include_self_location)
+            if index in contents
+            for neighbour in contents[index]
+            if predicate is None or predicate(neighbour)
         ]
 
-        if not include_self and include_self_location:
+        if not include_self and include_self_location and self in neighbours_list:
             neighbours_list.remove(self)
 
         return neighbours_list
 
-    @cache(maxsize=None)
+    def _neighbours_of_class(self, agent_class, radius, border_only, include_self_location, predicate=None):
+        '''
+        Returns the neighbours of exactly agent_class
+        '''
+
+        world = self.world
+        neighbourhood_stencil = self.world.simulation.stencil(radius, border_only)
+        spatial_index = world.indexes.get(agent_class)
+
+        # Large neighbourhoods of bound classes are best found with the spatial index
+        if spatial_index is not None and len(neighbourhood_stencil) > spatial_index.bucket_size ** 2:
+            return spatial_index.within(self.x, self.y, neighbourhood_stencil, include_centre=include_self_location, predicate=predicate)
+
+        # Otherwise check the cells, skipping those with none of the class in them
+        contents = world.contents
+        count_at = world.count_at
+        return [
+            neighbour
+            for index in self.neighbourhood_indices(radius=radius, border_only=border_only, include_self_location=include_self_location)
+            if count_at(index, agent_class)
+            for neighbour in contents[index]
+            if type(neighbour) is agent_class and (predicate is None or predicate(neighbour))
+        ]
+
+    def count_neighbours(self, what, radius=1, border_only=False, include_self_location=False, strategy=None):
+        '''
+        Returns the number of agents of an agent class, or in a state
+        class, within the neighbourhood of this location.
+        This looks up the simulation's whole-grid neighbour counts
+        (see Layers.count_neighbours), which are kept up to date as things change.
+        '''
+        counts = self.world.simulation.count_neighbours(what, strategy, radius, border_only, include_self_location)
+        return int(counts[self.y, self.x])
+
     def neighbourhood(self, radius=1, border_only=False, include_self_location=True):
         '''
         Returns a set containing the neighbourhood of a given cell.
-        This can be calculated in several ways.
+        This can be calculated in several ways, depending on the
+        simulation's neighbourhood_strategy (see the stencils module).
         If border_only is True then only the edge is returned,
         allowing us to progressively explore a wider radius.
         '''
 
-        # Sanity check
-        if (radius < 1) or (int(radius) != radius):
-            raise Exception("Radius must be a positive integer")
-        
+        location = self.world.location
+        return {
+            location(index)
+            for index in self.neighbourhood_indices(radius=radius, border_only=border_only, include_self_location=include_self_location)
+        }
+
+    def neighbourhood_indices(self, radius=1, border_only=False, include_self_location=True):
+        '''
+        Returns a list of the cell indices in the neighbourhood of a given cell.
+        The offsets come from a stencil which is shared by every location,
+        so nothing is stored per location however far we search.
+        '''
+
         # Strategy pattern
-        strategy = self.simulation.neighbourhood_strategy
-
-        # Helper function to define condtion for inclusion
-        # in the neighbourhood set
-        def include(dx, dy):
-            if strategy == 'von_neumann':
-                # Von Neumann neighbourhood for r==1 is
-                # the cell itself and the four adjacent cells
-                if border_only:
-                    return abs(dx) + abs(dy) == radius
-                else:
-                    return abs(dx) + abs(dy) <= radius
-            elif strategy == 'moore':
-                # Moore neighbourhood for r==1 is
-                # the cell itself and the eight cells surrounding it
-                if border_only:
-                    return (abs(dx) == radius) or (abs(dy) == radius)
-                else:
-                    return True
-                
-        # Build the neighbourhood set
-
-        neighbourhood_set = set()
-            
-        for dx in range(-1 * radius, radius + 1):
-            for dy in range(-1 * radius, radius + 1):
-                if include(dx, dy):
-                    x = self.simulation.normalise_width(self.x + dx)
-                    y = self.simulation.normalise_height(self.y + dy)
-                    neighbourhood_set.add(self.simulation.locations[x, y])
+        neighbourhood_stencil = self.world.simulation.stencil(radius, border_only)
+
+        indices = self.world.apply_stencil(self.x, self.y, neighbourhood_stencil)
 
         if not include_self_location:
             try:
-                neighbourhood_set.remove(self)
-            except:
+                indices.remove(self.index)
+            except ValueError:
                 # If we're doing border only it won't be in there
                 pass
 
-        return neighbourhood_set
+        return indices
 
     #
     # Distance functions
@@ -158,14 +252,14 @@ class Location(object):
     def vector_to(self, target_x, target_y):
         ''' Returns a screen wrapping-aware shortest vector to target
         '''
-        return self.simulation.vector_between(self.x, self.y, target_x, target_y)
+        return self.world.simulation.vector_between(self.x, self.y, target_x, target_y)
 
     def distance_to(self, other):
         ''' Returns a screen wrapping-aware distance
         '''
-        return self.simulation.distance_between(self, other)
+        return self.world.simulation.distance_between(self, other)
 
-    def nearest(self, candidate_list):
+    def nearest(self, candidate_list, where=None):
         ''' Returns the nearest of the candidates
         '''
-        return self.simulation.nearest(self, candidate_list)
+        return self.world.simulation.nearest(self, candidate_list, where=where)
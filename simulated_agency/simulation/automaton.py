@@ -0,0 +1,175 @@
+import numpy as np
+
+
+class Automaton(object):
+    '''
+    Runs cellular automata at array speed.
+
+    When every cell of the world holds exactly one agent, and every
+    state involved declares its transitions as Rules (see Rule), a
+    synchronous tick can be worked out for the whole grid at once.
+    Each cell's state is stored as an integer code in an array, the
+    rules are applied to the array, and only the agents whose state
+    actually changed are updated through the normal Stateful API.
+
+    The executor uses the automaton for synchronous execution whenever
+    the simulation is eligible, and falls back to calling each agent's
+    handle() otherwise.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # Code -> state class, and back again
+        self.states = []
+        self.state_codes = {}
+        # Per-cell arrays, indexed by location index
+        self.agents = None
+        self.codes = None
+        self.ages = None
+        # The memberships.changes count when the arrays were last loaded
+        # (or found to be ineligible), since they only need reloading
+        # when some agent's state has changed behind our back
+        self._loaded_at = None
+        self._eligible = False
+        # Bind methods
+        self.simulation.automaton = self
+
+    def __repr__(self):
+        return 'Automaton(%s states)' % len(self.states)
+
+    def eligible(self, agent_list, before_each_agent=None):
+        '''
+        Can these agents be run by the automaton?
+        '''
+
+        simulation = self.simulation
+        world = simulation.world
+
+        if before_each_agent is not None or world.sparse or len(agent_list) != world.size:
+            return False
+        if self._loaded_at != simulation.memberships.changes:
+            self._eligible = self._load(agent_list)
+            self._loaded_at = simulation.memberships.changes
+        return self._eligible
+
+    def tick(self):
+        '''
+        Apply one synchronous tick of every agent's rules
+        '''
+
+        simulation = self.simulation
+        size = simulation.world.size
+        codes = self.codes
+        ages = self.ages
+
+        # Agents have been in their state for another tick
+        ages += 1
+
+        new_codes = codes.copy()
+        counts = {}
+        for code, state_class in enumerate(self.states):
+            if not state_class.rules:
+                continue
+            # Cells in this state which no rule has applied to yet
+            pending = codes == code
+            if not pending.any():
+                continue
+            for rule in state_class.rules:
+                applies = pending.copy()
+                if rule.after is not None:
+                    applies &= ages >= rule.after
+                if rule.counting is not None:
+                    count = self._count_neighbours(rule.counted(), rule.radius, counts)
+                    if rule.count_in is not None:
+                        applies &= np.isin(count, list(rule.count_in))
+                    if rule.count_not_in is not None:
+                        applies &= ~np.isin(count, list(rule.count_not_in))
+                if rule.probability is not None:
+                    applies &= simulation.rng.generator.random(size) < rule.probability
+                new_codes[applies] = self.state_codes[rule.target()]
+                pending &= ~applies
+
+        changed = np.flatnonzero(new_codes != codes)
+        ages[changed] = 0
+        self.codes = new_codes
+
+        # Keep the agents themselves up to date
+        for agent in self.agents:
+            agent.age += 1
+            agent.current_state_instance().age += 1
+        agents = self.agents
+        states = self.states
+        for index, code in zip(changed.tolist(), new_codes[changed].tolist()):
+            agents[index].replace_state(states[code])
+
+        # Those changes were ours, so the arrays are still up to date
+        self._loaded_at = simulation.memberships.changes
+
+    #
+    # Internal methods
+    #
+
+    def _code(self, state_class):
+        ''' Returns the code for a state class, adding it if necessary '''
+        try:
+            return self.state_codes[state_class]
+        except KeyError:
+            code = self.state_codes[state_class] = len(self.states)
+            self.states.append(state_class)
+            return code
+
+    def _load(self, agent_list):
+        '''
+        Copy the agents' states into arrays, returning False
+        if they cannot be run by the automaton
+        '''
+
+        size = self.simulation.world.size
+        agents = [None] * size
+        codes = np.empty(size, dtype=np.int32)
+        ages = np.empty(size, dtype=np.int64)
+
+        for agent in agent_list:
+            location = getattr(agent, 'location', None)
+            if location is None or agents[location.index] is not None:
+                return False
+            if agent._state_stack.size() != 1:
+                return False
+            state = agent.current_state_instance()
+            if type(state).rules is None or state.timer:
+                return False
+            agents[location.index] = agent
+            codes[location.index] = self._code(type(state))
+            ages[location.index] = state.age
+
+        # Every state the rules can lead to must be rule-based too
+        checked = 0
+        while checked < len(self.states):
+            for rule in self.states[checked].rules or []:
+                target = rule.target()
+                if target.rules is None or target.required_params:
+                    return False
+                self._code(target)
+                if rule.counting is not None:
+                    self._code(rule.counted())
+            checked += 1
+
+        self.agents = agents
+        self.codes = codes
+        self.ages = ages
+        return True
+
+    def _count_neighbours(self, state_class, radius, counts):
+        '''
+        Returns the number of neighbours of each cell in a state,
+        sharing the results between rules within a tick
+        '''
+        key = (state_class, radius)
+        if key not in counts:
+            simulation = self.simulation
+            world = simulation.world
+            # Subclasses of a state count as being in it
+            matching = [code for code, cls in enumerate(self.states) if issubclass(cls, state_class)]
+            layer = np.isin(self.codes, matching).astype(np.int32)
+            counts[key] = simulation.convolve(world.grid(layer), simulation.stencil(radius)).ravel()
+        return counts[key]
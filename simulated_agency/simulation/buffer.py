@@ -0,0 +1,70 @@
+class DoubleBuffer(object):
+    '''
+    Double buffers agents' states, and their Buffered attributes,
+    during synchronous execution.
+
+    Between begin() and commit(), every agent reads from the front
+    buffer, i.e. the state stacks and attributes as they were at the
+    start of the tick, and any changes are written to the back buffer.
+    commit() then applies all of the changes at once.
+
+    Only agents which have changed something are in the back buffer,
+    so an agent which keeps its state costs nothing at commit.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.active = False
+        # Agent -> the agent's new state stack
+        self.stacks = {}
+        # Agent -> {attribute name: new value}
+        self.attributes = {}
+        # Bind methods
+        self.simulation.buffer = self
+
+    def __repr__(self):
+        return 'DoubleBuffer(%s changed)' % len(self.stacks.keys() | self.attributes.keys())
+
+    def begin(self):
+        ''' Start sending changes to the back buffer '''
+        self.active = True
+
+    def stack(self, agent):
+        '''
+        Returns the back buffer's copy of an agent's state stack,
+        which is where changes to the agent's state should go
+        '''
+        try:
+            return self.stacks[agent]
+        except KeyError:
+            pass
+        if agent._state_stack.is_empty():
+            # A brand new agent, which nobody could have seen yet
+            return agent._state_stack
+        stack = self.stacks[agent] = agent._state_stack.copy()
+        return stack
+
+    def write(self, agent, name, value):
+        ''' Record the new value of one of an agent's attributes '''
+        try:
+            self.attributes[agent][name] = value
+        except KeyError:
+            self.attributes[agent] = {name: value}
+
+    def discard(self, agent):
+        ''' Forget an agent's changes, e.g. because it has been destroyed '''
+        self.stacks.pop(agent, None)
+        self.attributes.pop(agent, None)
+
+    def commit(self):
+        ''' Apply every change in the back buffer at once '''
+        self.active = False
+        for agent, stack in self.stacks.items():
+            old_state = agent._top_state()
+            agent._state_stack = stack
+            agent._top_changed(old_state)
+        for agent, values in self.attributes.items():
+            for name, value in values.items():
+                setattr(agent, name, value)
+        self.stacks = {}
+        self.attributes = {}
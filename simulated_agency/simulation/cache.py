@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+
+class BoundedCache(object):
+    '''
+    A memo cache with a size limit and hit/miss/eviction counters.
+
+    The eviction policy is either:
+        'lru'   least recently used entries are evicted first
+        'fifo'  oldest entries are evicted first (hits are cheaper)
+    '''
+
+    def __init__(self, name, maxsize=1024, policy='lru', invalidated_by=()):
+        if policy not in ('lru', 'fifo'):
+            raise Exception("Unknown cache eviction policy '%s'" % policy)
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        # Events which make the cached values stale (see Caches.invalidate)
+        self.invalidated_by = tuple(invalidated_by)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return 'BoundedCache(%s, %s/%s)' % (self.name, len(self.entries), self.maxsize)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        ''' Returns the cached value for key, or default on a miss '''
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        ''' Store a value, evicting an old entry if the cache is full '''
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        ''' Remove a single entry '''
+        return self.entries.pop(key, default)
+
+    def clear(self):
+        ''' Remove all entries, keeping the counters '''
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
+
+
+class Caches(object):
+    '''
+    Provides the simulation's memo caches.
+
+    Every cache is owned by the simulation rather than attached to
+    methods, so nothing is pinned in memory beyond the simulation's
+    own lifetime and every cache can be inspected and invalidated.
+
+    Events currently raised by the simulation are:
+        'wrap'    wrap_x or wrap_y changed
+        'world'   the world changed (e.g. location capacities)
+
+    Changes to part of the world should be reported with invalidate_area,
+    so that anything able to keep what the change did not affect can.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.caches = {}
+        # Functions taking (x_start, y_start, width, height) to call
+        # when part of the world changes
+        self.area_listeners = []
+        # Bind methods
+        self.simulation.caches = self
+        self.simulation.cache_stats = self.stats
+        self.simulation.invalidate_caches = self.invalidate
+        self.simulation.invalidate_area = self.invalidate_area
+
+    def __getitem__(self, name):
+        return self.caches[name]
+
+    def __iter__(self):
+        return iter(self.caches.values())
+
+    def cache(self, name, maxsize=1024, policy='lru', invalidated_by=()):
+        '''
+        Returns the named cache, creating it if necessary
+        '''
+        try:
+            return self.caches[name]
+        except KeyError:
+            cache = self.caches[name] = BoundedCache(name, maxsize, policy, invalidated_by)
+            return cache
+
+    def invalidate(self, *events):
+        '''
+        Clear every cache which depends on any of the events given.
+        Cache names may also be given, to clear those caches directly.
+        With no arguments, clear all caches.
+        '''
+        for cache in self.caches.values():
+            if not events or cache.name in events or any(e in cache.invalidated_by for e in events):
+                cache.clear()
+
+    def invalidate_area(self, x_start, y_start, width, height):
+        '''
+        Clear every cache which depends on the world, after a change
+        to a rectangle of it, and tell the area listeners
+        '''
+        self.invalidate('world')
+        for listener in self.area_listeners:
+            listener(x_start, y_start, width, height)
+
+    def stats(self):
+        '''
+        Returns a dict of statistics for each cache, keyed by name
+        '''
+        return {name: cache.stats() for name, cache in self.caches.items()}
@@ -0,0 +1,123 @@
+class Chunks(object):
+    '''
+    Divides the world into square chunks (the last row and column of
+    chunks may be smaller) and tracks, for each chunk, how many agents it
+    holds and whether anything in it has changed since it was last drawn.
+    The agents themselves are only kept in the World's contents.
+
+    A chunk with no agents and no pending changes is asleep, and can be
+    skipped entirely when executing or drawing the simulation.
+
+    Only chunks which hold agents or are dirty are stored, so this works
+    for sparse worlds too.
+    '''
+
+    def __init__(self, world, chunk_size=64):
+        self.world = world
+        self.chunk_size = chunk_size
+        self.chunks_wide = -(-world.width // chunk_size)
+        self.chunks_high = -(-world.height // chunk_size)
+        # Number of agents in each populated chunk, keyed by chunk id
+        self.populations = {}
+        # Ids of chunks which have changed since they were last drawn
+        self.dirty = set()
+
+    def __repr__(self):
+        return 'Chunks(%s x %s of size %s)' % (self.chunks_wide, self.chunks_high, self.chunk_size)
+
+    def __len__(self):
+        return self.chunks_wide * self.chunks_high
+
+    def chunk_of(self, index):
+        ''' Returns the id of the chunk containing a cell index '''
+        y, x = divmod(index, self.world.width)
+        size = self.chunk_size
+        return (y // size) * self.chunks_wide + (x // size)
+
+    def bounds(self, chunk_id):
+        ''' Returns (x_start, y_start, x_end, y_end) of a chunk, end exclusive '''
+        cy, cx = divmod(chunk_id, self.chunks_wide)
+        size = self.chunk_size
+        x_start = cx * size
+        y_start = cy * size
+        return (
+            x_start, y_start,
+            min(x_start + size, self.world.width),
+            min(y_start + size, self.world.height)
+        )
+
+    #
+    # Tracking changes
+    #
+
+    def add(self, index, agent):
+        chunk_id = self.chunk_of(index)
+        populations = self.populations
+        populations[chunk_id] = populations.get(chunk_id, 0) + 1
+        self.dirty.add(chunk_id)
+
+    def remove(self, index, agent):
+        chunk_id = self.chunk_of(index)
+        populations = self.populations
+        populations[chunk_id] -= 1
+        if not populations[chunk_id]:
+            del populations[chunk_id]
+        # The chunk still has to be redrawn without the agent
+        self.dirty.add(chunk_id)
+
+    def move(self, old_index, new_index, agent):
+        old_chunk = self.chunk_of(old_index)
+        new_chunk = self.chunk_of(new_index)
+        if old_chunk == new_chunk:
+            self.dirty.add(old_chunk)
+        else:
+            self.remove(old_index, agent)
+            self.add(new_index, agent)
+
+    def mark_dirty(self, index):
+        ''' Record a change to a single cell '''
+        self.dirty.add(self.chunk_of(index))
+
+    def mark_area_dirty(self, x_start, y_start, width, height):
+        ''' Record a change to every cell in a rectangle '''
+        size = self.chunk_size
+        x_end = min(x_start + width, self.world.width)
+        y_end = min(y_start + height, self.world.height)
+        x_start = max(x_start, 0)
+        y_start = max(y_start, 0)
+        if x_start >= x_end or y_start >= y_end:
+            return
+        for cy in range((y_start // size), (y_end - 1) // size + 1):
+            for cx in range((x_start // size), (x_end - 1) // size + 1):
+                self.dirty.add(cy * self.chunks_wide + cx)
+
+    def clean(self):
+        ''' Record that all changes have been drawn '''
+        self.dirty.clear()
+
+    #
+    # Queries
+    #
+
+    def agents_in(self, chunk_id):
+        ''' Returns a list of the agents in a chunk, cell by cell '''
+        agents = []
+        if chunk_id not in self.populations:
+            return agents
+        contents = self.world.contents
+        width = self.world.width
+        x_start, y_start, x_end, y_end = self.bounds(chunk_id)
+        for y in range(y_start, y_end):
+            row = y * width
+            for index in range(row + x_start, row + x_end):
+                cell = contents.get(index)
+                if cell:
+                    agents.extend(cell)
+        return agents
+
+    def is_asleep(self, chunk_id):
+        return chunk_id not in self.populations and chunk_id not in self.dirty
+
+    def awake(self):
+        ''' Returns the ids of the chunks which are not asleep, in order '''
+        return sorted(self.dirty.union(self.populations))
@@ -1,29 +1,50 @@
+from collections import namedtuple
+from time import perf_counter
 
-import curses
-from random import shuffle, random
-import sys
-from time import sleep
+from .timestep import FixedTimestep
+
+
+# What happened in one tick: the simulation's age afterwards, how
+# many agents there are, how many of each bound class (by name),
+# and how long the tick took
+TickSummary = namedtuple('TickSummary', ['age', 'agents', 'counts', 'seconds'])
+
+# What happened in a whole run, with the counts as they were at the end
+RunResult = namedtuple('RunResult', ['ticks', 'age', 'agents', 'counts', 'seconds'])
 
-import pyglet
-from .pyglet_grid import Grid
 
 class Executor(object):
     '''
-    Provides simulation execution
+    Provides simulation execution.
+
+    execute() runs the simulation in a pyglet window. step() and run()
+    run it headless, as fast as possible, and never import pyglet, so
+    they can be used for batch runs on machines without a display.
+    The window is only opened when execute() is first called.
     '''
 
     def __init__(self, simulation):
         self.simulation = simulation
+        # Created by init_grid when first needed
+        self.grid = None
+        # The FixedTimestep of a windowed run, if any (see execute)
+        self.timestep = None
         # Bind methods
         self.simulation.execute = self.execute
-        # Init Grid
-        self.init_grid(simulation)
+        self.simulation.step = self.step
+        self.simulation.run = self.run
 
     def init_grid(self, simulation):
+        # Only windowed execution needs pyglet
+        from .pyglet_grid import Grid
         # Initialise the Grid
         grid = Grid()
-        grid.window_width = 800
-        grid.window_height = 800
+        if simulation.cell_size:
+            grid.window_width = simulation.cell_size * simulation.width
+            grid.window_height = simulation.cell_size * simulation.height
+        else:
+            grid.window_width = 800
+            grid.window_height = 800
         grid.background = simulation.background_colour
         grid.init_window()
         # 2. Set up the cell size and border
@@ -42,9 +63,141 @@ class Executor(object):
     def undraw(self, agent):
         self.grid.unset_cell(agent.location.x, agent.location.y)
 
+    def paint(self, draw_locations=True):
+        '''
+        Redraw every chunk of the world which is awake.
+        Sleeping chunks have no agents and have not changed
+        since they were last drawn, so they are skipped.
+        '''
+        world = self.simulation.world
+        chunks = world.chunks
+        grid = self.grid
+        draw = self.draw
+        for chunk_id in chunks.awake():
+            x_start, y_start, x_end, y_end = chunks.bounds(chunk_id)
+            grid.unset_area(x_start, y_start, x_end, y_end)
+            if draw_locations:
+                for x, y, colour in world.colours_in(x_start, y_start, x_end, y_end):
+                    grid.set_cell(x, y, colour)
+            for agent in chunks.agents_in(chunk_id):
+                draw(agent)
+        chunks.clean()
+
+    def step(self, before_each_loop=None, before_each_agent=None, synchronous=False):
+        '''
+        Run one tick of the simulation, without drawing anything,
+        and return a TickSummary. The options are as for execute().
+        '''
+
+        started = perf_counter()
+        simulation = self.simulation
+
+        # Increment simulation age
+        simulation.age += 1
+
+        # Execute user-defined function
+        # NOTE: We do this first, since it may wake agents up
+        before_each_loop_vars = None
+        if before_each_loop:
+            # We capture any emitted variables for use
+            # in the before_each_agent section
+            before_each_loop_vars = before_each_loop()
+
+        # Get a list of all the active objects to be executed
+        # NOTE: We do this every tick because some agents
+        #       may have been born, died, gone to sleep or
+        #       woken up since last turn
+        scheduler = simulation.scheduler
+        agent_list = scheduler.agents()
+        if not agent_list and not scheduler.dormant:
+            raise Exception('No bound agent classes, so nothing to simulate!')
+
+        # Go through the list of agents and tell each of them to do something
+
+        if synchronous and simulation.automaton.eligible(agent_list, before_each_agent):
+
+            # Apply the rules to the whole grid at once
+            simulation.automaton.tick()
+
+        elif synchronous:
+
+            # Every agent sees the simulation as it was at the start of
+            # the tick, and their changes are all applied at the end
+            buffer = simulation.buffer
+            buffer.begin()
+            for agent in agent_list:
+                # Skip anything destroyed earlier in the tick
+                if agent.destroyed:
+                    continue
+                # Increment agent age
+                agent.age += 1
+                # Execute user-defined function
+                if before_each_agent:
+                    before_each_agent(agent, before_each_loop_vars)
+                # Tell the agent to act
+                agent.execute()
+            buffer.commit()
+
+        else:
+
+            simulation.rng.shuffle(agent_list)
+            for agent in agent_list:
+                # Skip anything destroyed earlier in the tick
+                if agent.destroyed:
+                    continue
+                # Increment agent age
+                agent.age += 1
+                # Execute user-defined function
+                if before_each_agent:
+                    before_each_agent(agent, before_each_loop_vars)
+                # Tell the agent to act
+                agent.execute()
+
+        # Run the timers which are due, e.g. timing out states
+        # and waking the agents due to run next tick
+        scheduler.end_tick()
+
+        # Let go of the agents destroyed this tick,
+        # and recycle the states left behind
+        for agent_class in simulation.bound_agent_classes:
+            agent_class.objects.purge()
+        simulation.state_pool.end_tick()
+
+        counts = {agent_class.__name__: len(agent_class.objects) for agent_class in simulation.bound_agent_classes}
+        return TickSummary(simulation.age, sum(counts.values()), counts, perf_counter() - started)
+
+    def run(self, ticks=None, before_each_loop=None, before_each_agent=None, synchronous=False):
+        '''
+        A generator which runs the simulation headless, yielding a
+        TickSummary after each tick. It runs for the given number of
+        ticks, or forever if ticks is None, and then returns a RunResult
+        (which `result = yield from simulation.run(...)` will capture).
+
+        e.g. for summary in simulation.run(100):
+                 print(summary.age, summary.counts)
+        '''
+
+        started = perf_counter()
+        done = 0
+        summary = None
+        while ticks is None or done < ticks:
+            summary = self.step(before_each_loop, before_each_agent, synchronous)
+            done += 1
+            yield summary
+        return self._result(done, summary, perf_counter() - started)
+
+    def _result(self, ticks, summary, seconds):
+        simulation = self.simulation
+        if summary is None:
+            counts = {agent_class.__name__: len(agent_class.objects) for agent_class in simulation.bound_agent_classes}
+        else:
+            counts = summary.counts
+        return RunResult(ticks, simulation.age, sum(counts.values()), counts, seconds)
+
     def execute(
         self, before_each_loop=None, before_each_agent=None,
-        synchronous=False, timer=None, draw_locations=True
+        synchronous=False, timer=None, draw_locations=True, headless=False,
+        ticks_per_second=None, frames_per_second=None, max_ticks_per_frame=None
     ):
         '''
         Run the simulation's loop for the agent_classes listed.
@@ -55,97 +208,98 @@ class Executor(object):
         If preferred, the synchronous flag can be set. This will execute all agents
         to determine their 'next' state and then update all of them at the same time.
         This mode of execution only makes sense if agents do not have side effects on
-        the rest of the simulation i.e. they only update their own state and do not
-        modify properties of the locations they are in.
+        the rest of the simulation i.e. they only update their own state (and any
+        Buffered attributes) and do not modify properties of the locations they are in.
 
-        The agent_classes param can be either a single class or a list of classes.
+        If every cell holds exactly one agent and all of their states declare Rules,
+        synchronous execution is handed to the simulation's Automaton, which applies
+        the rules to the whole grid at once.
+
+        If a timer is given the simulation stops after that many ticks and a
+        RunResult is returned. With the headless flag set nothing is drawn and
+        no window is opened, and the simulation runs as fast as it can. A
+        headless run has no window to close, so it needs a timer (to run
+        forever, iterate over run() instead).
+
+        In a window, one tick is run for each frame unless ticks_per_second is
+        given, in which case a FixedTimestep runs as many ticks as are due for
+        each frame (at most max_ticks_per_frame) and only the last of them is
+        drawn. The window's caption shows how far behind the simulation is if
+        it cannot keep up. The frame rate can be capped with frames_per_second.
+
+        e.g. 1000 ticks per second, looking at every 30th tick:
+             simulation.execute(ticks_per_second=1000, frames_per_second=1000/30)
         '''
 
+        if headless:
+            if not timer:
+                raise Exception('Headless execution needs a timer, otherwise it would never end')
+            ticks = self.run(timer, before_each_loop, before_each_agent, synchronous)
+            try:
+                while True:
+                    next(ticks)
+            except StopIteration as stop:
+                return stop.value
+
+        import pyglet
+        if self.grid is None:
+            self.init_grid(self.simulation)
+
         self.timer = timer
+        self.timestep = None
+        if ticks_per_second:
+            self.timestep = FixedTimestep(ticks_per_second, max_ticks_per_frame)
         # Localise names for faster access, because we
         # do a lot of this inside the simulation loop
-        simulation = self.simulation
-        locations = simulation.locations
-        name = simulation.name
-        draw = self.draw
-        undraw = self.undraw
+        paint = self.paint
+        step = self.step
+        grid = self.grid
+        timestep = self.timestep
+        name = self.simulation.name
+        started = perf_counter()
+        ticks = 0
+        summary = None
+        behind = 0
 
         # Initial screen draw
-        self.grid.clear_all_cells()
-        agent_list = [a for agent_class in simulation.bound_agent_classes for a in agent_class.objects]
-        for agent in agent_list:
-            draw(agent)
-        self.grid.draw()
+        grid.clear_all_cells()
+        paint(draw_locations)
+        grid.draw()
 
         # Define our simulation loop
         def loop(dt):
+            nonlocal ticks, summary, behind
 
-            # Increment simulation age
-            simulation.age += 1
-
-            # Decrement simulation timer
-            if self.timer:
-                self.timer -= 1
-                if self.timer == 0:
-                    print('Timer expired')
-                    sys.exit(0)
-
-            # Get a list of all the objects to be executed/drawn
-            # NOTE: We do this every loop because some agents
-            #       may have been born or died since last turn
-            agent_list = [a for agent_class in simulation.bound_agent_classes for a in agent_class.objects]
-            if not agent_list:
-                raise Exception('No bound agent classes, so nothing to simulate!')
-
-            # Execute user-defined function
-            if before_each_loop:
-                # We capture any emitted variables for use
-                # in the before_each_agent section
-                before_each_loop_vars = before_each_loop()
-
-            # Go through the list of agents and tell each of them to do something
-            
-            if synchronous:
-                
-                # Figure out what the agents' future state will be
-                for agent in agent_list:
-                    undraw(agent)
-                    # Increment agent age
-                    agent.age += 1
-                    # Execute user-defined function
-                    if before_each_agent:
-                        before_each_agent(agent, before_each_loop_vars)
-                    # Cache the current state
-                    agent.state_before = agent.current_state_instance()
-                    # Tell the agent to act
-                    agent.execute()
-                    # Cache the next agent state
-                    agent.state_after = agent.current_state_instance()
-                    # Restore the current agent state
-                    agent.replace_state_instance(agent.state_before)
-
-                # Update to current state
-                for agent in agent_list:
-                    agent.replace_state_instance(agent.state_after)
-                    draw(agent)
-
-            else:
-
-                shuffle(agent_list)
-                for agent in agent_list:
-                    undraw(agent)
-                    # Increment agent age
-                    agent.age += 1
-                    # Execute user-defined function
-                    if before_each_agent:
-                        before_each_agent(agent, before_each_loop_vars)
-                    # Tell the agent to act
-                    agent.execute()
-                    draw(agent)
+            due = timestep.advance(dt) if timestep else 1
+            for _ in range(due):
+                summary = step(before_each_loop, before_each_agent, synchronous)
+                ticks += 1
+                # Decrement simulation timer
+                if self.timer:
+                    self.timer -= 1
+                    if self.timer == 0:
+                        print('Timer expired')
+                        pyglet.clock.unschedule(loop)
+                        pyglet.app.exit()
+                        break
 
+            # Redraw the parts of the world which have changed
+            # since the last frame, if any ticks have been run
+            if due:
+                paint(draw_locations)
 
             # Update the grid
-            self.grid.draw()
-        
-        pyglet.clock.schedule(loop)
+            grid.draw()
+
+            # Report when we are falling behind
+            if timestep and timestep.backlog != behind:
+                behind = timestep.backlog
+                caption = '%s (%s ticks behind)' % (name, behind) if behind else name
+                grid.window.set_caption(caption)
+
+        if frames_per_second:
+            pyglet.clock.schedule_interval(loop, 1.0 / frames_per_second)
+        else:
+            pyglet.clock.schedule(loop)
         pyglet.app.run()
+        return self._result(ticks, summary, perf_counter() - started)
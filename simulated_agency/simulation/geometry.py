@@ -1,8 +1,6 @@
+import numpy as np
 
-from functools import lru_cache as cache
-from random import randint, shuffle
-
-from ..location import Location
+from ..stencils import compile_stencil, stencil_builders
 
 
 class Geometry(object):
@@ -20,14 +18,19 @@ class Geometry(object):
         self.simulation.random_xy = self.random_xy
         self.simulation.random_location = self.random_location
         self.simulation.nearest = self.nearest
+        self.simulation.nearest_many = self.nearest_many
         self.simulation.vector_between = self.vector_between
         self.simulation.distance_between = self.distance_between
+        self.simulation.vectors_between = self.vectors_between
+        self.simulation.distances_between = self.distances_between
+        self.simulation.stencil = self.stencil
+        # Caches
+        self._stencils = simulation.caches.cache('stencils', maxsize=256)
 
     #
     # Internal methods
     #
 
-    @cache(maxsize=None)
     def _wrap(self, val, min_val, max_val):
         '''
         Utility function to help with wrapping edges.
@@ -40,7 +43,6 @@ class Geometry(object):
         else:
             return val
 
-    @cache(maxsize=None)
     def _constrain(self, val, min_val, max_val):
         '''
         Utility function to help with non-wrapping edges.
@@ -57,7 +59,6 @@ class Geometry(object):
     # Normalisation
     #
    
-    @cache(maxsize=None)
     def normalise_width(self, val):
         '''
         Ensure a value remains within Simulation width
@@ -73,7 +74,6 @@ class Geometry(object):
             # Constrain
             return self._constrain(val, 0, simulation.width - 1)
 
-    @cache(maxsize=None)
     def normalise_height(self, val):
         '''
         Ensure a value remains within Simulation height
@@ -89,27 +89,48 @@ class Geometry(object):
             # Constrain
             return self._constrain(val, 0, simulation.height - 1)
 
+    #
+    # Neighbourhoods
+    #
+
+    def stencil(self, radius=1, border_only=False, strategy=None):
+        '''
+        Returns the shared neighbourhood Stencil for a strategy,
+        which defaults to the simulation's neighbourhood_strategy
+        '''
+
+        strategy = strategy or self.simulation.neighbourhood_strategy
+        # Keying on the builder means re-registering a strategy
+        # never picks up stencils compiled by the old definition
+        key = (strategy, stencil_builders.get(strategy), radius, border_only)
+        compiled = self._stencils.get(key)
+        if compiled is None:
+            compiled = compile_stencil(strategy, radius, border_only)
+            self._stencils.set(key, compiled)
+        return compiled
+
     #
     # Random coordinates
     #
 
     def random_x(self):
-        return randint(0, self.simulation.width - 1)
+        return self.simulation.rng.randrange(self.simulation.width)
 
     def random_y(self):
-        return randint(0, self.simulation.height - 1)
+        return self.simulation.rng.randrange(self.simulation.height)
 
     def random_xy(self):
         return self.random_x(), self.random_y()
 
     def random_location(self):
-        return self.simulation.locations[self.random_xy()]
+        world = self.simulation.world
+        return world.location(self.simulation.rng.randrange(world.size))
 
     #
     # Distances
     #
 
-    def nearest(self, thing, candidates, radius=None):
+    def nearest(self, thing, candidates, radius=None, where=None):
         '''
         Returns the nearest of the candidates to thing.
         It would be very slow to check the distance to all things in
@@ -119,13 +140,23 @@ class Geometry(object):
         and then widening our search radius if necessary.
         If radius is specified then this is taken as a fixed search
         radius and we do not widen our search beyond this.
+
+        If candidates is an agent class which is bound to the simulation
+        then its spatial index answers the query directly instead.
+
+        If where is given then only candidates matching it are considered.
+        It may be a state class, to find candidates currently in that
+        state, or a function of a candidate returning a bool.
         '''
 
+        # Bound agent classes have their own spatial index
+        if isinstance(candidates, type):
+            spatial_index = self.simulation.world.indexes.get(candidates)
+            if spatial_index is not None:
+                return self._nearest_indexed(thing, spatial_index, radius, where)
+
         # User can pass an agent class or a list of agents
-        if hasattr(candidates, 'objects'):
-            candidate_list = candidates.objects
-        else:
-            candidate_list = candidates
+        candidate_list = self._candidate_list(candidates, where)
 
         # Helper function to naively return nearest
         # from a list by brute force
@@ -136,15 +167,22 @@ class Geometry(object):
             # Shuffle because min always returns first item
             # in the set of all equally minimal items
             candidate_list = list(candidate_list)
-            shuffle(candidate_list)
+            self.simulation.rng.shuffle(candidate_list)
             return min(candidate_list, key=lambda x: thing.distance_to(x))
+
+        # Helper function to find the neighbours we want. Unlike a set
+        # intersection this keeps their order, so runs are reproducible
+        wanted = None
+        def among(neighbours):
+            nonlocal wanted
+            if wanted is None:
+                wanted = set(candidate_list)
+            return [neighbour for neighbour in neighbours if neighbour in wanted]
         
         if radius:
             # Use the supplied radius only
             neighbours = thing.location.neighbours(radius=radius)
-            # Set intersection to find the ones we want
-            catchment = set(candidate_list) & set(neighbours)
-            return nearest_brute_force(catchment)
+            return nearest_brute_force(among(neighbours))
 
         # How sparsely populated are the candidates?
         density = len(candidate_list) / (self.simulation.width * self.simulation.height)
@@ -160,8 +198,7 @@ class Geometry(object):
             return nearest_brute_force(candidate_list)
 
         neighbours = thing.location.neighbours(radius=r)
-        # Set intersection to find the ones we want
-        catchment = set(candidate_list) & set(neighbours)
+        catchment = among(neighbours)
         
         # If we got at least one, then figure out the nearest
         if catchment:
@@ -172,76 +209,287 @@ class Geometry(object):
         while True:
             r = r + 1
             neighbours = thing.location.neighbours(radius=r, border_only=True)
-            # Set intersection to find the ones we want
-            catchment = set(candidate_list) & set(neighbours)
+            catchment = among(neighbours)
             if catchment:
                 break
         return nearest_brute_force(catchment)
 
 
-    @cache(maxsize=None)
+    def _candidate_list(self, candidates, where=None):
+        '''
+        Returns the candidates for a query, which may be given as an
+        agent class or a list of agents, narrowed down by where
+        '''
+
+        memberships = self.simulation.memberships
+
+        if hasattr(candidates, 'objects'):
+            # Agents in a given state are already grouped together
+            if isinstance(where, type):
+                return memberships.agents_in_state(candidates, where)
+            candidates = candidates.objects
+
+        predicate = memberships.predicate(where)
+        if predicate is None:
+            return candidates
+        return [candidate for candidate in candidates if predicate(candidate)]
+
+    def _nearest_indexed(self, thing, spatial_index, radius=None, where=None):
+        '''
+        Returns the nearest agent in a spatial index to thing,
+        not counting thing itself. Equally near agents are
+        chosen between at random.
+        '''
+
+        memberships = self.simulation.memberships
+        predicate = memberships.predicate(where)
+        x, y = self._coordinates(thing)
+
+        if not radius:
+            if isinstance(where, type):
+                members = memberships.agents_in_state(spatial_index.agent_class, where)
+                # If only a few agents are in the state then it is
+                # quicker to check them all than to search the index
+                if len(members) <= spatial_index.bucket_size ** 2:
+                    return self._nearest_of(x, y, [agent for agent in members if agent is not thing], spatial_index)
+            return spatial_index.nearest(x, y, exclude=thing, predicate=predicate)
+
+        # Use the supplied radius only
+        catchment = [
+            agent for agent in spatial_index.within(x, y, self.stencil(radius), predicate=predicate)
+            if agent is not thing
+        ]
+        return self._nearest_of(x, y, catchment, spatial_index)
+
+    def _nearest_of(self, x, y, catchment, spatial_index):
+        '''
+        Returns the nearest of some agents to (x, y), choosing
+        between equally near agents at random
+        '''
+
+        if not catchment:
+            return None
+        distances = [spatial_index._distance(x, y, agent) for agent in catchment]
+        best_distance = min(distances)
+        return self.simulation.rng.choice([
+            agent for agent, distance in zip(catchment, distances)
+            if distance == best_distance
+        ])
+
+    def nearest_many(self, sources, candidates, k=1, radius=None, where=None):
+        '''
+        Answers nearest queries for a whole population at once.
+
+        For each of the sources returns the nearest of the candidates,
+        or None if there are none. If k > 1 then a list of up to k
+        candidates is returned for each source instead, nearest first.
+        Sources never count as their own nearest candidate.
+
+        Distances are the same wrap-aware Manhattan distances as
+        distance_between, and equally near candidates are chosen
+        between at random. If radius is given then only candidates
+        within that radius neighbourhood of a source are considered.
+
+        Sources and candidates may be agent classes or lists of things.
+        Candidates can be narrowed down with where, as for nearest.
+        '''
+
+        # User can pass an agent class or a list of things
+        if hasattr(sources, 'objects'):
+            sources = sources.objects
+        sources = list(sources)
+        candidates = list(self._candidate_list(candidates, where))
+
+        empty = None if k == 1 else []
+        if not sources:
+            return []
+        if not candidates:
+            return [empty for _ in sources]
+
+        source_xs, source_ys = self._coordinate_arrays(sources)
+        candidate_xs, candidate_ys = self._coordinate_arrays(candidates)
+
+        # Sources which are also candidates must not find themselves
+        columns = {id(candidate): column for column, candidate in enumerate(candidates)}
+        self_columns = np.array([columns.get(id(source), -1) for source in sources])
+
+        if radius:
+            neighbourhood_stencil = self.stencil(radius)
+            reach = neighbourhood_stencil.radius
+            masks = self._stencil_masks(neighbourhood_stencil)
+
+        k = min(k, len(candidates))
+        results = []
+
+        # Work through the sources in blocks to limit memory use
+        block_size = max(1, 2 ** 22 // len(candidates))
+        for start in range(0, len(sources), block_size):
+            stop = start + block_size
+
+            # Wrap-aware vectors from each source to each candidate
+            dx, dy = self.vectors_between(
+                source_xs[start:stop, None], source_ys[start:stop, None],
+                candidate_xs[None, :], candidate_ys[None, :]
+            )
+
+            # Distances are whole numbers, so adding random noise
+            # below one breaks ties randomly without reordering
+            distances = measure(dx, dy) + self.simulation.rng.generator.random(dx.shape)
+
+            # Exclude the sources themselves
+            rows = np.arange(distances.shape[0])
+            block_columns = self_columns[start:stop]
+            own = block_columns >= 0
+            distances[rows[own], block_columns[own]] = np.inf
+
+            # Exclude anything outside the radius
+            if radius:
+                parity = source_ys[start:stop, None] & 1
+                inside = (np.abs(dx) <= reach) & (np.abs(dy) <= reach)
+                covered = masks[
+                    parity,
+                    np.clip(dy + reach, 0, 2 * reach),
+                    np.clip(dx + reach, 0, 2 * reach)
+                ]
+                distances[~(inside & covered)] = np.inf
+
+            if k == 1:
+                best = np.argmin(distances, axis=1)
+                found = np.isfinite(distances[rows, best])
+                results.extend(
+                    candidates[column] if ok else None
+                    for column, ok in zip(best.tolist(), found.tolist())
+                )
+            else:
+                nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+                order = np.argsort(nearest_distances, axis=1)
+                nearest = np.take_along_axis(nearest, order, axis=1)
+                nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+                for columns_row, distances_row in zip(nearest.tolist(), np.isfinite(nearest_distances).tolist()):
+                    results.append([
+                        candidates[column] for column, ok in zip(columns_row, distances_row) if ok
+                    ])
+
+        return results
+
+    def _coordinate_arrays(self, things):
+        '''
+        Returns arrays of the x and y coordinates of some things
+        '''
+        coordinates = np.array([self._coordinates(thing) for thing in things], dtype=np.int64).reshape(-1, 2)
+        return coordinates[:, 0], coordinates[:, 1]
+
+    def _stencil_masks(self, neighbourhood_stencil):
+        '''
+        Returns boolean arrays, indexed by [row parity, dy + radius, dx + radius],
+        saying which offsets a neighbourhood stencil covers
+        '''
+        reach = neighbourhood_stencil.radius
+        masks = np.zeros((2, 2 * reach + 1, 2 * reach + 1), dtype=bool)
+        for parity in (0, 1):
+            for dx, dy in neighbourhood_stencil.offsets_for(parity):
+                masks[parity, dy + reach, dx + reach] = True
+        return masks
+
+    def _coordinates(self, thing):
+        '''
+        Returns the coordinates of a location, or of a thing with a location
+        '''
+        location = getattr(thing, 'location', thing)
+        try:
+            return location.x, location.y
+        except AttributeError:
+            raise Exception('Cannot find the coordinates of an unlocatable object')
+
     def vector_between(self, x1, y1, x2, y2):
         '''
         Returns a screen wrapping-aware shortest vector
         between (x1, y1) and (x2, y2)
         '''
 
-        # Shorthand references
         simulation = self.simulation
-        width = simulation.width
-        height = simulation.height
-        half_width = width / 2
-        half_height = height / 2
 
         # Compute naive, non-wrapping distance
         dx = x2 - x1
         dy = y2 - y1
 
         # Adjust for screen wrap
-
         if simulation.wrap_x:
-            if dx > half_width:
-                dx = dx - width
-            elif -1 * dx > half_width:
-                dx = dx + width     
-        
+            dx = wrapped_delta(dx, simulation.width)
         if simulation.wrap_y:
-            if dy > half_height:
-                dy = dy - height
-            elif -1 * dy > half_height:
-                dy = dy + height     
+            dy = wrapped_delta(dy, simulation.height)
 
-        # Return the vector components
         return dx, dy
 
-    def distance_between(self, thing1, thing2):
+    def distance_between(self, thing1, thing2, metric='manhattan'):
         '''
-        Returns a screen wrapping-aware distance
+        Returns a screen wrapping-aware distance.
+        Since things may only move in four directions, the
+        Manhattan distance is used unless told otherwise.
         '''
 
         # Things must be a location or have a location
+        x1, y1 = self._coordinates(thing1)
+        x2, y2 = self._coordinates(thing2)
 
-        if isinstance(thing1, Location):
-            x1 = thing1.x
-            y1 = thing1.y
-        elif hasattr(thing1, 'location'):
-            x1 = thing1.location.x
-            y1 = thing1.location.y
-        else:
-            raise Exception('Cannot calculate distance from unlocatable object') 
-
-        if isinstance(thing2, Location):
-            x2 = thing2.x
-            y2 = thing2.y
-        elif hasattr(thing2, 'location'):
-            x2 = thing2.location.x
-            y2 = thing2.location.y
-        else:
-            raise Exception('Cannot calculate distance to unlocatable object') 
-
-        # Get vector between things
         dx, dy = self.vector_between(x1, y1, x2, y2)
 
-        # Since things may only move in four directions,
-        # we must return the Manhattan distance
+        if metric == 'manhattan':
+            return abs(dx) + abs(dy)
+        return int(measure(dx, dy, metric))
+
+    def vectors_between(self, xs1, ys1, xs2, ys2):
+        '''
+        Array version of vector_between. Takes arrays of coordinates,
+        or anything NumPy can broadcast together (e.g. a column of
+        sources and a row of targets gives every pair at once).
+        '''
+
+        simulation = self.simulation
+
+        dx = np.subtract(xs2, xs1)
+        dy = np.subtract(ys2, ys1)
+
+        if simulation.wrap_x:
+            dx = wrapped_delta(dx, simulation.width)
+        if simulation.wrap_y:
+            dy = wrapped_delta(dy, simulation.height)
+
+        return dx, dy
+
+    def distances_between(self, xs1, ys1, xs2, ys2, metric='manhattan'):
+        '''
+        Array version of distance_between, taking coordinates
+        as for vectors_between
+        '''
+
+        dx, dy = self.vectors_between(xs1, ys1, xs2, ys2)
+        return measure(dx, dy, metric)
+
+
+#
+# Kernels
+#
+# These work on plain numbers and NumPy arrays alike, so that the
+# scalar and array versions of the geometry share one implementation.
+#
+
+def wrapped_delta(delta, size):
+    '''
+    Returns the shortest equivalent of a difference in coordinates
+    along an axis which wraps every size cells
+    '''
+    half = size / 2
+    return delta - size * (delta > half) + size * (-delta > half)
+
+
+def measure(dx, dy, metric='manhattan'):
+    '''
+    Returns the length of a vector under a distance metric
+    '''
+    if metric == 'manhattan':
         return abs(dx) + abs(dy)
+    elif metric == 'chebyshev':
+        return np.maximum(abs(dx), abs(dy))
+    raise Exception("Unknown distance metric '%s'" % metric)
@@ -0,0 +1,361 @@
+from collections import deque
+from heapq import heappop, heappush
+
+
+class Hierarchy(object):
+    '''
+    Hierarchical pathfinding (HPA*) for obstructed worlds.
+
+    The world is divided into square clusters of cells. Wherever two
+    neighbouring clusters share a passable stretch of border there is
+    an entrance, made up of a node cell on each side. Routes are found
+    in two levels: A* over the graph of entrance nodes, whose edges are
+    the distances between nodes within a cluster, and then ordinary
+    steps within the agent's current cluster towards the next node.
+
+    Everything is worked out lazily and kept in LRU caches:
+        'hpa_paths'   (cluster, node, goal) -> cost from the node to the
+                      goal, the next node to head for, and the clusters
+                      the route passes through
+        'hpa_fields'  (cluster, cell) -> distances to the cell from the
+                      other cells of the cluster, moving within it
+
+    When part of the world changes (see Caches.invalidate_area) only the
+    entrances, fields and paths involving the affected clusters are
+    thrown away.
+    '''
+
+    # Stands in for the goal in the graph of nodes
+    GOAL = -1
+
+    # Passable stretches of border at least this long get an
+    # entrance at each end rather than one in the middle
+    LONG_ENTRANCE = 6
+
+    def __init__(self, simulation, cluster_size=16):
+        self.simulation = simulation
+        self.cluster_size = cluster_size
+        world = simulation.world
+        self.clusters_wide = -(-world.width // cluster_size)
+        self.clusters_high = -(-world.height // cluster_size)
+        # Caches
+        caches = simulation.caches
+        self._paths = caches.cache('hpa_paths', maxsize=65536, invalidated_by=['wrap'])
+        self._fields = caches.cache('hpa_fields', maxsize=4096, invalidated_by=['wrap'])
+        caches.area_listeners.append(self.area_changed)
+        # Entrances, found by build_entrances
+        self.nodes = {}
+        self.partners = {}
+        self._wrapping = None
+
+    def __repr__(self):
+        return 'Hierarchy(%s x %s clusters of size %s)' % (self.clusters_wide, self.clusters_high, self.cluster_size)
+
+    #
+    # Clusters
+    #
+
+    def cluster_of(self, index):
+        ''' Returns the id of the cluster containing a cell index '''
+        y, x = divmod(index, self.simulation.width)
+        size = self.cluster_size
+        return (y // size) * self.clusters_wide + (x // size)
+
+    def bounds(self, cluster_id):
+        ''' Returns (x_start, y_start, x_end, y_end) of a cluster, end exclusive '''
+        cy, cx = divmod(cluster_id, self.clusters_wide)
+        size = self.cluster_size
+        x_start = cx * size
+        y_start = cy * size
+        return (
+            x_start, y_start,
+            min(x_start + size, self.simulation.width),
+            min(y_start + size, self.simulation.height)
+        )
+
+    def _passable(self, index):
+        return self.simulation.world.capacity_at(index) > 0
+
+    #
+    # Entrances
+    #
+
+    def build_entrances(self, cluster_ids=None):
+        '''
+        Find the entrances on the borders of some clusters, or all of them
+        '''
+
+        simulation = self.simulation
+        self._wrapping = (simulation.wrap_x, simulation.wrap_y)
+        if cluster_ids is None:
+            cluster_ids = range(self.clusters_wide * self.clusters_high)
+            self.nodes = {}
+            self.partners = {}
+        cluster_ids = set(cluster_ids)
+
+        # Forget the old entrances of these clusters...
+        for cluster_id in cluster_ids:
+            for node in self.nodes.pop(cluster_id, ()):
+                for partner in self.partners.pop(node, ()):
+                    partner_cluster = self.cluster_of(partner)
+                    if partner_cluster not in cluster_ids:
+                        self._unlink(partner, node)
+
+        # ...and find the new ones, along each border once
+        borders = set()
+        for cluster_id in cluster_ids:
+            cy, cx = divmod(cluster_id, self.clusters_wide)
+            for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                border = self._border(cx, cy, dx, dy)
+                if border is not None:
+                    borders.add(border)
+        for cells in borders:
+            self._add_entrances(cells)
+
+    def _border(self, cx, cy, dx, dy):
+        '''
+        Returns the pairs of cells either side of the border between a
+        cluster and its neighbour, ordered so each border is found once
+        '''
+        simulation = self.simulation
+        width = simulation.width
+        height = simulation.height
+        nx, ny = cx + dx, cy + dy
+        if not 0 <= nx < self.clusters_wide:
+            if not simulation.wrap_x:
+                return None
+            nx %= self.clusters_wide
+        if not 0 <= ny < self.clusters_high:
+            if not simulation.wrap_y:
+                return None
+            ny %= self.clusters_high
+        # Always describe the border from the left or top cluster
+        if dx < 0 or dy < 0:
+            return self._border(nx, ny, -dx, -dy)
+        x_start, y_start, x_end, y_end = self.bounds(cy * self.clusters_wide + cx)
+        if dx:
+            x, other_x = x_end - 1, x_end % width
+            return tuple((y * width + x, y * width + other_x) for y in range(y_start, y_end))
+        y, other_y = y_end - 1, y_end % height
+        return tuple((y * width + x, other_y * width + x) for x in range(x_start, x_end))
+
+    def _add_entrances(self, cells):
+        ''' Add entrances for each passable stretch of a border '''
+        runs = []
+        run = []
+        for a, b in cells:
+            if a != b and self._passable(a) and self._passable(b):
+                run.append((a, b))
+            elif run:
+                runs.append(run)
+                run = []
+        if run:
+            runs.append(run)
+        for run in runs:
+            if len(run) >= self.LONG_ENTRANCE:
+                entrances = (run[0], run[-1])
+            else:
+                entrances = (run[len(run) // 2],)
+            for a, b in entrances:
+                self._link(a, b)
+                self._link(b, a)
+
+    def _link(self, node, partner):
+        self.nodes.setdefault(self.cluster_of(node), set()).add(node)
+        partners = self.partners.setdefault(node, [])
+        if partner not in partners:
+            partners.append(partner)
+
+    def _unlink(self, node, partner):
+        partners = self.partners.get(node, [])
+        if partner in partners:
+            partners.remove(partner)
+        if not partners:
+            self.partners.pop(node, None)
+            cluster_nodes = self.nodes.get(self.cluster_of(node))
+            if cluster_nodes is not None:
+                cluster_nodes.discard(node)
+
+    def _ensure_built(self):
+        simulation = self.simulation
+        if self._wrapping != (simulation.wrap_x, simulation.wrap_y):
+            self.build_entrances()
+
+    #
+    # Changes to the world
+    #
+
+    def area_changed(self, x_start, y_start, width, height):
+        '''
+        Rebuild only the clusters touching a changed rectangle,
+        including those just across its edges, since entrances
+        depend on the cells on both sides of a border
+        '''
+        if self._wrapping is None:
+            # Nothing has been built yet
+            return
+        simulation = self.simulation
+        affected = set()
+        for y in range(y_start - 1, y_start + height + 1):
+            for x in range(x_start - 1, x_start + width + 1):
+                if not (0 <= x < simulation.width and 0 <= y < simulation.height):
+                    continue
+                affected.add(self.cluster_of(y * simulation.width + x))
+        self.build_entrances(affected)
+        for key in list(self._fields.entries):
+            if key[0] in affected:
+                self._fields.pop(key)
+        for key, entry in list(self._paths.entries.items()):
+            # Anywhere without a route might have one now
+            if entry is None or entry[2] & affected:
+                self._paths.pop(key)
+
+    #
+    # Local distances
+    #
+
+    def local_field(self, cluster_id, cell):
+        '''
+        Returns a dict of the distances to a cell from the cells of a
+        cluster which can reach it without leaving the cluster
+        '''
+
+        key = (cluster_id, cell)
+        field = self._fields.get(key)
+        if field is not None:
+            return field
+
+        table = self.simulation.routing._neighbour_table()[1]
+        cluster_of = self.cluster_of
+        passable = self._passable
+        field = {cell: 0}
+        queue = deque([cell])
+        while queue:
+            current = queue.popleft()
+            distance = field[current] + 1
+            for neighbour in table[current]:
+                if neighbour < 0 or neighbour in field:
+                    continue
+                if cluster_of(neighbour) != cluster_id or not passable(neighbour):
+                    continue
+                field[neighbour] = distance
+                queue.append(neighbour)
+
+        self._fields.set(key, field)
+        return field
+
+    #
+    # Routes
+    #
+
+    def _heuristic(self, index, goal):
+        simulation = self.simulation
+        width = simulation.width
+        y1, x1 = divmod(index, width)
+        y2, x2 = divmod(goal, width)
+        dx, dy = simulation.vector_between(x1, y1, x2, y2)
+        return abs(dx) + abs(dy)
+
+    def route(self, node, goal):
+        '''
+        Returns (cost, next node, clusters) for the best route from an
+        entrance node to a goal cell, or None if there is no route
+        '''
+
+        cluster_id = self.cluster_of(node)
+        key = (cluster_id, node, goal)
+        if key in self._paths:
+            return self._paths.get(key)
+
+        goal_cluster = self.cluster_of(goal)
+        goal_field = self.local_field(goal_cluster, goal)
+        nodes = self.nodes
+        partners = self.partners
+        cluster_of = self.cluster_of
+        heuristic = self._heuristic
+
+        costs = {node: 0}
+        parents = {node: None}
+        queue = [(heuristic(node, goal), 0, node)]
+        found = False
+        while queue:
+            _, cost, current = heappop(queue)
+            if current == self.GOAL:
+                found = True
+                break
+            if cost > costs[current]:
+                continue
+            current_cluster = cluster_of(current)
+            edges = [(partner, 1) for partner in partners.get(current, ())]
+            field = self.local_field(current_cluster, current)
+            edges.extend(
+                (other, field[other]) for other in nodes.get(current_cluster, ())
+                if other != current and other in field
+            )
+            if current_cluster == goal_cluster and current in goal_field:
+                edges.append((self.GOAL, goal_field[current]))
+            for other, step in edges:
+                new_cost = cost + step
+                if new_cost < costs.get(other, new_cost + 1):
+                    costs[other] = new_cost
+                    parents[other] = current
+                    estimate = 0 if other == self.GOAL else heuristic(other, goal)
+                    heappush(queue, (new_cost + estimate, new_cost, other))
+
+        if not found:
+            self._paths.set(key, None)
+            return None
+
+        # Every later node on the route has the rest of it as its best
+        # route, so remember those too
+        path = [self.GOAL]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        path.reverse()
+        total = costs[self.GOAL]
+        clusters = {goal_cluster}
+        result = None
+        for position in range(len(path) - 2, -1, -1):
+            current = path[position]
+            clusters = clusters | {cluster_of(current)}
+            entry = (total - costs[current], path[position + 1], frozenset(clusters))
+            self._paths.set((cluster_of(current), current, goal), entry)
+            result = entry
+        return result
+
+    def waypoint(self, start, goal):
+        '''
+        Returns the cell an agent at start should head for next on its
+        way to goal. This is either in the agent's own cluster, and can
+        be reached by following local_field, or is just across the
+        border. Returns None if there is no route.
+        '''
+
+        self._ensure_built()
+
+        if start == goal:
+            return goal
+
+        start_cluster = self.cluster_of(start)
+        if start_cluster == self.cluster_of(goal):
+            if start in self.local_field(start_cluster, goal):
+                return goal
+
+        best = None
+        for node in self.nodes.get(start_cluster, ()):
+            distance = self.local_field(start_cluster, node).get(start)
+            if distance is None:
+                continue
+            route = self.route(node, goal)
+            if route is None:
+                continue
+            total = distance + route[0]
+            if best is None or total < best[0]:
+                best = (total, node, route[1])
+
+        if best is None:
+            return None
+        _, node, next_node = best
+        if node == start:
+            return goal if next_node == self.GOAL else next_node
+        return node
@@ -0,0 +1,207 @@
+import numpy as np
+
+from ..states import State
+
+
+class Layers(object):
+    '''
+    Provides whole-grid neighbour counts.
+
+    A layer is a (height, width) array holding the number of agents of
+    a class, or in a state, in each cell. Convolving a layer with a
+    neighbourhood stencil counts how many of them are in the
+    neighbourhood of every cell at once.
+
+    Counts are kept in the 'neighbour_counts' cache, and the World and
+    the Memberships keep them up to date as agents arrive, leave, move
+    and change state, by adding or subtracting one over the cells whose
+    neighbourhood includes the agent's cell. This means looking one up
+    from State.handle costs O(1) and each change costs O(stencil), even
+    in asynchronous execution where every agent changes the counts. In
+    synchronous execution, where state changes wait for the end of the
+    tick, every agent sees the same counts unless agents move.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # Bind methods
+        self.simulation.layer = self.layer
+        self.simulation.count_neighbours = self.count_neighbours
+        self.simulation.convolve = self.convolve
+        self.simulation.layers = self
+        # Caches
+        self._counts = simulation.caches.cache('neighbour_counts', maxsize=32, invalidated_by=['wrap'])
+        # Cached counts, which are only kept up to date while there are any
+        self.tracking = self._counts.entries
+        # Changes to the world and the memberships are passed on
+        simulation.world.layers = self
+        simulation.memberships.layers = self
+
+    def layer(self, what):
+        '''
+        Returns a new (height, width) array counting, for each cell,
+        the agents of exactly an agent class or in a state class
+        '''
+
+        simulation = self.simulation
+        world = simulation.world
+
+        if world.sparse:
+            raise Exception('Layers are not supported for sparse worlds')
+
+        if isinstance(what, type) and issubclass(what, State):
+            layer = np.zeros(world.size, dtype=np.int32)
+            memberships = simulation.memberships
+            for agent_class in {agent_class for agent_class, state_class in memberships.members}:
+                group = memberships.agents_in_state(agent_class, what)
+                indices = [agent.location.index for agent in group if getattr(agent, 'location', None)]
+                np.add.at(layer, indices, 1)
+        else:
+            layer = world.class_counts(what).copy()
+
+        return world.grid(layer)
+
+    def count_neighbours(self, what, strategy=None, radius=1, border_only=False, include_self_location=False):
+        '''
+        Returns a (height, width) array counting, for each cell, the agents
+        of an agent class or in a state class within its neighbourhood.
+        Cells beyond a non-wrapping edge count as empty.
+
+        The array is shared and kept up to date, so do not modify it.
+        '''
+
+        simulation = self.simulation
+        strategy = strategy or simulation.neighbourhood_strategy
+        key = (what, strategy, radius, border_only, include_self_location)
+
+        cached = self._counts.get(key)
+        if cached is not None:
+            return cached[1]
+
+        neighbourhood_stencil = simulation.stencil(radius, border_only, strategy)
+        counts = self.convolve(self.layer(what), neighbourhood_stencil, include_self_location)
+
+        self._counts.set(key, (neighbourhood_stencil, counts))
+        return counts
+
+    #
+    # Keeping counts up to date - called by the World and the Memberships
+    #
+
+    def agent_added(self, index, agent, delta=1):
+        ''' Count an agent which has arrived in a cell '''
+        is_in_state = self.simulation.memberships.is_in_state
+        agent_class = type(agent)
+        for key, (neighbourhood_stencil, counts) in self._counts.entries.items():
+            what = key[0]
+            if what is agent_class or is_in_state(agent, what):
+                self._spread(counts, neighbourhood_stencil, key[4], index, delta)
+
+    def agent_removed(self, index, agent):
+        ''' Stop counting an agent which has left a cell '''
+        self.agent_added(index, agent, -1)
+
+    def agent_moved(self, old_index, new_index, agent):
+        ''' Count an agent in its new cell rather than its old one '''
+        self.agent_added(old_index, agent, -1)
+        self.agent_added(new_index, agent)
+
+    def state_changed(self, agent, old_lineage, new_lineage):
+        '''
+        Count an agent as in the state classes of its new state rather
+        than those of its old one, if it is in the world
+        '''
+        location = getattr(agent, 'location', None)
+        if location is None:
+            return
+        index = location.index
+        if agent not in self.simulation.world.contents.get(index, ()):
+            # Not arrived yet, or already gone
+            return
+        for key, (neighbourhood_stencil, counts) in self._counts.entries.items():
+            what = key[0]
+            was, now = what in old_lineage, what in new_lineage
+            if was != now:
+                self._spread(counts, neighbourhood_stencil, key[4], index, 1 if now else -1)
+
+    def convolve(self, layer, neighbourhood_stencil, include_centre=False):
+        '''
+        Returns a new (height, width) array holding, for each cell,
+        the sum of a layer over the cell's neighbourhood
+        '''
+        counts = self._convolve(layer, neighbourhood_stencil.even, include_centre)
+        if neighbourhood_stencil.odd != neighbourhood_stencil.even:
+            # Odd rows have their own offsets
+            odd_counts = self._convolve(layer, neighbourhood_stencil.odd, include_centre)
+            counts[1::2] = odd_counts[1::2]
+        return counts
+
+    #
+    # Internal methods
+    #
+
+    def _convolve(self, layer, offsets, include_centre):
+        '''
+        Sums the layer shifted by each of the offsets
+        '''
+        counts = np.zeros(layer.shape, dtype=np.int32)
+        for dx, dy in offsets:
+            if not include_centre and dx == 0 and dy == 0:
+                continue
+            counts += self._shifted(layer, dx, dy)
+        return counts
+
+    def _spread(self, counts, neighbourhood_stencil, include_centre, index, delta):
+        '''
+        Adds delta to the counts of every cell whose neighbourhood
+        includes the cell at index, i.e. convolves a single agent
+        '''
+        simulation = self.simulation
+        height, width = counts.shape
+        y, x = divmod(index, width)
+        wrap_x, wrap_y = simulation.wrap_x, simulation.wrap_y
+        even, odd = neighbourhood_stencil.even, neighbourhood_stencil.odd
+        # Odd rows only have their own offsets if they differ
+        parities = ((even, None),) if odd == even else ((even, 0), (odd, 1))
+        for offsets, parity in parities:
+            for dx, dy in offsets:
+                if not include_centre and dx == 0 and dy == 0:
+                    continue
+                # The cell which sees this one at offset (dx, dy)
+                cell_x, cell_y = x - dx, y - dy
+                if wrap_x:
+                    cell_x %= width
+                elif not 0 <= cell_x < width:
+                    continue
+                if wrap_y:
+                    cell_y %= height
+                elif not 0 <= cell_y < height:
+                    continue
+                if parity is not None and cell_y % 2 != parity:
+                    continue
+                counts[cell_y, cell_x] += delta
+
+    def _shifted(self, layer, dx, dy):
+        '''
+        Returns the layer shifted so that result[y, x] == layer[y + dy, x + dx],
+        wrapping if required and otherwise filling with zeros
+        '''
+        simulation = self.simulation
+        for axis, offset, wrap in ((1, dx, simulation.wrap_x), (0, dy, simulation.wrap_y)):
+            if not offset:
+                continue
+            if wrap:
+                layer = np.roll(layer, -offset, axis=axis)
+                continue
+            source = [slice(None), slice(None)]
+            target = [slice(None), slice(None)]
+            if offset > 0:
+                source[axis] = slice(offset, None)
+                target[axis] = slice(None, -offset)
+            else:
+                source[axis] = slice(None, offset)
+                target[axis] = slice(-offset, None)
+            shifted = np.zeros_like(layer)
+            shifted[tuple(target)] = layer[tuple(source)]
+            layer = shifted
+        return layer
@@ -0,0 +1,130 @@
+class Memberships(object):
+    '''
+    Keeps track of which agents are currently in which state, so that
+    queries such as "the nearest live sheep" never have to filter a
+    whole population first.
+
+    Agents are grouped by (agent class, state class). An agent belongs
+    to the group of the class of its current state and, so that asking
+    for a base state class finds agents in any of its subclasses too,
+    to the group of every base state class which has been asked about.
+    Groups for a base class (State itself, say) are only made the first
+    time it is asked about, so that agents don't pay for an entry in
+    groups nobody looks at. Stateful keeps the groups up to date
+    whenever its state stack changes.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # (agent class, state class) -> agents, using dicts
+        # as ordered sets for O(1) removal
+        self.members = {}
+        # State class -> the state classes it counts as
+        self._lineages = {}
+        # State classes which have been asked about
+        self._queried = set()
+        # Number of changes so far, so that anything which copies
+        # the memberships can tell when its copy is out of date
+        self.changes = 0
+        # Neighbour counts to keep up to date (see Layers)
+        self.layers = None
+        # Bind methods
+        self.simulation.memberships = self
+        self.simulation.agents_in_state = self.agents_in_state
+
+    def __repr__(self):
+        return 'Memberships(%s groups)' % len(self.members)
+
+    def _lineage(self, state):
+        '''
+        Returns the state classes that a state (or state class) counts
+        as, i.e. its own class and the base classes asked about so far
+        '''
+        state_class = state if isinstance(state, type) else type(state)
+        try:
+            return self._lineages[state_class]
+        except KeyError:
+            queried = self._queried
+            lineage = self._lineages[state_class] = (state_class,) + tuple(
+                cls for cls in state_class.__mro__[1:] if cls in queried
+            )
+            return lineage
+
+    def _query(self, state_class):
+        '''
+        Start grouping agents by a state class, which nothing
+        has asked about before, as well as by their own classes
+        '''
+        self._queried.add(state_class)
+        self._lineages.clear()
+        members = self.members
+        for (agent_class, member_class), group in list(members.items()):
+            if member_class is not state_class and issubclass(member_class, state_class):
+                try:
+                    members[(agent_class, state_class)].update(group)
+                except KeyError:
+                    members[(agent_class, state_class)] = dict(group)
+
+    #
+    # Maintenance
+    #
+
+    def update(self, agent, old_state, new_state):
+        '''
+        Record that the current state of an agent has changed.
+        Either state may be None if the agent had or has no state.
+        '''
+        old_lineage = self._lineage(old_state) if old_state is not None else ()
+        new_lineage = self._lineage(new_state) if new_state is not None else ()
+        if old_lineage is new_lineage:
+            return
+        self.changes += 1
+        agent_class = type(agent)
+        members = self.members
+        for state_class in old_lineage:
+            key = (agent_class, state_class)
+            group = members[key]
+            del group[agent]
+            if not group:
+                del members[key]
+        for state_class in new_lineage:
+            key = (agent_class, state_class)
+            try:
+                members[key][agent] = None
+            except KeyError:
+                members[key] = {agent: None}
+        layers = self.layers
+        if layers is not None and layers.tracking:
+            layers.state_changed(agent, old_lineage, new_lineage)
+
+    #
+    # Queries
+    #
+
+    def agents_in_state(self, agent_class, state_class):
+        '''
+        Returns the agents of exactly agent_class whose current state
+        is an instance of state_class. This is a live view, so take a
+        copy before changing the states of the agents in it.
+        '''
+        if state_class not in self._queried:
+            self._query(state_class)
+        return self.members.get((agent_class, state_class), {}).keys()
+
+    def is_in_state(self, agent, state_class):
+        if state_class not in self._queried:
+            self._query(state_class)
+        group = self.members.get((type(agent), state_class))
+        return group is not None and agent in group
+
+    def predicate(self, where):
+        '''
+        Turns the `where` argument of a query, which is a state class
+        or a function of an agent returning a bool, into a predicate
+        '''
+        if where is None or not isinstance(where, type):
+            return where
+        if where not in self._queried:
+            self._query(where)
+        is_in_state = self.is_in_state
+        return lambda agent: is_in_state(agent, where)
@@ -104,6 +104,19 @@ class Grid():
         c1 = 12 * (x + y * self.w)
         self.vertex_list.colors[c1:c1+12] = [r, g, b] * 4
         
+    def unset_area(self, x_start, y_start, x_end, y_end):
+        '''
+        Unset every cell in a rectangle back to the background colour.
+        The end coordinates are exclusive.
+        '''
+        # Unpack colour values
+        r, g, b, alpha = self.background
+        # Each row of the rectangle is a contiguous run of cells
+        row = [r, g, b] * 4 * (x_end - x_start)
+        for y in range(y_start, y_end):
+            c1 = 12 * (x_start + y * self.w)
+            self.vertex_list.colors[c1:c1+len(row)] = row
+        
     def clear_all_cells(self):
         '''
         Clear the color of all cells.
@@ -0,0 +1,122 @@
+from bisect import bisect
+from itertools import accumulate
+
+import numpy as np
+
+
+class Random(object):
+    '''
+    The simulation's own random numbers, bound as simulation.rng (and
+    available to agents and states as self.rng).
+
+    Everything random in the simulation is drawn from here, so a run
+    can be reproduced exactly by giving the same seed to the Simulation.
+    The seed actually used is simulation.rng.seed, which is made up at
+    random if none was given.
+
+    Numbers come from a NumPy Generator, which is drawn from in batches:
+    random(), bernoulli() etc. just take the next number from a batch
+    of uniform numbers, which is much cheaper than asking the generator
+    for each one.
+    Arrays of numbers can be had from the generator itself.
+
+    Independent streams, e.g. one for each part of a model, can be had
+    with stream(), and are the same for the same seed and key.
+
+    Example:
+        if self.rng.bernoulli(0.01):
+            self.agent.replace_state(OnFire, timer=self.rng.randint(6, 10))
+    '''
+
+    # How many numbers are drawn at a time
+    batch_size = 4096
+
+    def __init__(self, simulation, seed=None):
+        self.simulation = simulation
+        self.reseed(seed)
+        # Bind methods
+        self.simulation.rng = self
+
+    def __repr__(self):
+        return 'Random(seed=%s)' % self.seed
+
+    def reseed(self, seed=None):
+        ''' Start again from a seed (a new random one if None) '''
+        sequence = np.random.SeedSequence(seed)
+        self.seed = sequence.entropy
+        self.generator = np.random.default_rng(sequence)
+        self._batch = []
+
+    def stream(self, *key):
+        ''' Returns a Generator of its own for the given key, e.g. (agent class, tick) '''
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=key))
+
+    #
+    # Single numbers, from the batch
+    #
+
+    # NOTE: These are called a lot, so they take from the
+    #       batch themselves rather than calling random()
+
+    def random(self):
+        ''' Returns a float in [0, 1) '''
+        try:
+            return self._batch.pop()
+        except IndexError:
+            self._batch = self.generator.random(self.batch_size).tolist()
+            return self._batch.pop()
+
+    def bernoulli(self, probability):
+        ''' Returns True with the given probability '''
+        try:
+            return self._batch.pop() < probability
+        except IndexError:
+            return self.random() < probability
+
+    def randrange(self, start, stop=None):
+        ''' Returns an int in [start, stop), or [0, start) '''
+        if stop is None:
+            start, stop = 0, start
+        return start + int(self.random() * (stop - start))
+
+    def randint(self, a, b):
+        ''' Returns an int in [a, b], including both ends '''
+        try:
+            return a + int(self._batch.pop() * (b - a + 1))
+        except IndexError:
+            return a + int(self.random() * (b - a + 1))
+
+    #
+    # Sequences
+    #
+
+    def choice(self, sequence):
+        ''' Returns a random element of a non-empty sequence '''
+        if not sequence:
+            raise IndexError('Cannot choose from an empty sequence')
+        try:
+            return sequence[int(self._batch.pop() * len(sequence))]
+        except IndexError:
+            return sequence[int(self.random() * len(sequence))]
+
+    def choices(self, population, weights=None, k=1):
+        ''' Returns a list of k elements, chosen with replacement '''
+        if weights is None:
+            return [self.choice(population) for _ in range(k)]
+        cumulative = list(accumulate(weights))
+        total = cumulative[-1]
+        if total <= 0:
+            raise ValueError('Total of weights must be greater than zero')
+        return [population[bisect(cumulative, self.random() * total)] for _ in range(k)]
+
+    def shuffle(self, items):
+        ''' Shuffles a list in place '''
+        size = len(items)
+        if size > 64:
+            # Big lists are quicker to shuffle in NumPy
+            items[:] = [items[index] for index in self.generator.permutation(size).tolist()]
+            return
+        random = self.random
+        for i in range(size - 1, 0, -1):
+            j = int(random() * (i + 1))
+            items[i], items[j] = items[j], items[i]
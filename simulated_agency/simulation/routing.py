@@ -0,0 +1,207 @@
+import numpy as np
+
+from .hierarchy import Hierarchy
+
+
+class Routing(object):
+    '''
+    Provides routing towards goal locations.
+
+    The simulation's routing_strategy (which states may override) is one of:
+        'greedy'      step along the shortest vector to the goal,
+                      ignoring anything in the way (the default)
+        'flow_field'  step down a distance field shared by every agent
+                      heading for the same goal, going around obstructions
+        'hpa'         follow routes found by hierarchical pathfinding
+                      (see Hierarchy), which suits many different goals
+
+    Distance fields are found by a breadth-first search out from the
+    goal through passable cells (capacity > 0), using the same up, down,
+    left and right moves as Mobile agents and respecting wrap_x/wrap_y.
+    They are kept in the 'distance_fields' cache until the goal changes,
+    the world changes or wrapping changes.
+    '''
+
+    # Distance of cells from which the goal cannot be reached
+    UNREACHABLE = -1
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # Created when first needed (see hierarchy)
+        self._hierarchy = None
+        # Bind methods
+        self.simulation.routing = self
+        self.simulation.distance_field = self.distance_field
+        self.simulation.next_steps = self.next_steps
+        # Caches
+        caches = simulation.caches
+        self._fields = caches.cache('distance_fields', maxsize=64, invalidated_by=['world', 'wrap'])
+        self._neighbour_tables = caches.cache('neighbour_tables', maxsize=1, invalidated_by=['wrap'])
+        # Strategy name -> function(start, goal) -> (better, level) or None
+        self.strategies = {
+            'flow_field': self._flow_field_steps,
+            'hpa': self._hpa_steps,
+        }
+
+    def next_steps(self, start, goal, strategy=None):
+        '''
+        Returns the locations worth stepping to from start on the way to
+        goal, as two lists: those which bring us closer, and those which
+        keep us as close as we are now (to get past a crowd). Returns
+        None if the strategy cannot find a route, in which case callers
+        should fall back to greedy movement.
+        '''
+        strategy = strategy or self.simulation.routing_strategy
+        try:
+            steps = self.strategies[strategy]
+        except KeyError:
+            raise Exception("Unknown routing strategy '%s'" % strategy)
+        return steps(start, goal)
+
+    #
+    # Flow fields
+    #
+
+    def distance_field(self, goal):
+        '''
+        Returns an array holding, for each cell index, the number
+        of moves needed to reach the goal location, or UNREACHABLE
+        '''
+
+        return self._distance_field(goal)[0]
+
+    def _distance_field(self, goal):
+        '''
+        Returns the distance field for a goal both as an array
+        and as a list, which is quicker to read one cell at a time
+        '''
+
+        cached = self._fields.get(goal.index)
+        if cached is not None:
+            return cached
+
+        world = self.simulation.world
+        if world.sparse:
+            raise Exception('Distance fields are not supported for sparse worlds')
+
+        table = self.neighbour_table()
+        passable = world.capacity > 0
+        field = np.full(world.size, self.UNREACHABLE, dtype=np.int32)
+        field[goal.index] = 0
+
+        # Breadth-first search, one whole frontier at a time
+        frontier = np.array([goal.index])
+        distance = 0
+        while frontier.size:
+            distance += 1
+            reached = np.unique(table[frontier].ravel())
+            reached = reached[reached >= 0]
+            reached = reached[(field[reached] == self.UNREACHABLE) & passable[reached]]
+            field[reached] = distance
+            frontier = reached
+
+        cached = (field, field.tolist())
+        self._fields.set(goal.index, cached)
+        return cached
+
+    def neighbour_table(self):
+        '''
+        Returns a (size, 4) array of the up, down, left and right
+        neighbours of each cell index, with -1 beyond non-wrapping edges
+        '''
+
+        return self._neighbour_table()[0]
+
+    def _neighbour_table(self):
+        '''
+        Returns the neighbour table both as an array and as a list
+        '''
+
+        cached = self._neighbour_tables.get('moves')
+        if cached is not None:
+            return cached
+
+        simulation = self.simulation
+        width = simulation.width
+        height = simulation.height
+        indices = np.arange(width * height)
+        xs = indices % width
+        ys = indices // width
+
+        columns = []
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            nxs = xs + dx
+            nys = ys + dy
+            outside = np.zeros(indices.shape, dtype=bool)
+            if simulation.wrap_x:
+                nxs %= width
+            else:
+                outside |= (nxs < 0) | (nxs >= width)
+            if simulation.wrap_y:
+                nys %= height
+            else:
+                outside |= (nys < 0) | (nys >= height)
+            columns.append(np.where(outside, -1, nys * width + nxs))
+        table = np.stack(columns, axis=1)
+
+        cached = (table, table.tolist())
+        self._neighbour_tables.set('moves', cached)
+        return cached
+
+    def _flow_field_steps(self, start, goal):
+        field = self._distance_field(goal)[1]
+        if field[start.index] == self.UNREACHABLE:
+            return None
+        return self._downhill(start, field, lambda index: field[index] != self.UNREACHABLE)
+
+    def _downhill(self, start, field, allowed):
+        '''
+        Returns the neighbouring locations which are nearer to, and as
+        near to, the goal as start is, according to a distance field
+        '''
+        world = self.simulation.world
+        here = field[start.index]
+        better = []
+        level = []
+        for index in self._neighbour_table()[1][start.index]:
+            if index < 0 or not allowed(index):
+                continue
+            distance = field[index]
+            if distance < here:
+                better.append(world.location(index))
+            elif distance == here:
+                level.append(world.location(index))
+        shuffle = self.simulation.rng.shuffle
+        if len(better) > 1:
+            shuffle(better)
+        if len(level) > 1:
+            shuffle(level)
+        return better, level
+
+    #
+    # Hierarchical pathfinding
+    #
+
+    def hierarchy(self):
+        '''
+        Returns the simulation's Hierarchy, creating it if necessary
+        '''
+        if self._hierarchy is None:
+            if self.simulation.world.sparse:
+                raise Exception('Hierarchical pathfinding is not supported for sparse worlds')
+            self._hierarchy = Hierarchy(self.simulation, self.simulation.cluster_size)
+        return self._hierarchy
+
+    def _hpa_steps(self, start, goal):
+        hierarchy = self.hierarchy()
+        target = hierarchy.waypoint(start.index, goal.index)
+        if target is None:
+            return None
+        if target == start.index:
+            return [], []
+        cluster_id = hierarchy.cluster_of(start.index)
+        if hierarchy.cluster_of(target) != cluster_id:
+            # Step across the border into the next cluster
+            return [self.simulation.world.location(target)], []
+        field = hierarchy.local_field(cluster_id, target)
+        return self._downhill(start, field, field.__contains__)
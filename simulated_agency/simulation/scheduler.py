@@ -0,0 +1,190 @@
+from .timing_wheel import TimingWheel
+
+
+class Scheduler(object):
+    '''
+    Lets agents go dormant until something wakes them up again, so
+    that the executor only has to run the agents which are active,
+    and runs state timers.
+
+    While most agents are active, the active agents are simply those in
+    the objects of the bound classes which aren't dormant, so they cost
+    nothing extra. Once most agents are dormant they are kept in an
+    active set instead, which agents join when they are created (or
+    their class is bound) and when they wake, and leave when they sleep
+    or are destroyed, so that dormant agents cost nothing until they
+    wake. The set is dropped again once most agents are awake.
+
+    An agent goes to sleep with agent.sleep() and is woken by whichever
+    comes first of:
+        - the given number of ticks having passed
+        - a change in the cells it is watching, i.e. an agent arriving,
+          leaving or changing state within the given radius
+        - a change to its own state, e.g. by another agent
+        - an explicit agent.wake(), e.g. from another agent
+
+    Agents which are woken during a tick run again from the next tick.
+    The ticks they slept through are added to their age (and to the age
+    of their state, if it is the one they went to sleep in) when they
+    wake, so a dormant agent ages just as it would have done if active.
+
+    Sleeping agents' alarms and states' timers (see State.timer) are kept
+    in a TimingWheel, bound as simulation.timers, which is turned at the
+    end of every tick.
+    '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # Bound agent classes, whose agents are executed
+        self.classes = set()
+        # Active agents while most agents are dormant, using a dict
+        # as an ordered set for O(1) removal, otherwise None
+        self.active = None
+        # Dormant agent -> (age when it went to sleep, its state then,
+        # cells watched, key of its alarm in the timing wheel)
+        self.dormant = {}
+        # Cell index -> the dormant agents watching it
+        self.watchers = {}
+        # Timing wheel of (function, argument) to call at a tick
+        self.timers = TimingWheel()
+        # Bind methods
+        self.simulation.scheduler = self
+        self.simulation.timers = self.timers
+
+    def __repr__(self):
+        return 'Scheduler(%s active, %s dormant)' % (len(self.agents()), len(self.dormant))
+
+    #
+    # Active agents
+    #
+
+    def agents(self):
+        ''' Returns a list of the active agents of every bound class '''
+        if self.active is not None:
+            return list(self.active)
+        agents = []
+        dormant = self.dormant
+        for agent_class in self.simulation.bound_agent_classes:
+            if dormant:
+                agents.extend(agent for agent in agent_class.objects if agent not in dormant)
+            else:
+                agents.extend(agent_class.objects)
+        return agents
+
+    def bind(self, agent_class):
+        ''' Start executing the agents of a newly bound class '''
+        self.classes.add(agent_class)
+        if self.active is not None:
+            for agent in agent_class.objects:
+                if agent not in self.dormant:
+                    self.active[agent] = None
+            self._rebalance()
+
+    def added(self, agent):
+        ''' Start executing a new agent, if its class is bound '''
+        if self.active is not None and type(agent) in self.classes:
+            self.active[agent] = None
+            self._rebalance()
+
+    def removed(self, agent):
+        ''' Forget about an agent which has been destroyed '''
+        if self.active is not None:
+            self.active.pop(agent, None)
+        if agent in self.dormant:
+            self._forget(agent)
+
+    #
+    # Sleeping and waking
+    #
+
+    def sleep(self, agent, ticks=None, watch=None):
+        '''
+        Take an agent out of the active set until it is woken, or for a
+        number of ticks, or until something changes within watch cells
+        (0 being its own cell) of its location
+        '''
+
+        if agent in self.dormant:
+            # Start sleeping again from now
+            self.wake(agent)
+        simulation = self.simulation
+        if self.active is not None:
+            self.active.pop(agent, None)
+
+        watched = ()
+        if watch is not None:
+            location = agent.location
+            if watch:
+                watched = location.neighbourhood_indices(watch)
+            else:
+                watched = (location.index,)
+            watchers = self.watchers
+            for index in watched:
+                try:
+                    watchers[index][agent] = None
+                except KeyError:
+                    watchers[index] = {agent: None}
+        alarm = None
+        if ticks is not None:
+            alarm = self.timers.schedule(simulation.age + ticks, (self.wake, agent))
+        self.dormant[agent] = (simulation.age, agent._top_state(), watched, alarm)
+        self._rebalance()
+
+    def wake(self, agent):
+        ''' Return a dormant agent to the active set '''
+        try:
+            slept_at, state, _, _ = self.dormant[agent]
+        except KeyError:
+            return
+        self._forget(agent)
+        if self.active is not None:
+            if type(agent) in self.classes:
+                self.active[agent] = None
+            self._rebalance()
+        # Catch up on the ticks slept through
+        missed = self.simulation.age - slept_at
+        agent.age += missed
+        if state is not None and agent._top_state() is state:
+            state.age += missed
+
+    def is_dormant(self, agent):
+        return agent in self.dormant
+
+    def disturb(self, index):
+        ''' Wake any agents watching a cell '''
+        watching = self.watchers.get(index)
+        if watching:
+            for agent in list(watching):
+                self.wake(agent)
+
+    def end_tick(self):
+        '''
+        Run the timers which are due, e.g. waking the
+        agents whose sleep is over by the next tick
+        '''
+        for function, argument in self.timers.advance(self.simulation.age):
+            function(argument)
+
+    def _rebalance(self):
+        '''
+        Keep an active set while most agents are dormant, and only then,
+        changing over with some slack so as not to keep changing back
+        '''
+        population = sum(len(agent_class.objects) for agent_class in self.classes)
+        dormant = len(self.dormant)
+        if self.active is None:
+            if dormant * 2 > population:
+                self.active = dict.fromkeys(self.agents())
+        elif dormant * 4 < population:
+            self.active = None
+
+    def _forget(self, agent):
+        _, _, watched, alarm = self.dormant.pop(agent)
+        if alarm is not None:
+            self.timers.cancel(alarm)
+        watchers = self.watchers
+        for index in watched:
+            watching = watchers[index]
+            del watching[agent]
+            if not watching:
+                del watchers[index]
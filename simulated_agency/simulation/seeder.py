@@ -1,7 +1,3 @@
-
-from random import choice
-
-
 class Seeder(object):
     '''
     Seeds a simulation with agents
@@ -75,20 +71,19 @@ class Seeder(object):
             simulation.seed_all(MyState, [StateOne, [StateTwo, {timer:1}], StateThree]
         '''
 
-        simulation = self.simulation
+        world = self.simulation.world
 
-        for x in range(0, simulation.width):
-            for y in range(0, simulation.height):
-                location = simulation.locations[x, y]
-                object_instance = object_class(location)
-                chosen_state = choice(possible_state_list)
-                try:
-                    # States with params
-                    initial_state_class, initial_state_params = chosen_state
-                    object_instance.add_state(initial_state_class, **initial_state_params)
-                except:
-                    # Unadorned states
-                    object_instance.add_state(chosen_state)
+        for index in range(0, world.size):
+            location = world.location(index)
+            object_instance = object_class(location)
+            chosen_state = self.simulation.rng.choice(possible_state_list)
+            try:
+                # States with params
+                initial_state_class, initial_state_params = chosen_state
+                object_instance.add_state(initial_state_class, **initial_state_params)
+            except:
+                # Unadorned states
+                object_instance.add_state(chosen_state)
 
     def create_obstruction_rectangle(self, x_start, y_start, width, height):
         '''
@@ -96,10 +91,8 @@ class Seeder(object):
         Note: Does not take into account screen wrapping.
         '''
 
-        locations = self.simulation.locations
+        world = self.simulation.world
+
+        world.set_rectangle(x_start, y_start, width, height, 0, (255, 255, 0)) #"yellow"
 
-        for x in range(x_start, x_start + width):
-            for y in range(y_start, y_start + height):
-                location = locations[x, y]
-                location.capacity = 0
-                location.colour = 11 #"yellow"
+        self.simulation.invalidate_area(x_start, y_start, width, height)
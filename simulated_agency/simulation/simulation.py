@@ -1,13 +1,19 @@
 
-import sys
-
-from random import randint, choice, shuffle
-from time import time
-
 from ..location import Location
+from .automaton import *
+from .buffer import *
+from .cache import *
 from .executor import *
 from .geometry import *
+from .layers import *
+from .membership import *
+from .rng import *
+from .routing import *
+from .scheduler import *
 from .seeder import *
+from .state_pool import *
+from .timestep import *
+from .world import *
 
 
 class Simulation(object):
@@ -17,14 +23,45 @@ class Simulation(object):
 
     # Strategy pattern for neighbour location
     neighbourhood_strategy = 'von_neumann'
+
+    # Size of the square chunks the world is divided into
+    chunk_size = 64
+
+    # Size of the square buckets used by spatial indexes
+    bucket_size = 8
+
+    # Strategy pattern for moving towards things (see Routing)
+    routing_strategy = 'greedy'
+
+    # Size of the square clusters used for hierarchical pathfinding
+    cluster_size = 16
     
-    def __init__(self, width=None, height=None, name=None):
+    def __init__(self, width=None, height=None, name=None, sparse=False, cell_size=None, seed=None):
 
         # Name of this simulation - used for file output
         self.name = name or 'simulation'
 
-        # Locations
-        self.locations = {}
+        # Memo caches - created first so that anything can use them
+        Caches(self)
+
+        # Random numbers, reproducible for a given seed
+        Random(self, seed)
+
+        # Which agents are in which states, for fast state queries
+        Memberships(self)
+
+        # Changes made during synchronous execution
+        DoubleBuffer(self)
+
+        # Which agents are active, and which are dormant
+        Scheduler(self)
+
+        # Recycled state instances
+        StatePool(self)
+
+        # Locations (see init_locations)
+        self.world = None
+        self.locations = None
 
         # Bound agent classes
         self.bound_agent_classes = []
@@ -32,7 +69,13 @@ class Simulation(object):
         # Constants - do not change these directly after simulation instantiation
         self.width = width or 200
         self.height = height or 200
+        # Sparse worlds only store non-default locations,
+        # for worlds too big to store every location
+        self.sparse = sparse
         self.background_colour = (0, 0, 0, 255)
+        # Size of each cell on screen, in pixels - by default
+        # the world is scaled to fit an 800 x 800 window
+        self.cell_size = cell_size
         
         # Computed properties
         self.init_locations()
@@ -50,13 +93,42 @@ class Simulation(object):
         # Delegate functionality - bind methods
         Seeder(self)
         Geometry(self)
+        Layers(self)
+        Routing(self)
+        Automaton(self)
         Executor(self)
 
+    #
+    # Wrapping - changing these invalidates any cached geometry
+    #
+
+    @property
+    def wrap_x(self):
+        return self._wrap_x
+
+    @wrap_x.setter
+    def wrap_x(self, value):
+        self._wrap_x = value
+        self.invalidate_caches('wrap')
+
+    @property
+    def wrap_y(self):
+        return self._wrap_y
+
+    @wrap_y.setter
+    def wrap_y(self, value):
+        self._wrap_y = value
+        self.invalidate_caches('wrap')
+
     def init_locations(self):
+        # The world holds all location data in flat arrays, and
+        # can be indexed like a dict of (x, y) -> Location
         Location.simulation = self
-        for x in range(0, self.width):
-            for y in range(0, self.height):
-                self.locations[x, y] = Location(x, y)
+        world_class = SparseWorld if self.sparse else World
+        self.world = world_class(self, self.width, self.height)
+        self.locations = self.world
+        # Neighbour counts were for the old world
+        self.invalidate_caches('neighbour_counts')
 
     def bind(self, *args):
         '''
@@ -71,3 +143,7 @@ class Simulation(object):
                 self.bound_agent_classes.append(agent_class)
                 # Bind the class to the simulation
                 agent_class.simulation = self
+                # Index the class, for fast spatial queries
+                self.world.index_class(agent_class)
+                # Execute its agents
+                self.scheduler.bind(agent_class)
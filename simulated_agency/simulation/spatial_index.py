@@ -0,0 +1,228 @@
+from heapq import heappop, heappush
+
+
+class SpatialIndex(object):
+    '''
+    A uniform-grid spatial index for the agents of a single class.
+
+    The world is divided into square buckets of cells and each bucket
+    keeps the agents currently inside it. The World keeps the index up
+    to date as agents arrive, move and leave, so queries never have to
+    look at the whole population.
+
+    Distances are wrap-aware Manhattan distances, the same as
+    Geometry.distance_between, and respect wrap_x/wrap_y.
+    '''
+
+    def __init__(self, world, agent_class, bucket_size=8):
+        self.world = world
+        self.agent_class = agent_class
+        self.bucket_size = bucket_size
+        self.buckets_wide = -(-world.width // bucket_size)
+        self.buckets_high = -(-world.height // bucket_size)
+        # Agents in each occupied bucket, keyed by bucket id.
+        # Dicts are used as ordered sets for O(1) removal.
+        self.buckets = {}
+        self.count = 0
+
+    def __repr__(self):
+        return 'SpatialIndex(%s, %s agents)' % (self.agent_class.__name__, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def bucket_of(self, index):
+        ''' Returns the id of the bucket containing a cell index '''
+        y, x = divmod(index, self.world.width)
+        size = self.bucket_size
+        return (y // size) * self.buckets_wide + (x // size)
+
+    #
+    # Maintenance
+    #
+
+    def add(self, index, agent):
+        bucket_id = self.bucket_of(index)
+        try:
+            self.buckets[bucket_id][agent] = None
+        except KeyError:
+            self.buckets[bucket_id] = {agent: None}
+        self.count += 1
+
+    def remove(self, index, agent):
+        bucket_id = self.bucket_of(index)
+        bucket = self.buckets[bucket_id]
+        del bucket[agent]
+        if not bucket:
+            del self.buckets[bucket_id]
+        self.count -= 1
+
+    def move(self, old_index, new_index, agent):
+        if self.bucket_of(old_index) != self.bucket_of(new_index):
+            self.remove(old_index, agent)
+            self.add(new_index, agent)
+
+    #
+    # Geometry helpers
+    #
+
+    def _axis_distance(self, value, start, end, size, wrap):
+        '''
+        Shortest distance along one axis from value to the
+        cells start..end (inclusive), wrapping if required
+        '''
+        if start <= value <= end:
+            return 0
+        if not wrap:
+            return start - value if value < start else value - end
+        to_start = abs(value - start)
+        to_end = abs(value - end)
+        return min(to_start, size - to_start, to_end, size - to_end)
+
+    def _lower_bound(self, x, y, bucket_x, bucket_y):
+        ''' The least possible distance from (x, y) to anything in a bucket '''
+        world = self.world
+        simulation = world.simulation
+        size = self.bucket_size
+        x_start = bucket_x * size
+        y_start = bucket_y * size
+        x_end = min(x_start + size, world.width) - 1
+        y_end = min(y_start + size, world.height) - 1
+        return (
+            self._axis_distance(x, x_start, x_end, world.width, simulation.wrap_x) +
+            self._axis_distance(y, y_start, y_end, world.height, simulation.wrap_y)
+        )
+
+    def _distance(self, x, y, agent):
+        ''' Wrap-aware Manhattan distance from (x, y) to an agent '''
+        location = agent.location
+        dx, dy = self.world.simulation.vector_between(x, y, location.x, location.y)
+        return abs(dx) + abs(dy)
+
+    def _bucket_range(self, start, end, buckets, size, wrap):
+        '''
+        Returns the bucket coordinates along one axis which
+        cover the cells start..end (inclusive)
+        '''
+        if end - start + 1 >= size:
+            return range(buckets)
+        if wrap:
+            start %= size
+            end %= size
+            if start > end:
+                return list(range(start // self.bucket_size, buckets)) + list(range(0, end // self.bucket_size + 1))
+        else:
+            start = max(start, 0)
+            end = min(end, size - 1)
+        return range(start // self.bucket_size, end // self.bucket_size + 1)
+
+    #
+    # Queries
+    #
+
+    def agents_near(self, x, y, radius):
+        '''
+        Returns the agents in the buckets which overlap the
+        square of cells within radius of (x, y)
+        '''
+        world = self.world
+        simulation = world.simulation
+        buckets = self.buckets
+        xs = self._bucket_range(x - radius, x + radius, self.buckets_wide, world.width, simulation.wrap_x)
+        ys = self._bucket_range(y - radius, y + radius, self.buckets_high, world.height, simulation.wrap_y)
+        result = []
+        for bucket_y in ys:
+            for bucket_x in xs:
+                bucket = buckets.get(bucket_y * self.buckets_wide + bucket_x)
+                if bucket:
+                    result.extend(bucket)
+        return result
+
+    def within(self, x, y, stencil, include_centre=True, predicate=None):
+        '''
+        Returns the agents whose location is covered by a
+        neighbourhood stencil centred on (x, y)
+        '''
+        vector_between = self.world.simulation.vector_between
+        offsets = stencil.offset_set_for(y)
+        radius = stencil.radius
+        result = []
+        for agent in self.agents_near(x, y, radius):
+            location = agent.location
+            offset = vector_between(x, y, location.x, location.y)
+            if offset not in offsets:
+                continue
+            if not include_centre and offset == (0, 0):
+                continue
+            if predicate is not None and not predicate(agent):
+                continue
+            result.append(agent)
+        return result
+
+    def nearest(self, x, y, exclude=None, predicate=None):
+        '''
+        Returns the nearest agent to (x, y), or None if there are none.
+        Equally near agents are chosen between at random.
+
+        Buckets are visited in order of the least possible distance to
+        anything inside them, so the search stops as soon as no
+        unvisited bucket could hold anything nearer than what we have.
+        '''
+
+        if not self.count:
+            return None
+
+        simulation = self.world.simulation
+        wrap_x = simulation.wrap_x
+        wrap_y = simulation.wrap_y
+        buckets_wide = self.buckets_wide
+        buckets_high = self.buckets_high
+        buckets = self.buckets
+
+        start = (x // self.bucket_size, y // self.bucket_size)
+        queue = [(0, start)]
+        seen = {start}
+        best_distance = None
+        best = []
+
+        while queue:
+            bound, (bucket_x, bucket_y) = heappop(queue)
+            if best_distance is not None and bound > best_distance:
+                break
+
+            # Check the agents in this bucket
+            bucket = buckets.get(bucket_y * buckets_wide + bucket_x)
+            if bucket:
+                for agent in bucket:
+                    if agent is exclude:
+                        continue
+                    if predicate is not None and not predicate(agent):
+                        continue
+                    distance = self._distance(x, y, agent)
+                    if best_distance is None or distance < best_distance:
+                        best_distance = distance
+                        best = [agent]
+                    elif distance == best_distance:
+                        best.append(agent)
+
+            # Queue up the neighbouring buckets
+            for next_x, next_y in (
+                (bucket_x - 1, bucket_y), (bucket_x + 1, bucket_y),
+                (bucket_x, bucket_y - 1), (bucket_x, bucket_y + 1)
+            ):
+                if wrap_x:
+                    next_x %= buckets_wide
+                elif not 0 <= next_x < buckets_wide:
+                    continue
+                if wrap_y:
+                    next_y %= buckets_high
+                elif not 0 <= next_y < buckets_high:
+                    continue
+                if (next_x, next_y) in seen:
+                    continue
+                seen.add((next_x, next_y))
+                heappush(queue, (self._lower_bound(x, y, next_x, next_y), (next_x, next_y)))
+
+        if not best:
+            return None
+        return self.world.simulation.rng.choice(best)
@@ -0,0 +1,89 @@
+from ..states.state import EMPTY_CONTEXT
+
+
+class StatePool(object):
+    '''
+    Recycles state instances, so that agents which change state all
+    the time don't allocate (and leave for the garbage collector) a new
+    state object on every transition.
+
+    A state which leaves an agent's state stack is retired. At the end
+    of the tick, once nothing can still be running it or reading it
+    from the double buffer's front stacks, it is cleared and pooled,
+    to be handed out again by create() with a new agent and context.
+
+    This means that a state which has left the stack should not be
+    held on to beyond the tick it left in.
+
+    States are recycled rather than shared between agents, even when
+    they take no parameters, since every state keeps its own agent, age
+    and timer, and State.handle() reaches its agent through self.agent.
+    Sharing one instance per state class would need a different State
+    API, and is not done.
+    '''
+
+    def __init__(self, simulation, size=4096):
+        self.simulation = simulation
+        # The most states of any one class to keep
+        self.size = size
+        # State class -> cleared instances ready for reuse
+        self.pools = {}
+        # States which have left a stack this tick
+        self.retired = []
+        # Counters
+        self.created = 0
+        self.reused = 0
+        # Bind methods
+        self.simulation.state_pool = self
+
+    def __repr__(self):
+        return 'StatePool(%s pooled, %s retired)' % (sum(map(len, self.pools.values())), len(self.retired))
+
+    def create(self, state_class, agent, kwargs):
+        ''' Returns a new state for an agent, reusing a pooled one if we can '''
+        pool = self.pools.get(state_class)
+        if pool:
+            state = pool.pop()
+            state.__init__(agent, **kwargs)
+            self.reused += 1
+            return state
+        self.created += 1
+        return state_class(agent, **kwargs)
+
+    def retire(self, state):
+        ''' Record that a state has left its agent's stack '''
+        self.retired.append(state)
+
+    def end_tick(self):
+        ''' Pool the states retired this tick '''
+        pools = self.pools
+        size = self.size
+        for state in self.retired:
+            agent = state.agent
+            if agent is None:
+                # Retired twice, and pooled already
+                continue
+            stack = agent._state_stack
+            if stack._top is state or (stack._below and state in stack._below):
+                # Put back on the stack after all
+                continue
+            state.agent = None
+            state.context = EMPTY_CONTEXT
+            # Forget anything set on states without __slots__
+            instance_dict = getattr(state, '__dict__', None)
+            if instance_dict:
+                instance_dict.clear()
+            try:
+                pool = pools[type(state)]
+            except KeyError:
+                pool = pools[type(state)] = []
+            if len(pool) < size:
+                pool.append(state)
+        self.retired = []
+
+    def stats(self):
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'pooled': sum(map(len, self.pools.values())),
+        }
@@ -0,0 +1,81 @@
+class FixedTimestep(object):
+    '''
+    Runs the simulation at a fixed number of ticks per second,
+    independently of how often the window is redrawn.
+
+    Each frame, advance() adds the time since the last frame to an
+    accumulator and returns how many whole ticks are due. That may be
+    several ticks for one frame, or none if frames come faster than
+    ticks. The number of ticks per frame can be capped, so that the
+    window stays responsive.
+
+    When the simulation cannot keep up, the ticks which are due but
+    have not been run are reported as the backlog, and the time they
+    represent as the lag. Anything beyond max_lag seconds is dropped,
+    so a slow simulation runs slowly rather than falling ever further
+    behind.
+    '''
+
+    def __init__(self, ticks_per_second, max_ticks_per_frame=None, max_lag=1.0):
+        if ticks_per_second <= 0:
+            raise Exception('ticks_per_second must be positive')
+        self.ticks_per_second = ticks_per_second
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.max_lag = max_lag
+        # Simulated time owed, in seconds
+        self.accumulator = 0.0
+        # Counters
+        self.frames = 0
+        self.ticks = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return 'FixedTimestep(%s ticks/s, %s behind)' % (self.ticks_per_second, self.backlog)
+
+    def advance(self, dt):
+        '''
+        Record that dt seconds have passed since the last frame,
+        and return the number of ticks to run for this frame
+        '''
+
+        self.frames += 1
+        self.accumulator += dt
+        ticks = self._whole_ticks(self.accumulator)
+        if self.max_ticks_per_frame is not None:
+            ticks = min(ticks, self.max_ticks_per_frame)
+        self.accumulator -= ticks / self.ticks_per_second
+        self.ticks += ticks
+
+        # Forget about anything we are too far behind to catch up on
+        if self.accumulator > self.max_lag:
+            dropped = self._whole_ticks(self.accumulator - self.max_lag)
+            self.accumulator -= dropped / self.ticks_per_second
+            self.dropped += dropped
+
+        return ticks
+
+    def _whole_ticks(self, seconds):
+        # Allow for rounding errors, so that e.g. 60 frames of
+        # 1/60 seconds are worth exactly 60 ticks at 60 ticks/s
+        return int(seconds * self.ticks_per_second + 1e-9)
+
+    @property
+    def backlog(self):
+        ''' The number of ticks which are due but have not been run '''
+        return self._whole_ticks(self.accumulator)
+
+    @property
+    def lag(self):
+        ''' How far behind the simulation is, in seconds '''
+        return self.backlog / self.ticks_per_second
+
+    def stats(self):
+        return {
+            'ticks_per_second': self.ticks_per_second,
+            'frames': self.frames,
+            'ticks': self.ticks,
+            'ticks_per_frame': self.ticks / self.frames if self.frames else None,
+            'backlog': self.backlog,
+            'lag': self.lag,
+            'dropped': self.dropped,
+        }
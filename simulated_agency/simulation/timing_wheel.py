@@ -0,0 +1,102 @@
+from itertools import count
+
+
+class TimingWheel(object):
+    '''
+    A hierarchical timing wheel, for running things at a given tick.
+
+    The lowest level has one slot per tick for the next `slots` ticks.
+    Each level above has slots which are `slots` times as long as those
+    of the level below. Something due far in the future is put in a slot
+    of a high level, and as the wheel turns it cascades down a level at
+    a time until it reaches the lowest level and is due. Scheduling and
+    cancelling cost O(1), and each tick only touches the slots which
+    are due, however many timers are waiting.
+
+    Anything due beyond the top level waits in an overflow list until
+    it comes within range.
+    '''
+
+    def __init__(self, slots=64, levels=4):
+        if slots & (slots - 1):
+            raise Exception('The number of slots must be a power of two')
+        self.slots = slots
+        self.levels = levels
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        # The last tick which has been advanced to
+        self.now = 0
+        # Level -> slot -> {key: (due, item)}
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.overflow = {}
+        # Key -> the dict holding it
+        self._where = {}
+        self._keys = count()
+
+    def __repr__(self):
+        return 'TimingWheel(%s timers at tick %s)' % (len(self), self.now)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, due, item):
+        '''
+        Arrange for item to be returned by advance() once it reaches the
+        due tick (or straight away, if that has passed). Returns a key
+        which can be used to cancel it.
+        '''
+        key = next(self._keys)
+        self._insert(key, max(due, self.now + 1), item)
+        return key
+
+    def cancel(self, key):
+        ''' Cancel a scheduled item, if it is still waiting '''
+        holder = self._where.pop(key, None)
+        if holder is not None:
+            del holder[key]
+
+    def advance(self, now):
+        ''' Turn the wheel to a tick, returning the items which are due in order '''
+        due = []
+        mask = self._mask
+        bits = self._bits
+        while self.now < now:
+            self.now += 1
+            tick = self.now
+            # Whenever a level comes back round to its first slot,
+            # the next slot of the level above cascades down
+            level = 0
+            while level < self.levels - 1 and (tick >> (bits * level)) & mask == 0:
+                level += 1
+            if tick & ((1 << (bits * self.levels)) - 1) == 0:
+                self._cascade(self.overflow)
+            for upper in range(level, 0, -1):
+                self._cascade(self.wheels[upper][(tick >> (bits * upper)) & mask])
+            slot = self.wheels[0][tick & mask]
+            if slot:
+                for key, (_, item) in slot.items():
+                    del self._where[key]
+                    due.append(item)
+                slot.clear()
+        return due
+
+    def _insert(self, key, due, item):
+        delay = due - self.now
+        bits = self._bits
+        for level in range(self.levels):
+            if delay < 1 << (bits * (level + 1)):
+                holder = self.wheels[level][(due >> (bits * level)) & self._mask]
+                break
+        else:
+            holder = self.overflow
+        holder[key] = (due, item)
+        self._where[key] = holder
+
+    def _cascade(self, holder):
+        entries = list(holder.items())
+        holder.clear()
+        for key, (due, item) in entries:
+            self._insert(key, due, item)
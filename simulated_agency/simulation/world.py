@@ -0,0 +1,567 @@
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from ..location import Location
+from .chunks import Chunks
+from .spatial_index import SpatialIndex
+
+
+class World(object):
+    '''
+    Array-backed store for the locations of the Simulation.
+
+    Every cell is addressed by an integer index (index = y * width + x)
+    and its data lives in flat NumPy arrays:
+
+        capacity    how much mass the cell can hold (0 = impassable)
+        mass        how much mass is currently in the cell
+        occupancy   how many agents are currently in the cell
+        colour      packed 0xRRGGBB colour of the cell, or -1 for none
+
+    In addition, the number of agents of each class in each cell is
+    kept in a separate array per agent class (see class_counts).
+    All of these are maintained incrementally by add and remove,
+    so none of them ever need to be recomputed from the contents.
+    Any cached neighbour counts are kept up to date as well (see Layers).
+
+    Location objects are thin views onto a cell. They are created on
+    first access and then reused, so that `simulation.locations[x, y]`
+    always returns the same object.
+
+    The World is also divided into chunks, which count their own agents
+    and track changes so that quiet parts of the world can be skipped.
+
+    The World can be indexed like the old `{(x, y): Location}` dict.
+    '''
+
+    sparse = False
+
+    def __init__(self, simulation, width, height):
+        self.simulation = simulation
+        self.width = width
+        self.height = height
+        self.size = width * height
+
+        # Per-cell data
+        self.capacity = np.ones(self.size, dtype=np.float64)
+        self.mass = np.zeros(self.size, dtype=np.float64)
+        self.occupancy = np.zeros(self.size, dtype=np.int32)
+        self.colour = np.full(self.size, -1, dtype=np.int32)
+
+        # Agents in each occupied cell, keyed by cell index
+        self.contents = {}
+
+        # Neighbour counts to keep up to date (see Layers)
+        self.layers = getattr(simulation, 'layers', None)
+
+        # Per-class agent counts, keyed by agent class
+        self.counts = {}
+
+        # Location views, created on first access
+        self._views = [None] * self.size
+        self._numbers = list(range(max(width, height)))
+
+        # Chunks, for skipping quiet parts of the world
+        self.chunks = Chunks(self, simulation.chunk_size)
+
+        # Spatial indexes for bound agent classes, keyed by class
+        self.indexes = {}
+
+        # Cells watched by dormant agents (see Scheduler)
+        self.watchers = simulation.scheduler.watchers
+
+    def __repr__(self):
+        return 'World(%s, %s)' % (self.width, self.height)
+
+    #
+    # Addressing
+    #
+
+    def index(self, x, y):
+        ''' Returns the cell index of (x, y) '''
+        return y * self.width + x
+
+    def coordinates(self, index):
+        ''' Returns the (x, y) coordinates of a cell index '''
+        y, x = divmod(index, self.width)
+        return x, y
+
+    def location(self, index):
+        ''' Returns the Location view for a cell index '''
+        location = self._views[index]
+        if location is None:
+            y, x = divmod(index, self.width)
+            # Every view in a row or column shares the same int objects
+            # for its coordinates, since there may be millions of views
+            numbers = self._numbers
+            location = Location.view(self.simulation, index, numbers[x], numbers[y])
+            self._views[index] = location
+        return location
+
+    def apply_stencil(self, x, y, stencil):
+        '''
+        Returns the indices of the cells covered by a neighbourhood
+        stencil centred on (x, y), wrapping or constraining at the
+        edges of the world. Each cell appears only once.
+        '''
+
+        simulation = self.simulation
+        width = self.width
+        height = self.height
+        radius = stencil.radius
+
+        # Away from the edges there is no wrapping or constraining to do
+        if radius <= x < width - radius and radius <= y < height - radius:
+            centre = y * width + x
+            return [centre + offset for offset in stencil.index_offsets_for(y, width)]
+
+        if len(stencil) <= 32:
+            # Small stencils are quickest in plain Python
+            wrap_x = simulation.wrap_x
+            wrap_y = simulation.wrap_y
+            indices = []
+            for dx, dy in stencil.offsets_for(y):
+                nx = x + dx
+                ny = y + dy
+                if wrap_x:
+                    nx %= width
+                else:
+                    nx = 0 if nx < 0 else width - 1 if nx >= width else nx
+                if wrap_y:
+                    ny %= height
+                else:
+                    ny = 0 if ny < 0 else height - 1 if ny >= height else ny
+                indices.append(ny * width + nx)
+            return list(dict.fromkeys(indices))
+
+        # Large stencils are applied with array arithmetic
+        dx, dy = stencil.arrays_for(y)
+        xs = x + dx
+        ys = y + dy
+        xs = xs % width if simulation.wrap_x else np.clip(xs, 0, width - 1)
+        ys = ys % height if simulation.wrap_y else np.clip(ys, 0, height - 1)
+        return np.unique(ys * width + xs).tolist()
+
+    def grid(self, array):
+        ''' Returns a (height, width) view of one of the per-cell arrays '''
+        return array.reshape(self.height, self.width)
+
+    #
+    # Dict-like access, for backwards compatibility
+    #
+
+    def __getitem__(self, xy):
+        x, y = xy
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise KeyError(xy)
+        return self.location(y * self.width + x)
+
+    def __contains__(self, xy):
+        x, y = xy
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for index in range(self.size):
+            yield self.coordinates(index)
+
+    def values(self):
+        for index in range(self.size):
+            yield self.location(index)
+
+    def items(self):
+        for index in range(self.size):
+            yield self.coordinates(index), self.location(index)
+
+    #
+    # Contents
+    #
+
+    def contents_at(self, index):
+        ''' Returns the list of agents in a cell '''
+        return self.contents.get(index, [])
+
+    def add(self, index, agent):
+        ''' Record that an agent has arrived in a cell '''
+        try:
+            self.contents[index].append(agent)
+        except KeyError:
+            self.contents[index] = [agent]
+        self.mass[index] += agent.mass
+        self.occupancy[index] += 1
+        self.class_counts(type(agent))[index] += 1
+        layers = self.layers
+        if layers is not None and layers.tracking:
+            layers.agent_added(index, agent)
+        self.chunks.add(index, agent)
+        spatial_index = self.indexes.get(type(agent))
+        if spatial_index is not None:
+            spatial_index.add(index, agent)
+        if index in self.watchers:
+            self.simulation.scheduler.disturb(index)
+
+    def remove(self, index, agent):
+        ''' Record that an agent has left a cell '''
+        contents = self.contents[index]
+        contents.remove(agent)
+        if not contents:
+            del self.contents[index]
+        self.mass[index] -= agent.mass
+        self.occupancy[index] -= 1
+        self.counts[type(agent)][index] -= 1
+        layers = self.layers
+        if layers is not None and layers.tracking:
+            layers.agent_removed(index, agent)
+        self.chunks.remove(index, agent)
+        spatial_index = self.indexes.get(type(agent))
+        if spatial_index is not None:
+            spatial_index.remove(index, agent)
+        if index in self.watchers:
+            self.simulation.scheduler.disturb(index)
+
+    def move(self, old_index, new_index, agent):
+        ''' Record that an agent has moved from one cell to another '''
+        contents = self.contents[old_index]
+        contents.remove(agent)
+        if not contents:
+            del self.contents[old_index]
+        try:
+            self.contents[new_index].append(agent)
+        except KeyError:
+            self.contents[new_index] = [agent]
+        mass = agent.mass
+        self.mass[old_index] -= mass
+        self.mass[new_index] += mass
+        occupancy = self.occupancy
+        occupancy[old_index] -= 1
+        occupancy[new_index] += 1
+        counts = self.counts[type(agent)]
+        counts[old_index] -= 1
+        counts[new_index] += 1
+        layers = self.layers
+        if layers is not None and layers.tracking:
+            layers.agent_moved(old_index, new_index, agent)
+        self.chunks.move(old_index, new_index, agent)
+        spatial_index = self.indexes.get(type(agent))
+        if spatial_index is not None:
+            spatial_index.move(old_index, new_index, agent)
+        watchers = self.watchers
+        if watchers:
+            if old_index in watchers:
+                self.simulation.scheduler.disturb(old_index)
+            if new_index in watchers:
+                self.simulation.scheduler.disturb(new_index)
+
+    def can_fit(self, index, mass):
+        ''' Is there room for some more mass in a cell? '''
+        return bool(self.mass[index] + mass <= self.capacity[index])
+
+    def mass_at(self, index):
+        ''' How much mass is in a cell? '''
+        return float(self.mass[index])
+
+    #
+    # Capacity
+    #
+
+    def capacity_at(self, index):
+        ''' How much mass can a cell hold? '''
+        return float(self.capacity[index])
+
+    def set_capacity(self, index, capacity):
+        self.capacity[index] = capacity
+        self.chunks.mark_dirty(index)
+
+    def set_rectangle(self, x_start, y_start, width, height, capacity, colour):
+        '''
+        Set the capacity and colour of every cell in a rectangle.
+        The rectangle is clipped to the edges of the world.
+        '''
+        # Negative starts would count from the far edge, so clip them
+        area = (
+            slice(max(y_start, 0), max(y_start + height, 0)),
+            slice(max(x_start, 0), max(x_start + width, 0))
+        )
+        self.grid(self.capacity)[area] = capacity
+        self.grid(self.colour)[area] = self.pack_colour(colour)
+        self.chunks.mark_area_dirty(x_start, y_start, width, height)
+
+    #
+    # Per-class counts
+    #
+
+    def class_counts(self, agent_class):
+        '''
+        Returns the array of per-cell counts for agents of exactly
+        agent_class, creating it the first time the class is seen.
+        '''
+        try:
+            return self.counts[agent_class]
+        except KeyError:
+            counts = self.counts[agent_class] = np.zeros(self.size, dtype=np.int32)
+            return counts
+
+    def count_at(self, index, agent_class):
+        ''' How many agents of exactly agent_class are in a cell? '''
+        counts = self.counts.get(agent_class)
+        if counts is None:
+            return 0
+        return int(counts[index])
+
+    #
+    # Spatial indexes
+    #
+
+    def index_class(self, agent_class):
+        '''
+        Start keeping a spatial index for agents of exactly agent_class,
+        including any which have already been placed in the world
+        '''
+        if agent_class in self.indexes:
+            return self.indexes[agent_class]
+        spatial_index = SpatialIndex(self, agent_class, self.simulation.bucket_size)
+        for agent in agent_class.objects:
+            location = getattr(agent, 'location', None)
+            if location is not None and type(agent) is agent_class:
+                spatial_index.add(location.index, agent)
+        self.indexes[agent_class] = spatial_index
+        return spatial_index
+
+    #
+    # Colours
+    #
+
+    def get_colour(self, index):
+        ''' Returns the colour of a cell as an (r, g, b) tuple, or None '''
+        packed = int(self.colour[index])
+        if packed < 0:
+            return None
+        return (packed >> 16) & 255, (packed >> 8) & 255, packed & 255
+
+    def set_colour(self, index, colour):
+        '''
+        Set the colour of a cell from an (r, g, b) tuple, or None.
+        An (r, g, b, a) tuple is accepted too, but cells are drawn
+        opaque, so the alpha is dropped.
+        '''
+        self.colour[index] = self.pack_colour(colour)
+        self.chunks.mark_dirty(index)
+
+    def colours_in(self, x_start, y_start, x_end, y_end):
+        '''
+        Returns (x, y, colour) for each coloured cell in a rectangle, end exclusive
+        '''
+        area = self.grid(self.colour)[y_start:y_end, x_start:x_end]
+        ys, xs = np.nonzero(area >= 0)
+        return [
+            (x_start + x, y_start + y, self.get_colour(self.index(x_start + x, y_start + y)))
+            for x, y in zip(xs.tolist(), ys.tolist())
+        ]
+
+    @staticmethod
+    def pack_colour(colour):
+        if colour is None:
+            return -1
+        r, g, b = colour[:3]
+        return (r << 16) | (g << 8) | b
+
+
+class SparseWorld(World):
+    '''
+    A World for very large simulations, which only stores the cells
+    which differ from the default: cells which are occupied, or have
+    a non-default capacity or colour. Everything else is implied.
+
+    Location views are held weakly, so a view exists for as long as
+    something (e.g. an agent standing in it) refers to it, and the
+    same view is returned for as long as it exists.
+
+    The per-cell data are dicts keyed by cell index rather than arrays,
+    so array-only features such as grid() are unavailable.
+    '''
+
+    sparse = True
+
+    def __init__(self, simulation, width, height):
+        self.simulation = simulation
+        self.width = width
+        self.height = height
+        self.size = width * height
+
+        # Per-cell data, for non-default cells only
+        self.capacity = {}
+        self.mass = {}
+        self.occupancy = {}
+        self.colour = {}
+
+        # Agents in each occupied cell, keyed by cell index
+        self.contents = {}
+
+        # Per-class agent counts, keyed by agent class then cell index
+        self.counts = {}
+
+        # Location views, kept only while in use
+        self._views = WeakValueDictionary()
+
+        # Chunks, for skipping quiet parts of the world
+        self.chunks = Chunks(self, simulation.chunk_size)
+
+        # Spatial indexes for bound agent classes, keyed by class
+        self.indexes = {}
+
+        # Cells watched by dormant agents (see Scheduler)
+        self.watchers = simulation.scheduler.watchers
+
+    def __repr__(self):
+        return 'SparseWorld(%s, %s)' % (self.width, self.height)
+
+    def location(self, index):
+        ''' Returns the Location view for a cell index '''
+        location = self._views.get(index)
+        if location is None:
+            x, y = self.coordinates(index)
+            location = Location.view(self.simulation, index, x, y)
+            self._views[index] = location
+        return location
+
+    def grid(self, array):
+        raise Exception('Sparse worlds do not store per-cell arrays')
+
+    #
+    # Contents
+    #
+
+    def add(self, index, agent):
+        ''' Record that an agent has arrived in a cell '''
+        try:
+            self.contents[index].append(agent)
+        except KeyError:
+            self.contents[index] = [agent]
+        self.mass[index] = self.mass.get(index, 0) + agent.mass
+        self.occupancy[index] = self.occupancy.get(index, 0) + 1
+        counts = self.class_counts(type(agent))
+        counts[index] = counts.get(index, 0) + 1
+        self.chunks.add(index, agent)
+        spatial_index = self.indexes.get(type(agent))
+        if spatial_index is not None:
+            spatial_index.add(index, agent)
+        if index in self.watchers:
+            self.simulation.scheduler.disturb(index)
+
+    def remove(self, index, agent):
+        ''' Record that an agent has left a cell '''
+        contents = self.contents[index]
+        contents.remove(agent)
+        counts = self.counts[type(agent)]
+        counts[index] -= 1
+        if not counts[index]:
+            del counts[index]
+        if contents:
+            self.mass[index] -= agent.mass
+            self.occupancy[index] -= 1
+        else:
+            # Forget the cell altogether
+            del self.contents[index]
+            del self.mass[index]
+            del self.occupancy[index]
+        self.chunks.remove(index, agent)
+        spatial_index = self.indexes.get(type(agent))
+        if spatial_index is not None:
+            spatial_index.remove(index, agent)
+        if index in self.watchers:
+            self.simulation.scheduler.disturb(index)
+
+    def move(self, old_index, new_index, agent):
+        ''' Record that an agent has moved from one cell to another '''
+        self.remove(old_index, agent)
+        self.add(new_index, agent)
+
+    def can_fit(self, index, mass):
+        ''' Is there room for some more mass in a cell? '''
+        return self.mass.get(index, 0) + mass <= self.capacity.get(index, 1)
+
+    def mass_at(self, index):
+        ''' How much mass is in a cell? '''
+        return float(self.mass.get(index, 0))
+
+    def class_counts(self, agent_class):
+        '''
+        Returns the dict of per-cell counts for agents of exactly
+        agent_class, creating it the first time the class is seen.
+        '''
+        try:
+            return self.counts[agent_class]
+        except KeyError:
+            counts = self.counts[agent_class] = {}
+            return counts
+
+    def count_at(self, index, agent_class):
+        ''' How many agents of exactly agent_class are in a cell? '''
+        counts = self.counts.get(agent_class)
+        if counts is None:
+            return 0
+        return counts.get(index, 0)
+
+    #
+    # Capacity
+    #
+
+    def capacity_at(self, index):
+        ''' How much mass can a cell hold? '''
+        return float(self.capacity.get(index, 1))
+
+    def set_capacity(self, index, capacity):
+        if capacity == 1:
+            self.capacity.pop(index, None)
+        else:
+            self.capacity[index] = capacity
+        self.chunks.mark_dirty(index)
+
+    def set_rectangle(self, x_start, y_start, width, height, capacity, colour):
+        '''
+        Set the capacity and colour of every cell in a rectangle.
+        The rectangle is clipped to the edges of the world.
+        '''
+        for y in range(max(y_start, 0), min(y_start + height, self.height)):
+            for x in range(max(x_start, 0), min(x_start + width, self.width)):
+                index = self.index(x, y)
+                self.set_capacity(index, capacity)
+                self.set_colour(index, colour)
+
+    #
+    # Colours
+    #
+
+    def get_colour(self, index):
+        ''' Returns the colour of a cell as an (r, g, b) tuple, or None '''
+        return self.colour.get(index)
+
+    def set_colour(self, index, colour):
+        '''
+        Set the colour of a cell from an (r, g, b) tuple, or None.
+        An (r, g, b, a) tuple is accepted too, but cells are drawn
+        opaque, so the alpha is dropped.
+        '''
+        if colour is None:
+            self.colour.pop(index, None)
+        else:
+            self.colour[index] = tuple(colour[:3])
+        self.chunks.mark_dirty(index)
+
+    def colours_in(self, x_start, y_start, x_end, y_end):
+        '''
+        Returns (x, y, colour) for each coloured cell in a rectangle, end exclusive
+        '''
+        width = self.width
+        result = []
+        for index, colour in self.colour.items():
+            y, x = divmod(index, width)
+            if x_start <= x < x_end and y_start <= y < y_end:
+                result.append((x, y, colour))
+        return result
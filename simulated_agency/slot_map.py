@@ -0,0 +1,194 @@
+from array import array
+
+import numpy as np
+
+
+class Handle(object):
+    '''
+    A stable reference to an item in a SlotMap, which knows whether the
+    item is still there. Holding a handle, rather than the item itself,
+    lets you find out that an agent has been destroyed without keeping
+    it alive in the meantime.
+    Agents only keep their slot, and agent.ref makes a handle on demand,
+    so handles compare equal if they refer to the same slot and generation.
+
+    Example:
+        target = wolf.nearest(Sheep)
+        wolf.add_state(WolfChasingTarget, target=target.ref)
+        ...
+        target = self.context['target'].get()
+        if target is None:
+            # It has been destroyed
+    '''
+
+    __slots__ = ('slot_map', 'slot', 'generation')
+
+    def __init__(self, slot_map, slot, generation):
+        self.slot_map = slot_map
+        self.slot = slot
+        self.generation = generation
+
+    def __repr__(self):
+        return 'Handle(%s, %s)' % (self.slot, self.generation)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Handle) and self.slot_map is other.slot_map
+            and self.slot == other.slot and self.generation == other.generation
+        )
+
+    def __hash__(self):
+        return hash((id(self.slot_map), self.slot, self.generation))
+
+    @property
+    def alive(self):
+        return self.slot_map._generations[self.slot] == self.generation
+
+    def get(self):
+        ''' Returns the item, or None if it has been removed '''
+        if self.alive:
+            return self.slot_map._items[self.slot_map._positions[self.slot]]
+        return None
+
+
+class SlotMap(object):
+    '''
+    A list-like collection with O(1) insertion and removal, whose items
+    are referred to by generational handles.
+
+    The items are kept densely packed, so iterating over them is as
+    quick as for a list. Each item also has a slot, which records where
+    it is in the dense list, and a slot's generation goes up every time
+    its item is removed, so that old handles to the slot can tell that
+    their item has gone.
+
+    Removal is deferred: discard() invalidates an item's handle straight
+    away and hides the item, but it is only taken out of the dense list
+    by purge(), which the executor calls at the end of every tick. This
+    means that destroying agents doesn't disturb any loops over them.
+    The order of the items changes when they are purged.
+
+    Columns of data may be kept for the items, in NumPy arrays indexed
+    by slot (see Column), given as {name: (dtype, default)}.
+    '''
+
+    def __init__(self, columns=None):
+        # The items, densely packed, and the slot of each
+        self._items = []
+        self._slots = []
+        # Slot -> position in the dense list, and current generation,
+        # in arrays so as not to need an int object for each
+        self._positions = array('q')
+        self._generations = array('q')
+        # Slots which can be reused
+        self._free = []
+        # Positions of discarded items awaiting purge()
+        self._discarded = set()
+        # Column name -> array of values by slot, and its default
+        self.columns = {}
+        self._defaults = {}
+        for name, (dtype, default) in (columns or {}).items():
+            self.columns[name] = np.full(16, default, dtype=dtype)
+            self._defaults[name] = default
+
+    def __repr__(self):
+        return 'SlotMap(%s)' % list(self)
+
+    def __len__(self):
+        return len(self._items) - len(self._discarded)
+
+    def __iter__(self):
+        if not self._discarded:
+            return iter(self._items)
+        discarded = self._discarded
+        return (item for position, item in enumerate(self._items) if position not in discarded)
+
+    def __getitem__(self, index):
+        if not self._discarded:
+            return self._items[index]
+        return list(self)[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def add(self, item):
+        ''' Add an item, returning its handle '''
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._positions)
+            self._positions.append(0)
+            self._generations.append(0)
+        for name, column in self.columns.items():
+            if slot >= len(column):
+                column = self._grow(name)
+            column[slot] = self._defaults[name]
+        self._positions[slot] = len(self._items)
+        self._items.append(item)
+        self._slots.append(slot)
+        return Handle(self, slot, self._generations[slot])
+
+    def handle(self, slot):
+        ''' Returns a handle to the item now in a slot '''
+        return Handle(self, slot, self._generations[slot])
+
+    def discard(self, handle):
+        '''
+        Remove the item with the given handle, if it is still here.
+        It disappears at once, but the memory is reclaimed by purge().
+        '''
+        if not handle.alive:
+            return
+        self._generations[handle.slot] += 1
+        self._discarded.add(self._positions[handle.slot])
+
+    def purge(self):
+        ''' Take discarded items out of the dense list, filling each hole with the last item '''
+        if not self._discarded:
+            return
+        items = self._items
+        slots = self._slots
+        positions = self._positions
+        # Start from the back, so that holes further
+        # along are filled before they are moved
+        for position in sorted(self._discarded, reverse=True):
+            self._free.append(slots[position])
+            last = items.pop()
+            last_slot = slots.pop()
+            if position < len(items):
+                items[position] = last
+                slots[position] = last_slot
+                positions[last_slot] = position
+        self._discarded = set()
+
+    #
+    # Columns
+    #
+
+    def column(self, name):
+        '''
+        Returns the array of a column's values, indexed by slot.
+        Unused slots hold junk, so index it with slots(). The array
+        is replaced when it grows, so fetch it again after adding.
+        '''
+        return self.columns[name]
+
+    def slots(self, items=None):
+        '''
+        Returns an array of the slots of the given items, which must
+        know their own slots (as agents do), or of every item
+        '''
+        if items is None:
+            discarded = self._discarded
+            return np.fromiter(
+                (slot for position, slot in enumerate(self._slots) if position not in discarded),
+                dtype=np.intp
+            )
+        return np.fromiter((item.slot for item in items), dtype=np.intp)
+
+    def _grow(self, name):
+        old = self.columns[name]
+        new = np.full(len(old) * 2, self._defaults[name], dtype=old.dtype)
+        new[:len(old)] = old
+        self.columns[name] = new
+        return new
@@ -4,4 +4,5 @@ from .dead import *
 from .move_randomly import *
 from .move_towards_location import *
 from .move_towards_target import *
+from .rule import *
 from .wait import *
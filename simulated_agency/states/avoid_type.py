@@ -11,6 +11,8 @@ class AvoidType(State):
            and take evasive action if it comes too close
     '''
 
+    __slots__ = ()
+
     name = 'AVOID_TYPE'
     colour = (0, 255, 0)
     required_params = ['enemy', 'comfort_zone']
@@ -20,9 +22,10 @@ class AvoidType(State):
         enemy = self.context['enemy']
         comfort_zone = self.context['comfort_zone']
         agent = self.agent
-        nearest_enemy = agent.nearest(enemy.objects)
+        # Passing the class lets us use its spatial index, if it has one
+        nearest_enemy = agent.nearest(enemy)
         # Only trigger avoidance within the comfort zone
-        if agent.distance_to(nearest_enemy) <= comfort_zone:
+        if nearest_enemy is not None and agent.distance_to(nearest_enemy) <= comfort_zone:
             agent.move_away_from_target(nearest_enemy)
         else:
             # Do nothing
@@ -5,11 +5,24 @@ from .state import State
 class Dead(State):
     '''
     Represents death
+
+    Dead agents keep running every tick, as any other agent does. Set
+    dormant = True (e.g. on a subclass) to have them sleep instead until
+    something changes their state, which saves running them (see
+    Scheduler).
     '''
 
+    __slots__ = ()
+
     name = 'DEAD'
     colour = (255, 0, 0)
     glyph = 'X'
 
+    # Whether to sleep until our state is changed
+    dormant = False
+
     def handle(self):
         super().handle()
+        if self.dormant:
+            # Nothing more will happen unless something changes our state
+            self.agent.sleep()
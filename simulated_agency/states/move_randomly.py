@@ -7,6 +7,8 @@ class MoveRandomly(State):
     Represents moving randomly
     ''' 
 
+    __slots__ = ()
+
     name = 'MOVING_RANDOMLY'
     colour = (0, 255, 0)
 
@@ -4,9 +4,12 @@ from .state import State
 
 class MoveTowardsLocation(State):
     '''
-    Represents moving towards a static location
+    Represents moving towards a static location.
+    A 'routing' strategy may be given to override the simulation's.
     '''  
 
+    __slots__ = ()
+
     name = 'MOVING_TOWARDS_LOCATION'
     colour = (255, 0, 0)
     required_params = ['location']
@@ -21,4 +24,4 @@ class MoveTowardsLocation(State):
             self.agent.remove_state()
             return
         # Move towards location
-        self.agent.move_towards_location(location)
+        self.agent.move_towards_location(location, routing=self.context.get('routing'))
@@ -1,12 +1,18 @@
 
+from ..slot_map import Handle
 from .state import State
 
 
 class MoveTowardsTarget(State):
     '''
-    Represents moving towards a mobile target
+    Represents moving towards a mobile target.
+    A 'routing' strategy may be given to override the simulation's.
+    The target may be given as a handle (e.g. target.ref), in which
+    case we give up if it is destroyed, rather than chasing a ghost.
     '''
     
+    __slots__ = ()
+
     name = 'MOVING_TOWARDS_TARGET'
     colour = (255, 0, 0)
     required_params = ['target']
@@ -15,10 +21,15 @@ class MoveTowardsTarget(State):
         super().handle()
         # Are we "there" yet? (There = adjacent to the target)
         target = self.context['target']
+        if isinstance(target, Handle):
+            target = target.get()
+            if target is None:
+                self.agent.remove_state()
+                return
         if target in self.agent.location.neighbours():
             # When we arrive, we do the next thing
             # in the state stack
             self.agent.remove_state()
             return
         # Move towards target
-        self.agent.move_towards_target(target)
+        self.agent.move_towards_target(target, routing=self.context.get('routing'))
@@ -0,0 +1,107 @@
+import sys
+
+
+class Rule(object):
+    '''
+    A declarative transition from one State to another.
+
+    States list their rules in order, and the first rule which applies
+    on a given tick moves the agent into the state it `becomes`:
+
+        class Alive(State):
+            rules = [Rule('Dead', counting='Alive', count_not_in=(2, 3))]
+
+    A rule applies when all of the conditions it is given hold:
+        counting        the number of neighbours in this state (within
+                        radius) is in count_in and not in count_not_in
+        after           the agent has been in the state for at least
+                        this many ticks
+        probability     a random draw succeeds with this probability
+
+    States may be given as classes or, so that states can refer to each
+    other and to themselves, as class names. Names are looked up in the
+    module of the state which owns the rule, and then among all States.
+
+    Because rules are declarative they can be applied to a whole grid
+    at once (see the Automaton), as well as one agent at a time.
+    '''
+
+    def __init__(
+        self, becomes, counting=None, count_in=None, count_not_in=None,
+        radius=1, after=None, probability=None
+    ):
+        self.becomes = becomes
+        self.counting = counting
+        self.count_in = frozenset(count_in) if count_in is not None else None
+        self.count_not_in = frozenset(count_not_in) if count_not_in is not None else None
+        self.radius = radius
+        self.after = after
+        self.probability = probability
+        # The state class whose rules these are
+        self.owner = None
+
+    def __repr__(self):
+        return 'Rule(becomes %s)' % getattr(self.becomes, '__name__', self.becomes)
+
+    #
+    # Resolving states
+    #
+
+    def bind(self, owner):
+        ''' Called by State when the owning state class is defined '''
+        self.owner = owner
+
+    def target(self):
+        ''' Returns the state class this rule moves agents into '''
+        self.becomes = self._resolve(self.becomes)
+        return self.becomes
+
+    def counted(self):
+        ''' Returns the state class whose neighbours are counted, if any '''
+        if self.counting is not None:
+            self.counting = self._resolve(self.counting)
+        return self.counting
+
+    def _resolve(self, state):
+        if not isinstance(state, str):
+            return state
+        # The owner's module first...
+        if self.owner is not None:
+            if self.owner.__name__ == state:
+                return self.owner
+            module = sys.modules.get(self.owner.__module__)
+            found = getattr(module, state, None)
+            if isinstance(found, type):
+                return found
+        # ...then every State
+        from .state import State
+        matches = [cls for cls in _subclasses(State) if cls.__name__ == state]
+        if len(matches) != 1:
+            raise Exception("Cannot find a unique state called '%s'" % state)
+        return matches[0]
+
+    #
+    # Applying the rule to one agent
+    #
+
+    def applies(self, state):
+        '''
+        Does this rule apply to an agent in the given state instance?
+        '''
+        if self.after is not None and state.age < self.after:
+            return False
+        if self.counting is not None:
+            count = state.agent.location.count_neighbours(self.counted(), radius=self.radius)
+            if self.count_in is not None and count not in self.count_in:
+                return False
+            if self.count_not_in is not None and count in self.count_not_in:
+                return False
+        if self.probability is not None and not state.agent.simulation.rng.bernoulli(self.probability):
+            return False
+        return True
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
@@ -1,34 +1,62 @@
 
 import abc
+from types import MappingProxyType
 
 from simulated_agency import glyphs
 
 
+# Shared by every state which is given no parameters
+EMPTY_CONTEXT = MappingProxyType({})
+
+
 class State(abc.ABC):
     '''
     Abstract base class to define what a State is
+
+    There is a state for every agent, so states have slots rather than
+    a __dict__. Subclasses which don't declare __slots__ (even empty)
+    get a __dict__ as well, which costs a hundred bytes or so each.
+
+    State instances are recycled once they have left the stack (see
+    StatePool), so don't hold on to one after the tick it leaves in.
+
+    A state's age (how many ticks it has been handled for) stays on the
+    state rather than moving onto the agent or a Column: a state lower
+    down the stack keeps its age while a state above it runs, so the
+    agent would need an age per stack entry anyway. States therefore
+    belong to one agent each and are not shared between agents.
     '''
-    
+
+    __slots__ = ('agent', 'age', 'context', '_timer', '_timer_due', '_timer_key')
+
     name = None
     colour = None
-    timer = None
     required_params = []
     # Used for drawing
     glyph = glyphs.X
+    # Declarative transitions (see Rule). States which declare rules,
+    # even an empty list, promise that their handle does nothing but
+    # call super().handle(), so they can be run by the Automaton.
+    rules = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for rule in cls.__dict__.get('rules') or []:
+            rule.bind(cls)
 
     def __init__(self, agent, **kwargs):
         self.agent = agent
         # Track state age (i.e. how long in this state)
         self.age = 0
-        # Set countdown if specified
-        if 'timer' in kwargs.keys():
-            self.timer = kwargs['timer']
+        # Set countdown if specified (see timer)
+        self._timer = kwargs.get('timer')
+        self._timer_due = None
+        self._timer_key = None
         # Check all required data is there
         if not all(key in kwargs for key in self.required_params):
             raise Exception('Not all required data exist in state context')
         # Update state context
-        self.context = {}
-        self.context.update(**kwargs)
+        self.context = dict(kwargs) if kwargs else EMPTY_CONTEXT
 
     def __repr__(self):
         return 'State(%s)' % self.name
@@ -38,13 +66,63 @@ class State(abc.ABC):
         ''' Execute the state in it's context '''
         # Increment state age
         self.age += 1
-        # Decrement timer if necessary
-        if self.timer:
-            self.timer -= 1
-            if self.timer == 0:
-                self.handle_timeout()
+        # Apply the first rule which applies, if we are still current
+        if self.rules and self.agent.current_state_instance() is self:
+            for rule in self.rules:
+                if rule.applies(self):
+                    self.agent.replace_state(rule.target())
+                    break
                 
+    @property
+    def rng(self):
+        ''' The simulation's random numbers (see Random) '''
+        return self.agent.simulation.rng
+
     def handle_timeout(self):
         ''' Called by default when the timer hits zero '''
         # Stop doing the thing we're doing
         self.agent.remove_state()
+
+    #
+    # Timers
+    #
+    # A timer counts down the ticks for which its state is the agent's
+    # current state, and then calls handle_timeout at the end of the
+    # tick. Rather than being counted down in handle, running timers
+    # are kept in the simulation's timing wheel (see Scheduler), so a
+    # state which is only waiting need not be executed at all.
+    #
+
+    @property
+    def timer(self):
+        ''' The number of ticks left on the timer, or None if there is no timer '''
+        if self._timer_key is not None:
+            return self._timer_due - self.agent.simulation.age
+        return self._timer
+
+    @timer.setter
+    def timer(self, ticks):
+        self._stop_timer()
+        self._timer = ticks
+        if self.agent._top_state() is self:
+            self._start_timer()
+
+    def _start_timer(self):
+        ''' Start counting down, as we have become the current state '''
+        if self._timer and self._timer_key is None:
+            simulation = self.agent.simulation
+            self._timer_due = simulation.age + self._timer
+            self._timer_key = simulation.timers.schedule(self._timer_due, (State._timer_expired, self))
+
+    def _stop_timer(self):
+        ''' Stop counting down, as we are no longer the current state '''
+        if self._timer_key is not None:
+            simulation = self.agent.simulation
+            simulation.timers.cancel(self._timer_key)
+            self._timer = self._timer_due - simulation.age
+            self._timer_key = None
+
+    def _timer_expired(self):
+        self._timer = 0
+        self._timer_key = None
+        self.handle_timeout()
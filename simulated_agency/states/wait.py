@@ -5,11 +5,25 @@ from .state import State
 class Wait(State):
     '''
     Represents waiting for some period of time
+
+    Waiting agents keep running every tick, as any other agent does.
+    Set dormant = True (e.g. on a subclass) to have them sleep instead
+    until the timer runs out or something changes their state, which
+    saves running them (see Scheduler).
     '''
 
+    __slots__ = ()
+
     name = 'WAITING'
     colour = (0, 255, 255)
     required_params = ['timer']
 
+    # Whether to sleep until the timer runs out
+    dormant = False
+
     def handle(self):
         super().handle()
+        if self.dormant:
+            # There is nothing to do until the timer runs out,
+            # and the timeout will wake us up again
+            self.agent.sleep()
@@ -0,0 +1,173 @@
+import numpy as np
+
+#
+# Neighbourhood stencils
+#
+# A stencil is the set of (dx, dy) offsets which make up a neighbourhood
+# of a given radius, relative to the cell at its centre. Stencils only
+# depend on (strategy, radius, border_only) and not on the cell, so one
+# compiled stencil is shared by every location in the world. The
+# simulation keeps the compiled stencils in its 'stencils' cache
+# (see Geometry.stencil).
+#
+# New strategies can be added with the register_stencil decorator and
+# then selected by setting `simulation.neighbourhood_strategy`.
+#
+
+# Strategy name -> function(radius, border_only) -> offsets
+stencil_builders = {}
+
+
+class Stencil(object):
+    '''
+    A compiled neighbourhood stencil.
+
+    Most stencils are the same for every cell. Hexagonal grids stored
+    with offset rows are not, so a stencil may carry a second set of
+    offsets which is used for cells in odd-numbered rows.
+    '''
+
+    def __init__(self, offsets, odd_row_offsets=None):
+        self.even = tuple(offsets)
+        self.odd = tuple(odd_row_offsets) if odd_row_offsets is not None else self.even
+        # Set forms for testing whether an offset is covered
+        self.even_set = frozenset(self.even)
+        self.odd_set = frozenset(self.odd)
+        # How far the stencil reaches along either axis
+        self.radius = max(max(abs(dx), abs(dy)) for dx, dy in self.even + self.odd)
+        # Cell index offsets, keyed by (world width, row parity)
+        self._index_offsets = {}
+        # Array forms for applying large stencils in one go
+        self.even_dx, self.even_dy = self._arrays(self.even)
+        self.odd_dx, self.odd_dy = self._arrays(self.odd)
+
+    def __repr__(self):
+        return 'Stencil(%s offsets)' % len(self.even)
+
+    def __len__(self):
+        return len(self.even)
+
+    @staticmethod
+    def _arrays(offsets):
+        array = np.array(offsets, dtype=np.int64).reshape(-1, 2)
+        return array[:, 0], array[:, 1]
+
+    def offsets_for(self, y):
+        ''' Returns the offsets to use for a cell in row y '''
+        return self.odd if y & 1 else self.even
+
+    def offset_set_for(self, y):
+        ''' Returns the offsets to use for a cell in row y, as a set '''
+        return self.odd_set if y & 1 else self.even_set
+
+    def index_offsets_for(self, y, width):
+        '''
+        Returns the offsets as cell index offsets, for a cell in row y of
+        a world of the given width. Only valid away from the edges.
+        '''
+        key = (width, y & 1)
+        try:
+            return self._index_offsets[key]
+        except KeyError:
+            offsets = self._index_offsets[key] = tuple(dy * width + dx for dx, dy in self.offsets_for(y))
+            return offsets
+
+    def arrays_for(self, y):
+        ''' Returns the (dx, dy) offset arrays to use for a cell in row y '''
+        if y & 1:
+            return self.odd_dx, self.odd_dy
+        return self.even_dx, self.even_dy
+
+
+def register_stencil(strategy):
+    '''
+    Decorator to register a neighbourhood strategy.
+
+    The decorated function takes (radius, border_only) and returns
+    either a list of (dx, dy) offsets or, for stencils which depend on
+    the row, a pair of lists for even and odd rows.
+
+    Example:
+        @register_stencil('knight')
+        def knight(radius, border_only):
+            return [(1, 2), (2, 1), ...]
+    '''
+
+    def decorator(builder):
+        stencil_builders[strategy] = builder
+        return builder
+
+    return decorator
+
+
+def compile_stencil(strategy, radius, border_only=False):
+    '''
+    Returns a newly compiled Stencil for a strategy and radius
+    '''
+
+    # Sanity check
+    if (radius < 1) or (int(radius) != radius):
+        raise Exception("Radius must be a positive integer")
+
+    try:
+        builder = stencil_builders[strategy]
+    except KeyError:
+        raise Exception("Unknown neighbourhood strategy '%s'" % strategy)
+
+    offsets = builder(int(radius), border_only)
+    if isinstance(offsets, tuple):
+        return Stencil(*offsets)
+    return Stencil(offsets)
+
+
+#
+# Built-in strategies
+#
+
+@register_stencil('von_neumann')
+def von_neumann(radius, border_only):
+    # Von Neumann neighbourhood for r==1 is
+    # the cell itself and the four adjacent cells
+    return [
+        (dx, dy)
+        for dx in range(-radius, radius + 1)
+        for dy in range(-radius, radius + 1)
+        if (abs(dx) + abs(dy) == radius if border_only else abs(dx) + abs(dy) <= radius)
+    ]
+
+
+@register_stencil('moore')
+def moore(radius, border_only):
+    # Moore neighbourhood for r==1 is the cell itself and the eight
+    # cells surrounding it. Larger radii give the extended Moore
+    # neighbourhood.
+    return [
+        (dx, dy)
+        for dx in range(-radius, radius + 1)
+        for dy in range(-radius, radius + 1)
+        if (not border_only) or (abs(dx) == radius) or (abs(dy) == radius)
+    ]
+
+
+@register_stencil('hexagonal')
+def hexagonal(radius, border_only):
+    # Hexagonal neighbourhood for a grid laid out with odd rows
+    # shunted right by half a cell. Distances are measured by
+    # converting the offset coordinates to cube coordinates.
+
+    def cube(col, row):
+        x = col - (row - (row & 1)) // 2
+        return x, -x - row, row
+
+    def offsets(row):
+        cx, cy, cz = cube(0, row)
+        result = []
+        for dy in range(-radius, radius + 1):
+            for dx in range(-radius - 1, radius + 2):
+                x, y, z = cube(dx, row + dy)
+                distance = max(abs(x - cx), abs(y - cy), abs(z - cz))
+                if distance == radius if border_only else distance <= radius:
+                    result.append((dx, dy))
+        return result
+
+    return offsets(0), offsets(1)
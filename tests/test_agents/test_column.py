@@ -0,0 +1,75 @@
+#
+# Test attributes stored in columns
+#
+
+import numpy as np
+import pytest
+
+from simulated_agency.agents import Column, Locatable
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import State
+
+
+#
+# Fixtures
+#
+
+class Idle(State):
+    def handle(self):
+        super().handle()
+
+class Eating(State):
+    def handle(self):
+        super().handle()
+        self.agent.energy += 1
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=10)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Locatable):
+        energy = Column(np.int16, default=5)
+    simulation.bind(Agent)
+    return Agent
+
+#
+# Tests
+#
+
+def test_attribute_access(simulation, Agent):
+    one = Agent(simulation.locations[0, 0], Idle)
+    two = Agent(simulation.locations[1, 0], Idle)
+    assert one.energy == 5
+    one.energy = 7
+    assert (one.energy, two.energy) == (7, 5)
+    assert 'energy' not in one.__dict__
+    # Subclasses get columns of their own
+    class Child(Agent):
+        pass
+    child = Child(simulation.locations[2, 0], Idle)
+    assert child.energy == 5
+    assert 'energy' in Child.objects.columns
+
+def test_bulk_updates(simulation, Agent):
+    agents = [Agent(simulation.locations[i % 10, i // 10], Idle) for i in range(40)]
+    energy = Agent.objects.column('energy')
+    energy[Agent.objects.slots(agents[::2])] += 10
+    assert [agent.energy for agent in agents[:4]] == [15, 5, 15, 5]
+    assert energy[Agent.objects.slots()].sum() == 40 * 5 + 20 * 10
+
+def test_destroyed_agents_keep_their_values(simulation, Agent):
+    Agent(simulation.locations[5, 5], Idle)
+    old = Agent(simulation.locations[0, 0], Idle)
+    old.energy = 1
+    old.destroy()
+    simulation.step()
+    new = Agent(simulation.locations[0, 0], Idle)
+    assert new.ref.slot == old.ref.slot
+    assert (old.energy, new.energy) == (1, 5)
+
+def test_columns_are_double_buffered(simulation, Agent):
+    agent = Agent(simulation.locations[0, 0], Eating)
+    simulation.step(synchronous=True)
+    assert agent.energy == 6
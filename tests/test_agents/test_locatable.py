@@ -27,7 +27,8 @@ def location(simulation):
 def Agent(simulation):
     # Returns a class not an instance
     class Agent(Locatable):
-        simulation = simulation
+        pass
+    Agent.simulation = simulation
     return Agent
 
 #
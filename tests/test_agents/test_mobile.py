@@ -24,7 +24,8 @@ def locations(simulation):
 @pytest.fixture
 def Agent(simulation):
     class Agent(Mobile):
-        simulation = simulation
+        pass
+    Agent.simulation = simulation
     return Agent
 
 
@@ -45,3 +45,24 @@ def test_flush(stack):
     stack.items = ['item_one', 'item_two']
     stack.flush()
     assert stack.items == []
+
+def test_inline_top(stack):
+    stack.push('item_one')
+    assert stack.size() == 1
+    stack.push('item_two')
+    stack.push('item_three')
+    assert stack.size() == 3
+    assert stack.pop() == 'item_three'
+    assert stack.pop() == 'item_two'
+    assert stack.items == ['item_one']
+    assert stack.pop() == 'item_one'
+    assert stack.is_empty() is True
+    with pytest.raises(IndexError):
+        stack.pop()
+
+def test_copy(stack):
+    stack.items = ['item_one', 'item_two']
+    copy = stack.copy()
+    copy.push('item_three')
+    assert stack.items == ['item_one', 'item_two']
+    assert copy.items == ['item_one', 'item_two', 'item_three']
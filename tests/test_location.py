@@ -216,3 +216,13 @@ def test_neighbourhood_moore_border_only(sim_wrap):
         l[7, 2],                                              l[3, 2],
         l[7, 3], l[8, 3], l[9, 3], l[0, 3], l[1, 3], l[2, 3], l[3, 3]
     }
+
+
+def test_views_are_compact(sim_wrap, sim_no_wrap_xy):
+
+    location = sim_wrap.locations[3, 4]
+    assert not hasattr(location, '__dict__')
+    # Each view finds its own simulation, whichever was made last
+    assert location.world.simulation is sim_wrap
+    assert sim_no_wrap_xy.locations[3, 4].world.simulation is sim_no_wrap_xy
+    assert location.right() is sim_wrap.locations[4, 4]
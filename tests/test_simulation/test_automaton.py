@@ -0,0 +1,118 @@
+#
+# Test the array-based cellular automaton engine
+#
+
+import pytest
+
+from simulated_agency.agents import Locatable
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import Rule, State
+
+
+#
+# Fixtures
+#
+
+class Alive(State):
+    rules = [Rule('Dead', counting='Alive', count_not_in=(2, 3))]
+    def handle(self):
+        super().handle()
+
+class Dead(State):
+    rules = [Rule('Alive', counting='Alive', count_in=(3,))]
+    def handle(self):
+        super().handle()
+
+class Burning(State):
+    rules = [Rule('Burnt', after=2)]
+    def handle(self):
+        super().handle()
+
+class Burnt(State):
+    rules = []
+    def handle(self):
+        super().handle()
+
+class Tree(State):
+    rules = [Rule('Burning', counting='Burning', count_not_in=(0,), probability=1)]
+    def handle(self):
+        super().handle()
+
+class Smouldering(State):
+    rules = [Rule('Burnt', counting='Smouldering', count_not_in=(0,), probability=0.5)]
+    def handle(self):
+        super().handle()
+
+def make_simulation(wrap, states):
+    simulation = Simulation(width=16, height=12)
+    simulation.wrap_x = simulation.wrap_y = wrap
+    simulation.neighbourhood_strategy = 'moore'
+    class Cell(Locatable): pass
+    simulation.bind(Cell)
+    simulation.seed_all(Cell, states)
+    return simulation, Cell
+
+def scalar_tick(simulation, agents):
+    ''' The executor's synchronous loop, one agent at a time '''
+    simulation.age += 1
+    simulation.buffer.begin()
+    for agent in agents:
+        agent.age += 1
+        agent.execute()
+    simulation.buffer.commit()
+
+def snapshot(agents):
+    return [(type(agent.current_state_instance()), agent.current_state_instance().age) for agent in agents]
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('wrap', [True, False], ids=['wrap', 'no_wrap'])
+@pytest.mark.parametrize('states', [[Alive, Dead], [Tree, Tree, Tree, Burning]], ids=['life', 'fire'])
+def test_matches_scalar_execution(wrap, states):
+    array_simulation, ArrayCell = make_simulation(wrap, states)
+    scalar_simulation, ScalarCell = make_simulation(wrap, states)
+    # Start both from the same states
+    for array_agent, scalar_agent in zip(ArrayCell.objects, ScalarCell.objects):
+        scalar_agent.replace_state(type(array_agent.current_state_instance()))
+    automaton = array_simulation.automaton
+    for _ in range(6):
+        assert automaton.eligible(ArrayCell.objects)
+        array_simulation.age += 1
+        automaton.tick()
+        scalar_tick(scalar_simulation, ScalarCell.objects)
+        assert snapshot(ArrayCell.objects) == snapshot(ScalarCell.objects)
+    assert [agent.age for agent in ArrayCell.objects] == [agent.age for agent in ScalarCell.objects]
+
+def test_ineligible_simulations():
+    simulation, Cell = make_simulation(True, [Alive, Dead])
+    automaton = simulation.automaton
+    assert automaton.eligible(Cell.objects)
+    # Per-agent hooks need the agents to be run one at a time
+    assert not automaton.eligible(Cell.objects, before_each_agent=lambda agent, loop_vars: None)
+    # As do states without rules
+    class Other(State):
+        def handle(self):
+            super().handle()
+    Cell.objects[0].replace_state(Other)
+    assert not automaton.eligible(Cell.objects)
+    # And cells without exactly one agent
+    Cell.objects[0].replace_state(Alive)
+    assert automaton.eligible(Cell.objects)
+    Cell.objects[0].destroy()
+    assert not automaton.eligible(Cell.objects)
+
+def test_random_rules_are_reproducible():
+    runs = []
+    for _ in range(2):
+        simulation, Cell = make_simulation(True, [Smouldering, Burnt])
+        simulation.rng.reseed(42)
+        for index, agent in enumerate(Cell.objects):
+            agent.replace_state(Smouldering if index % 3 else Burnt)
+        for _ in range(3):
+            assert simulation.automaton.eligible(Cell.objects)
+            simulation.age += 1
+            simulation.automaton.tick()
+        runs.append(snapshot(Cell.objects))
+    assert runs[0] == runs[1]
@@ -0,0 +1,72 @@
+#
+# Test double buffered synchronous execution
+#
+
+import pytest
+
+from simulated_agency.agents import Buffered, Locatable
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import State
+
+
+#
+# Fixtures
+#
+
+class Even(State):
+    def handle(self):
+        super().handle()
+        # Copy the state of the next agent along
+        agent = self.agent
+        agent.replace_state(type(agent.next.current_state_instance()))
+        agent.energy = agent.next.energy + 1
+
+class Odd(Even):
+    pass
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=10)
+
+@pytest.fixture
+def agents(simulation):
+    class Agent(Locatable):
+        energy = Buffered(0)
+    simulation.bind(Agent)
+    agents = [Agent(simulation.locations[x, 0], Even if x % 2 else Odd) for x in range(4)]
+    for agent, next_agent in zip(agents, agents[1:] + agents[:1]):
+        agent.next = next_agent
+    return agents
+
+#
+# Tests
+#
+
+def test_reads_come_from_the_front_buffer(simulation, agents):
+    simulation.step(synchronous=True)
+    # Everyone saw the states and energies from the start of the tick
+    assert [type(agent.current_state_instance()) for agent in agents] == [Even, Odd, Even, Odd]
+    assert [agent.energy for agent in agents] == [1, 1, 1, 1]
+    Agent = type(agents[0])
+    assert set(simulation.agents_in_state(Agent, Even)) == set(agents)
+    assert set(simulation.agents_in_state(Agent, Odd)) == {agents[1], agents[3]}
+
+def test_only_changes_are_buffered(simulation, agents):
+    buffer = simulation.buffer
+    buffer.begin()
+    agents[0].execute()
+    agents[1].replace_state_instance(agents[1].current_state_instance())
+    assert set(buffer.stacks) == {agents[0], agents[1]}
+    assert set(buffer.attributes) == {agents[0]}
+    assert agents[0].energy == 0
+    # Destroyed agents' changes are dropped
+    agents[1].destroy()
+    assert set(buffer.stacks) == {agents[0]}
+    buffer.commit()
+    assert agents[0].energy == 1
+    assert not buffer.stacks and not buffer.attributes
+
+def test_unbuffered_outside_synchronous_execution(simulation, agents):
+    agents[0].energy = 7
+    assert agents[0].energy == 7
+    assert agents[1].energy == 0
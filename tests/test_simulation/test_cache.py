@@ -0,0 +1,63 @@
+#
+# Test the simulation's memo caches
+#
+
+import pytest
+
+from simulated_agency.simulation.cache import BoundedCache
+from simulated_agency.simulation.simulation import Simulation
+
+
+def test_lru_eviction():
+    cache = BoundedCache('test', maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # Touch 'a' so that 'b' is the least recently used
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.stats()['evictions'] == 1
+
+def test_fifo_eviction():
+    cache = BoundedCache('test', maxsize=2, policy='fifo')
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'a' not in cache
+
+def test_stats():
+    cache = BoundedCache('test')
+    assert cache.get('missing') is None
+    cache.set('present', 1)
+    cache.get('present')
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+    assert stats['hit_rate'] == 0.5
+
+def test_bad_policy():
+    with pytest.raises(Exception):
+        BoundedCache('test', policy='random')
+
+def test_simulation_caches():
+    sim = Simulation(width=10, height=10)
+    goal = sim.locations[2, 2]
+    field = sim.distance_field(goal)
+    assert sim.distance_field(goal) is field
+    stats = sim.cache_stats()['distance_fields']
+    assert stats['hits'] == 1
+    assert stats['size'] == 1
+    # Changing the wrapping clears the now stale fields
+    sim.wrap_x = False
+    assert sim.cache_stats()['distance_fields']['size'] == 0
+    assert sim.distance_field(goal)[sim.world.index(9, 2)] == 7
+
+def test_invalidate_by_name():
+    sim = Simulation(width=10, height=10)
+    sim.stencil(1)
+    assert len(sim.caches['stencils']) == 1
+    sim.invalidate_caches('stencils')
+    assert len(sim.caches['stencils']) == 0
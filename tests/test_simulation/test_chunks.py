@@ -0,0 +1,69 @@
+#
+# Test that the world is chunked correctly
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def simulation():
+    # Use small chunks for these tests
+    class SmallChunkSimulation(Simulation):
+        chunk_size = 8
+    return SmallChunkSimulation(width=20, height=12)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Mobile):
+        pass
+    Agent.simulation = simulation
+    return Agent
+
+@pytest.fixture
+def chunks(simulation):
+    return simulation.world.chunks
+
+#
+# Tests
+#
+
+def test_layout(simulation, chunks):
+    assert (chunks.chunks_wide, chunks.chunks_high) == (3, 2)
+    assert len(chunks) == 6
+    assert chunks.chunk_of(simulation.world.index(9, 3)) == 1
+    assert chunks.chunk_of(simulation.world.index(19, 11)) == 5
+    # Chunks at the edges are cut short
+    assert chunks.bounds(5) == (16, 8, 20, 12)
+
+def test_everything_starts_asleep(chunks):
+    assert chunks.awake() == []
+    assert all(chunks.is_asleep(chunk_id) for chunk_id in range(len(chunks)))
+
+def test_agents_keep_chunks_awake(simulation, chunks, Agent):
+    agent = Agent(simulation.locations[1, 1])
+    assert list(chunks.agents_in(0)) == [agent]
+    chunks.clean()
+    assert chunks.awake() == [0]
+    # Moving to another chunk leaves the old one dirty
+    agent._relocate(simulation.locations[9, 1])
+    assert chunks.awake() == [0, 1]
+    chunks.clean()
+    assert chunks.awake() == [1]
+    agent.destroy()
+    assert chunks.awake() == [1]
+    chunks.clean()
+    assert chunks.awake() == []
+
+def test_location_changes_wake_chunks(simulation, chunks):
+    simulation.locations[17, 10].capacity = 0
+    assert chunks.awake() == [5]
+    chunks.clean()
+    simulation.create_obstruction_rectangle(6, 6, 4, 4)
+    assert chunks.awake() == [0, 1, 3, 4]
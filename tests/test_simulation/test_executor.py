@@ -0,0 +1,65 @@
+#
+# Test headless execution
+#
+
+import sys
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import MoveRandomly
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def simulation():
+    simulation = Simulation(width=20, height=16)
+    class Walker(Mobile): pass
+    simulation.bind(Walker)
+    simulation.seed(Walker, 10, MoveRandomly)
+    return simulation
+
+#
+# Tests
+#
+
+def test_step(simulation):
+    summary = simulation.step()
+    assert summary.age == simulation.age == 1
+    assert summary.agents == 10
+    assert summary.counts == {'Walker': 10}
+
+def test_run_yields_each_tick_and_returns_a_result(simulation):
+    ticks = simulation.run(5)
+    assert [summary.age for summary in ticks] == [1, 2, 3, 4, 5]
+    def consume():
+        result = yield from simulation.run(3)
+        return result
+    generator = consume()
+    with pytest.raises(StopIteration) as stop:
+        while True:
+            next(generator)
+    result = stop.value.value
+    assert (result.ticks, result.age, result.agents) == (3, 8, 10)
+
+def test_headless_execute(simulation):
+    seen = []
+    result = simulation.execute(
+        before_each_loop=lambda: simulation.age,
+        before_each_agent=lambda agent, age: seen.append(age),
+        timer=4, headless=True
+    )
+    assert result.ticks == 4 and result.age == 4
+    assert seen == [age for age in range(1, 5) for _ in range(10)]
+    # No window, so no need for pyglet
+    assert 'pyglet' not in sys.modules
+
+def test_headless_execute_needs_a_timer(simulation):
+    # Otherwise there would be no way of stopping it
+    with pytest.raises(Exception, match='timer'):
+        simulation.execute(headless=True)
+    assert simulation.age == 0
@@ -4,6 +4,7 @@
 #
 
 
+import numpy as np
 import pytest
 
 from simulated_agency.simulation.simulation import Simulation
@@ -168,6 +169,33 @@ def test_distance_between_without_wrap(sim_no_wrap_xy):
     assert sim_no_wrap_xy.distance_between(loc_00, loc_99) == 18
 
 
+def test_distance_between_chebyshev(sim_wrap, sim_no_wrap_xy):
+
+    assert sim_wrap.distance_between(sim_wrap.locations[0, 0], sim_wrap.locations[2, 9], metric='chebyshev') == 2
+    assert sim_no_wrap_xy.distance_between(sim_no_wrap_xy.locations[0, 0], sim_no_wrap_xy.locations[2, 9], metric='chebyshev') == 9
+    with pytest.raises(Exception):
+        sim_wrap.distance_between(sim_wrap.locations[0, 0], sim_wrap.locations[2, 9], metric='euclidean')
+
+
+@pytest.mark.parametrize('metric', ['manhattan', 'chebyshev'])
+def test_array_versions_match_scalar_versions(sim_wrap, sim_no_wrap_xy, metric):
+
+    xs1, ys1 = np.meshgrid(np.arange(10), np.arange(10))
+    xs1, ys1 = xs1.ravel(), ys1.ravel()
+    xs2, ys2 = xs1[::-1] * 3 % 10, ys1 * 7 % 10
+
+    for sim in (sim_wrap, sim_no_wrap_xy):
+        dx, dy = sim.vectors_between(xs1, ys1, xs2, ys2)
+        distances = sim.distances_between(xs1, ys1, xs2, ys2, metric=metric)
+        for i in range(len(xs1)):
+            x1, y1, x2, y2 = int(xs1[i]), int(ys1[i]), int(xs2[i]), int(ys2[i])
+            assert (dx[i], dy[i]) == sim.vector_between(x1, y1, x2, y2)
+            assert distances[i] == sim.distance_between(sim.locations[x1, y1], sim.locations[x2, y2], metric=metric)
+
+    # Broadcasting gives every pair at once
+    assert sim_wrap.distances_between(xs1[:, None], ys1[:, None], xs2[None, :], ys2[None, :]).shape == (100, 100)
+
+
 def test_nearest_with_wrap(sim_wrap):
 
     l = sim_wrap.locations
@@ -0,0 +1,116 @@
+#
+# Test whole-grid neighbour counts
+#
+
+import pytest
+
+from simulated_agency.agents import Locatable, Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import State
+
+
+#
+# Fixtures
+#
+
+class On(State):
+    def handle(self):
+        super().handle()
+
+class Off(State):
+    def handle(self):
+        super().handle()
+
+@pytest.fixture(params=[True, False], ids=['wrap', 'no_wrap'])
+def simulation(request):
+    simulation = Simulation(width=12, height=9)
+    simulation.wrap_x = simulation.wrap_y = request.param
+    return simulation
+
+@pytest.fixture
+def Cell(simulation):
+    class Cell(Locatable): pass
+    simulation.bind(Cell)
+    simulation.seed_all(Cell, [On, Off])
+    return Cell
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('strategy, radius', [
+    ('moore', 1), ('von_neumann', 1), ('von_neumann', 2), ('hexagonal', 1)
+])
+def test_counts_match_neighbours(simulation, Cell, strategy, radius):
+    simulation.neighbourhood_strategy = strategy
+    counts = simulation.count_neighbours(On, radius=radius)
+    assert counts.shape == (9, 12)
+    for location in simulation.locations.values():
+        expected = len([a for a in location.neighbours(radius=radius) if a.is_in_state(On)])
+        assert counts[location.y, location.x] == expected
+        assert location.count_neighbours(On, radius=radius) == expected
+
+def test_counts_agent_classes(simulation, Cell):
+    simulation.neighbourhood_strategy = 'moore'
+    location = simulation.locations[5, 5]
+    assert location.count_neighbours(Cell) == 8
+    assert location.count_neighbours(Cell, include_self_location=True) == 9
+    # Strategies can be chosen per query
+    assert location.count_neighbours(Cell, strategy='von_neumann') == 4
+
+def test_counts_are_kept_until_something_changes(simulation, Cell):
+    location = simulation.locations[5, 5]
+    before = simulation.count_neighbours(On)
+    assert simulation.count_neighbours(On) is before
+    simulation.age += 1
+    assert simulation.count_neighbours(On) is before
+    # State changes are seen straight away, even within a tick
+    for agent in location.neighbours():
+        agent.replace_state(On)
+    assert location.count_neighbours(On) == 4
+
+def test_counts_follow_agents_within_a_tick(simulation):
+    class Walker(Mobile): pass
+    simulation.bind(Walker)
+    location = simulation.locations[5, 5]
+    assert location.count_neighbours(Walker) == 0
+    # Before the first tick, as during setup
+    walker = Walker(simulation.locations[5, 4], On)
+    assert location.count_neighbours(Walker) == 1
+    assert location.count_neighbours(On) == 1
+    walker.move_to_location(simulation.locations[5, 2])
+    assert location.count_neighbours(Walker) == 0
+    walker.move_to_location(simulation.locations[4, 5])
+    assert location.count_neighbours(Walker) == 1
+    walker.destroy()
+    assert location.count_neighbours(Walker) == 0
+
+@pytest.mark.parametrize('strategy, radius', [
+    ('moore', 1), ('von_neumann', 2), ('hexagonal', 1)
+])
+def test_counts_are_kept_up_to_date_rather_than_recounted(simulation, Cell, strategy, radius, monkeypatch):
+    class Walker(Mobile):
+        # Weightless, so as to fit in with the cells
+        mass = 0
+    simulation.bind(Walker)
+    walkers = [Walker(simulation.random_location(), On) for _ in range(10)]
+    queries = [(On, False), (Off, True), (Cell, False), (Walker, True)]
+    for what, include_self_location in queries:
+        simulation.count_neighbours(what, strategy, radius, include_self_location=include_self_location)
+    # Every change from here on is made without counting again
+    convolutions = []
+    convolve = simulation.layers.convolve
+    monkeypatch.setattr(simulation.layers, 'convolve', lambda *args: convolutions.append(args) or convolve(*args))
+    rng = simulation.rng
+    cells = list(Cell.objects)
+    for _ in range(200):
+        rng.choice(cells).replace_state(rng.choice([On, Off]))
+        rng.choice(walkers).move_to_location(simulation.random_location())
+    walkers.pop().destroy()
+    walkers.append(Walker(simulation.random_location(), Off))
+    for what, include_self_location in queries:
+        counts = simulation.count_neighbours(what, strategy, radius, include_self_location=include_self_location)
+        neighbourhood_stencil = simulation.stencil(radius, False, strategy)
+        expected = convolve(simulation.layer(what), neighbourhood_stencil, include_self_location)
+        assert (counts == expected).all()
+    assert convolutions == []
@@ -0,0 +1,107 @@
+#
+# Test that agents are grouped by their current state
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import Dead, State
+
+
+#
+# Fixtures
+#
+
+class Alive(State):
+    def handle(self):
+        super().handle()
+
+class Grazing(Alive):
+    pass
+
+class Fleeing(Alive):
+    pass
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=30, height=20)
+
+@pytest.fixture
+def classes(simulation):
+    class Hunter(Mobile): pass
+    class Prey(Mobile): pass
+    simulation.bind(Hunter, Prey)
+    return Hunter, Prey
+
+#
+# Tests
+#
+
+def test_membership_follows_state_stack(simulation, classes):
+    Hunter, Prey = classes
+    prey = Prey(simulation.locations[1, 1], Grazing)
+    assert list(simulation.agents_in_state(Prey, Grazing)) == [prey]
+    # Base state classes include their subclasses
+    assert list(simulation.agents_in_state(Prey, Alive)) == [prey]
+    assert list(simulation.agents_in_state(Hunter, Grazing)) == []
+    prey.add_state(Fleeing)
+    assert list(simulation.agents_in_state(Prey, Grazing)) == []
+    assert list(simulation.agents_in_state(Prey, Fleeing)) == [prey]
+    prey.remove_state()
+    assert list(simulation.agents_in_state(Prey, Grazing)) == [prey]
+    prey.replace_state(Dead)
+    assert list(simulation.agents_in_state(Prey, Alive)) == []
+    assert list(simulation.agents_in_state(Prey, Dead)) == [prey]
+    prey.destroy()
+    assert simulation.memberships.members == {}
+
+def test_base_classes_are_grouped_once_asked_about(simulation, classes):
+    Hunter, Prey = classes
+    grazing = Prey(simulation.locations[1, 1], Grazing)
+    fleeing = Prey(simulation.locations[2, 1], Fleeing)
+    # Only the classes of the states themselves, to begin with
+    assert set(simulation.memberships.members) == {(Prey, Grazing), (Prey, Fleeing)}
+    assert set(simulation.agents_in_state(Prey, Alive)) == {grazing, fleeing}
+    assert set(simulation.agents_in_state(Prey, State)) == {grazing, fleeing}
+    # And from then on for new agents too
+    dead = Prey(simulation.locations[3, 1], Dead)
+    assert set(simulation.agents_in_state(Prey, State)) == {grazing, fleeing, dead}
+    fleeing.replace_state(Dead)
+    assert list(simulation.agents_in_state(Prey, Alive)) == [grazing]
+
+@pytest.mark.parametrize('count', [10, 200], ids=['few', 'many'])
+def test_nearest_where_state(simulation, classes, count):
+    Hunter, Prey = classes
+    simulation.seed(Hunter, 5, Grazing)
+    simulation.seed(Prey, count, Grazing)
+    for prey in Prey.objects[::2]:
+        prey.replace_state(Dead)
+    for hunter in Hunter.objects:
+        nearest = hunter.nearest(Prey, where=Alive)
+        assert nearest.is_in_state(Alive)
+        best = min(hunter.distance_to(p) for p in Prey.objects if p.is_in_state(Alive))
+        assert hunter.distance_to(nearest) == best
+        # Predicates work the same way
+        nearest = hunter.nearest(Prey, where=lambda p: p.is_in_state(Dead))
+        assert nearest.is_in_state(Dead)
+    # Lists of candidates can be narrowed down too
+    assert Hunter.objects[0].nearest(Prey.objects, where=Alive).is_in_state(Alive)
+
+def test_nearest_where_nothing_matches(simulation, classes):
+    Hunter, Prey = classes
+    hunter = Hunter(simulation.locations[1, 1], Grazing)
+    Prey(simulation.locations[2, 1], Dead)
+    assert hunter.nearest(Prey, where=Alive) is None
+    assert hunter.nearest(Prey, radius=3, where=Alive) is None
+    assert simulation.nearest_many([hunter], Prey, where=Alive) == [None]
+
+def test_neighbours_where(simulation, classes):
+    Hunter, Prey = classes
+    hunter = Hunter(simulation.locations[5, 5], Grazing)
+    alive = Prey(simulation.locations[5, 6], Grazing)
+    Prey(simulation.locations[6, 5], Dead)
+    location = hunter.location
+    assert location.neighbours(where=Alive) == [alive]
+    assert location.neighbours(agent_class=Prey, where=Alive) == [alive]
+    assert location.neighbours(radius=10, agent_class=Prey, where=Alive) == [alive]
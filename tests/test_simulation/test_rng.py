@@ -0,0 +1,72 @@
+#
+# Test the simulation's random numbers
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import MoveRandomly, State
+
+
+#
+# Fixtures
+#
+
+class Chasing(State):
+    def handle(self):
+        super().handle()
+        target = self.agent.nearest(type(self.agent))
+        if target is not None and self.rng.bernoulli(0.5):
+            self.agent.move_towards_target(target)
+        else:
+            self.agent.move_randomly()
+
+def run(seed, ticks=10):
+    simulation = Simulation(width=20, height=20, seed=seed)
+    class Walker(Mobile):
+        pass
+    simulation.bind(Walker)
+    simulation.seed(Walker, 30, MoveRandomly)
+    simulation.seed(Walker, 10, Chasing)
+    for _ in range(ticks):
+        simulation.step()
+    return [(agent.location.x, agent.location.y) for agent in Walker.objects]
+
+@pytest.fixture
+def rng():
+    return Simulation(width=10, height=10, seed=1).rng
+
+#
+# Tests
+#
+
+def test_runs_are_reproducible():
+    assert run(seed=3) == run(seed=3)
+    assert run(seed=3) != run(seed=4)
+
+def test_seed_is_recorded():
+    simulation = Simulation(width=10, height=10)
+    assert Simulation(width=10, height=10, seed=simulation.rng.seed).rng.random() == simulation.rng.random()
+
+def test_single_numbers(rng):
+    draws = [rng.random() for _ in range(10000)]
+    assert all(0 <= draw < 1 for draw in draws)
+    assert sum(rng.bernoulli(0.25) for _ in range(10000)) == pytest.approx(2500, rel=0.1)
+    assert {rng.randint(1, 3) for _ in range(1000)} == {1, 2, 3}
+    assert {rng.randrange(3) for _ in range(1000)} == {0, 1, 2}
+
+def test_sequences(rng):
+    assert rng.choice('abc') in 'abc'
+    with pytest.raises(IndexError):
+        rng.choice([])
+    assert rng.choices('ab', weights=[0, 1], k=5) == ['b'] * 5
+    for size in (5, 500):
+        items = list(range(size))
+        rng.shuffle(items)
+        assert sorted(items) == list(range(size))
+        assert items != list(range(size))
+
+def test_streams(rng):
+    assert rng.stream(0, 1).random() == rng.stream(0, 1).random()
+    assert rng.stream(0, 1).random() != rng.stream(1, 1).random()
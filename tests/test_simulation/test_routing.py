@@ -0,0 +1,106 @@
+#
+# Test routing with shared distance fields
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.routing import Routing
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import MoveTowardsLocation
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(params=[True, False], ids=['wrap', 'no_wrap'])
+def simulation(request):
+    simulation = Simulation(width=20, height=16)
+    simulation.wrap_x = simulation.wrap_y = request.param
+    return simulation
+
+@pytest.fixture
+def Walker(simulation):
+    class Walker(Mobile): pass
+    simulation.bind(Walker)
+    return Walker
+
+#
+# Tests
+#
+
+def test_open_field_matches_distances(simulation):
+    goal = simulation.locations[3, 4]
+    field = simulation.distance_field(goal)
+    for location in simulation.locations.values():
+        assert field[location.index] == goal.distance_to(location)
+
+def test_field_is_shared_until_the_world_changes(simulation):
+    goal = simulation.locations[3, 4]
+    field = simulation.distance_field(goal)
+    assert simulation.distance_field(goal) is field
+    simulation.create_obstruction_rectangle(0, 8, 20, 1)
+    blocked = simulation.distance_field(goal)
+    assert blocked is not field
+    if simulation.wrap_y:
+        # The long way round is the only way round
+        assert blocked[simulation.world.index(3, 10)] == 10
+    else:
+        assert blocked[simulation.world.index(3, 10)] == Routing.UNREACHABLE
+
+def test_walkers_route_around_walls(simulation, Walker):
+    simulation.wrap_x = simulation.wrap_y = False
+    simulation.routing_strategy = 'flow_field'
+    # A wall with a gap at the right hand end
+    simulation.create_obstruction_rectangle(0, 8, 18, 1)
+    goal = simulation.locations[2, 2]
+    walker = Walker(simulation.locations[2, 14], MoveTowardsLocation, location=goal)
+    for _ in range(60):
+        if walker.location is goal:
+            break
+        walker.execute()
+    assert walker.location is goal
+
+def test_greedy_routing_can_be_chosen_per_state(simulation, Walker):
+    simulation.wrap_x = simulation.wrap_y = False
+    simulation.routing_strategy = 'flow_field'
+    simulation.create_obstruction_rectangle(0, 8, 18, 1)
+    goal = simulation.locations[2, 2]
+    walker = Walker(simulation.locations[2, 14], MoveTowardsLocation, location=goal, routing='greedy')
+    for _ in range(50):
+        walker.execute()
+    # Greedy walkers get stuck against the wall
+    assert walker.location.y == 9
+
+def test_hpa_routes_around_walls(simulation, Walker):
+    simulation.wrap_x = simulation.wrap_y = False
+    simulation.cluster_size = 4
+    simulation.create_obstruction_rectangle(0, 8, 18, 1)
+    for start, goal in [((2, 14), (2, 2)), ((10, 2), (1, 15)), ((0, 0), (19, 15))]:
+        goal = simulation.locations[goal]
+        walker = Walker(simulation.locations[start], MoveTowardsLocation, location=goal, routing='hpa')
+        shortest = simulation.distance_field(goal)[walker.location.index]
+        steps = 0
+        while walker.location is not goal and steps < 2 * shortest:
+            walker.execute()
+            steps += 1
+        assert walker.location is goal
+        walker.destroy()
+
+def test_hpa_only_forgets_affected_clusters(simulation, Walker):
+    simulation.cluster_size = 4
+    hierarchy = simulation.routing.hierarchy()
+    goal = simulation.locations[18, 14]
+    assert hierarchy.waypoint(simulation.world.index(1, 1), goal.index) is not None
+    fields = dict(hierarchy._fields.entries)
+    paths = len(hierarchy._paths)
+    # Far away from the route, nearly everything is kept
+    simulation.locations[10, 1].capacity = 0
+    assert 0 < len(hierarchy._paths) <= paths
+    kept = [key for key in fields if key in hierarchy._fields]
+    assert kept and all(hierarchy.cluster_of(simulation.world.index(10, 1)) != key[0] for key in kept)
+    # Closing off the goal means there is no route at all
+    for neighbour in goal.neighbourhood(include_self_location=False):
+        neighbour.capacity = 0
+    assert hierarchy.waypoint(simulation.world.index(1, 1), goal.index) is None
@@ -0,0 +1,143 @@
+#
+# Test dormant agents and the active set
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import Dead, State, Wait
+
+
+#
+# Fixtures
+#
+
+class Idle(State):
+    def handle(self):
+        super().handle()
+        self.agent.handled += 1
+
+class Gone(Dead):
+    dormant = True
+
+class Mourned(Dead):
+    def handle(self):
+        super().handle()
+        self.agent.handled += 1
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=10)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Mobile):
+        handled = 0
+    simulation.bind(Agent)
+    return Agent
+
+#
+# Tests
+#
+
+def test_sleeping_for_some_ticks(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    simulation.step()
+    agent.sleep(ticks=3)
+    assert agent not in simulation.scheduler.agents()
+    for _ in range(3):
+        simulation.step()
+    assert agent.handled == 1
+    simulation.step()
+    assert agent.handled == 2
+    # Ages carry on as if the agent had been active all along
+    assert agent.age == 5
+    assert agent.current_state_instance().age == 5
+
+def test_woken_by_neighbours(simulation, Agent):
+    sleeper = Agent(simulation.locations[1, 1], Idle)
+    mover = Agent(simulation.locations[5, 5], Wait, timer=100)
+    sleeper.sleep(watch=1)
+    mover.move_to_location(simulation.locations[5, 4])
+    assert sleeper.is_dormant()
+    mover.move_to_location(simulation.locations[2, 1])
+    assert not sleeper.is_dormant()
+    # Changes of state nearby wake watchers too
+    sleeper.sleep(watch=1)
+    mover.replace_state(Idle)
+    assert not sleeper.is_dormant()
+
+def test_woken_explicitly_or_by_a_change_of_state(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Gone)
+    simulation.step()
+    # Dormant dead sleep until something changes
+    assert agent.is_dormant()
+    simulation.step()
+    assert agent.is_dormant()
+    agent.wake()
+    assert not agent.is_dormant()
+    agent.sleep()
+    agent.replace_state(Idle)
+    assert not agent.is_dormant()
+    simulation.step()
+    assert agent.handled == 1
+
+def test_a_new_sleep_replaces_the_old_one(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    agent.sleep(ticks=1)
+    agent.wake()
+    agent.sleep(ticks=5)
+    simulation.step()
+    simulation.step()
+    assert agent.is_dormant()
+
+def test_destroyed_agents_are_forgotten(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    agent.sleep(watch=1, ticks=2)
+    agent.destroy()
+    assert not simulation.scheduler.dormant
+    assert not simulation.scheduler.watchers
+
+def test_only_active_agents_are_kept_in_the_active_set(simulation, Agent):
+    agents = [Agent(simulation.locations[i, 0], Idle) for i in range(5)]
+    scheduler = simulation.scheduler
+    # While most agents are active, they aren't kept anywhere else
+    assert scheduler.active is None
+    assert scheduler.agents() == agents
+    agents[1].sleep()
+    agents[2].sleep()
+    assert scheduler.active is None
+    assert scheduler.agents() == [agents[0], agents[3], agents[4]]
+    # Once most are dormant, the active ones are kept in a set
+    agents[4].sleep()
+    assert list(scheduler.active) == [agents[0], agents[3]]
+    agents[3].sleep()
+    assert list(scheduler.active) == [agents[0]]
+    agents[3].wake()
+    agents[0].destroy()
+    assert list(scheduler.active) == [agents[3]]
+    # Which is dropped once most are awake again
+    for agent in (agents[1], agents[2], agents[4]):
+        agent.wake()
+    assert scheduler.active is None
+    assert scheduler.agents() == agents[1:]
+
+def test_agents_join_when_their_class_is_bound(simulation):
+    class Late(Mobile):
+        pass
+    Late.simulation = simulation
+    late = Late(simulation.locations[4, 4], Idle)
+    assert late not in simulation.scheduler.agents()
+    simulation.bind(Late)
+    assert late in simulation.scheduler.agents()
+
+def test_the_dead_only_sleep_if_dormant(simulation, Agent):
+    dead = Agent(simulation.locations[1, 1], Dead)
+    # Existing subclasses carry on being run
+    mourned = Agent(simulation.locations[2, 2], Mourned)
+    simulation.step()
+    simulation.step()
+    assert not dead.is_dormant()
+    assert not mourned.is_dormant()
+    assert mourned.handled == 2
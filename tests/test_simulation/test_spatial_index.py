@@ -0,0 +1,118 @@
+#
+# Test the per-class spatial index
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(params=[True, False], ids=['wrap', 'no_wrap'])
+def simulation(request):
+    simulation = Simulation(width=30, height=20)
+    simulation.wrap_x = simulation.wrap_y = request.param
+    return simulation
+
+@pytest.fixture
+def classes(simulation):
+    class Hunter(Mobile): pass
+    class Prey(Mobile): pass
+    simulation.bind(Hunter, Prey)
+    return Hunter, Prey
+
+#
+# Tests
+#
+
+def test_index_is_maintained(simulation, classes):
+    Hunter, Prey = classes
+    spatial_index = simulation.world.indexes[Prey]
+    prey = Prey(simulation.locations[1, 1])
+    assert len(spatial_index) == 1
+    prey._relocate(simulation.locations[25, 15])
+    assert spatial_index.agents_near(25, 15, 0) == [prey]
+    assert spatial_index.agents_near(1, 1, 0) == []
+    prey.destroy()
+    assert len(spatial_index) == 0
+    assert spatial_index.buckets == {}
+
+def test_existing_agents_are_indexed_on_bind(simulation):
+    class Late(Mobile):
+        pass
+    Late.simulation = simulation
+    late = Late(simulation.locations[4, 4])
+    simulation.bind(Late)
+    assert simulation.world.indexes[Late].agents_near(4, 4, 1) == [late]
+
+def test_nearest_matches_brute_force(simulation, classes):
+    Hunter, Prey = classes
+    simulation.seed(Hunter, 10, None)
+    simulation.seed(Prey, 25, None)
+    for hunter in Hunter.objects:
+        nearest = simulation.nearest(hunter, Prey)
+        best = min(hunter.distance_to(prey) for prey in Prey.objects)
+        assert hunter.distance_to(nearest) == best
+
+def test_nearest_excludes_self(simulation, classes):
+    Hunter, Prey = classes
+    hunter_one = Hunter(simulation.locations[3, 3])
+    hunter_two = Hunter(simulation.locations[10, 3])
+    assert hunter_one.nearest(Hunter) is hunter_two
+    hunter_two.destroy()
+    assert hunter_one.nearest(Hunter) is None
+
+def test_nearest_with_radius(simulation, classes):
+    Hunter, Prey = classes
+    hunter = Hunter(simulation.locations[3, 3])
+    prey = Prey(simulation.locations[5, 4])
+    assert hunter.nearest(Prey, radius=2) is None
+    assert hunter.nearest(Prey, radius=3) is prey
+
+def test_neighbours_of_class(simulation, classes):
+    Hunter, Prey = classes
+    simulation.seed(Hunter, 50, None)
+    simulation.seed(Prey, 50, None)
+    location = simulation.locations[15, 10]
+    for radius in [1, 2, 6]:
+        expected = [a for a in location.neighbours(radius=radius) if type(a) is Prey]
+        found = location.neighbours(radius=radius, agent_class=Prey)
+        assert set(found) == set(expected)
+
+
+#
+# Batched queries
+#
+
+def test_nearest_many_matches_nearest(simulation, classes):
+    Hunter, Prey = classes
+    simulation.seed(Hunter, 20, None)
+    simulation.seed(Prey, 30, None)
+    found = simulation.nearest_many(Hunter, Prey)
+    assert len(found) == 20
+    for hunter, prey in zip(Hunter.objects, found):
+        best = min(hunter.distance_to(p) for p in Prey.objects)
+        assert hunter.distance_to(prey) == best
+
+def test_nearest_many_k(simulation, classes):
+    Hunter, Prey = classes
+    hunter = Hunter(simulation.locations[10, 10])
+    near = Prey(simulation.locations[11, 10])
+    middle = Prey(simulation.locations[13, 10])
+    far = Prey(simulation.locations[10, 15])
+    assert simulation.nearest_many([hunter], Prey, k=2) == [[near, middle]]
+    assert simulation.nearest_many([hunter], Prey, k=5) == [[near, middle, far]]
+
+def test_nearest_many_radius_and_self(simulation, classes):
+    Hunter, Prey = classes
+    hunter_one = Hunter(simulation.locations[3, 3])
+    hunter_two = Hunter(simulation.locations[5, 4])
+    assert simulation.nearest_many(Hunter, Hunter) == [hunter_two, hunter_one]
+    assert simulation.nearest_many(Hunter, Hunter, radius=2) == [None, None]
+    assert simulation.nearest_many(Hunter, Hunter, radius=3) == [hunter_two, hunter_one]
+    assert simulation.nearest_many(Hunter, Prey) == [None, None]
+    assert simulation.nearest_many(Hunter, Prey, k=3) == [[], []]
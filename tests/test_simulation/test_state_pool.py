@@ -0,0 +1,84 @@
+#
+# Test that state instances are recycled safely
+#
+
+import pytest
+
+from simulated_agency.agents import Locatable
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.states import State
+
+
+#
+# Fixtures
+#
+
+class Left(State):
+    def handle(self):
+        super().handle()
+        self.agent.replace_state(Right)
+
+class Right(State):
+    def handle(self):
+        super().handle()
+        self.agent.replace_state(Left)
+
+class Marked(State):
+    marked = False
+    def handle(self):
+        super().handle()
+        self.marked = True
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=10)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Locatable):
+        pass
+    simulation.bind(Agent)
+    return Agent
+
+#
+# Tests
+#
+
+def test_states_are_reused_after_the_tick(simulation, Agent):
+    agent = Agent(simulation.locations[0, 0], Left)
+    first = agent.current_state_instance()
+    simulation.step()
+    # Not reused during the tick it was retired in
+    assert simulation.state_pool.pools[Left] == [first]
+    assert first.agent is None
+    simulation.step()
+    assert agent.current_state_instance() is first
+    assert first.agent is agent
+    assert first.age == 0
+    assert simulation.state_pool.reused == 1
+
+def test_states_back_on_the_stack_are_not_pooled(simulation, Agent):
+    agent = Agent(simulation.locations[0, 0], Left)
+    state = agent.current_state_instance()
+    agent.replace_state_instance(state)
+    agent.remove_state()
+    agent.add_state(Right)
+    agent.replace_state_instance(state)
+    simulation.state_pool.end_tick()
+    assert state.agent is agent
+    assert state not in simulation.state_pool.pools.get(Left, [])
+
+def test_parameters_are_replaced(simulation, Agent):
+    agent = Agent(simulation.locations[0, 0], Left, colour='red')
+    agent.replace_state(Right)
+    simulation.state_pool.end_tick()
+    agent.replace_state(Left)
+    assert agent.current_state_instance().context == {}
+
+def test_instance_attributes_are_forgotten(simulation, Agent):
+    agent = Agent(simulation.locations[0, 0], Marked)
+    simulation.step()
+    agent.replace_state(Right)
+    simulation.state_pool.end_tick()
+    agent.replace_state(Marked)
+    assert agent.current_state_instance().marked is False
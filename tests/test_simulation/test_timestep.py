@@ -0,0 +1,33 @@
+#
+# Test the fixed timestep scheduler
+#
+
+import pytest
+
+from simulated_agency.simulation.timestep import FixedTimestep
+
+
+def test_one_tick_per_frame_at_the_frame_rate():
+    timestep = FixedTimestep(60)
+    assert sum(timestep.advance(1 / 60) for _ in range(60)) == 60
+    assert timestep.backlog == 0
+
+def test_several_ticks_per_frame():
+    # 1000 ticks per second, looking at every 30th tick
+    timestep = FixedTimestep(1000)
+    assert timestep.advance(0.03) == 30
+    assert timestep.advance(0.03) == 30
+
+def test_no_ticks_for_fast_frames():
+    timestep = FixedTimestep(10)
+    assert [timestep.advance(0.05) for _ in range(4)] == [0, 1, 0, 1]
+
+def test_backlog_when_falling_behind():
+    timestep = FixedTimestep(100, max_ticks_per_frame=5)
+    assert timestep.advance(0.1) == 5
+    assert timestep.backlog == 5
+    assert timestep.lag == pytest.approx(0.05)
+    # Too far behind to catch up, so some ticks are dropped
+    timestep.advance(2.0)
+    assert timestep.lag == pytest.approx(timestep.max_lag)
+    assert timestep.stats()['dropped'] == 100
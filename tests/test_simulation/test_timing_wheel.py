@@ -0,0 +1,121 @@
+#
+# Test the timing wheel and state timers
+#
+
+import pytest
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.simulation.timing_wheel import TimingWheel
+from simulated_agency.states import State, Wait
+
+
+#
+# Fixtures
+#
+
+class Idle(State):
+    def handle(self):
+        super().handle()
+        self.agent.handled += 1
+
+class Pause(Wait):
+    dormant = True
+
+class Counting(Wait):
+    def handle(self):
+        super().handle()
+        self.agent.handled += 1
+
+@pytest.fixture
+def wheel():
+    return TimingWheel(slots=4, levels=2)
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=10)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Mobile):
+        handled = 0
+    simulation.bind(Agent)
+    return Agent
+
+#
+# Tests
+#
+
+def test_items_are_returned_when_due(wheel):
+    # Due ticks on every level, and beyond the top level
+    for due in (30, 2, 7, 2, 16, 5):
+        wheel.schedule(due, due)
+    assert len(wheel) == 6
+    fired = []
+    for now in range(1, 40):
+        for due in wheel.advance(now):
+            assert due == now
+            fired.append(due)
+    assert fired == [2, 2, 5, 7, 16, 30]
+    assert len(wheel) == 0
+
+def test_cancelled_items_are_not_returned(wheel):
+    key = wheel.schedule(20, 'cancelled')
+    wheel.schedule(20, 'kept')
+    wheel.cancel(key)
+    assert key not in wheel
+    assert wheel.advance(20) == ['kept']
+    # Cancelling twice does nothing
+    wheel.cancel(key)
+
+def test_overdue_items_are_returned_next(wheel):
+    wheel.advance(10)
+    wheel.schedule(3, 'late')
+    assert wheel.advance(11) == ['late']
+
+def test_state_timer_times_out(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    agent.add_state(Idle, timer=3)
+    timed = agent.current_state_instance()
+    simulation.step()
+    assert timed.timer == 2
+    simulation.step()
+    simulation.step()
+    assert agent.current_state_instance() is not timed
+
+def test_covered_timers_are_paused(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle, timer=2)
+    timed = agent.current_state_instance()
+    simulation.step()
+    agent.add_state(Idle)
+    for _ in range(5):
+        simulation.step()
+    assert timed.timer == 1
+    agent.remove_state()
+    simulation.step()
+    assert agent.current_state_instance() is not timed
+    assert len(simulation.timers) == 0
+
+def test_dormant_waiting_agents_are_not_run(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    agent.add_state(Pause, timer=3)
+    simulation.step()
+    assert agent.is_dormant()
+    simulation.step()
+    simulation.step()
+    # Woken by the timeout, back in time for the next tick
+    assert not agent.is_dormant()
+    simulation.step()
+    assert agent.handled == 1
+    assert agent.age == 4
+
+def test_waiting_agents_are_run_unless_dormant(simulation, Agent):
+    agent = Agent(simulation.locations[1, 1], Idle)
+    # Existing subclasses carry on being run while they wait
+    agent.add_state(Counting, timer=3)
+    for _ in range(3):
+        simulation.step()
+        assert not agent.is_dormant()
+    assert agent.handled == 3
+    simulation.step()
+    assert agent.is_in_state(Idle)
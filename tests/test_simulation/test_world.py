@@ -0,0 +1,167 @@
+#
+# Test the array-backed world
+#
+
+import pytest
+
+from simulated_agency.agents import Locatable, Mobile
+from simulated_agency.location import Location
+from simulated_agency.simulation.simulation import Simulation
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def simulation():
+    return Simulation(width=10, height=8)
+
+@pytest.fixture
+def Agent(simulation):
+    class Agent(Mobile):
+        pass
+    Agent.simulation = simulation
+    return Agent
+
+#
+# Tests
+#
+
+def test_indexing(simulation):
+    world = simulation.world
+    assert len(world) == 80
+    assert world.index(3, 2) == 23
+    assert world.coordinates(23) == (3, 2)
+    location = simulation.locations[3, 2]
+    assert (location.x, location.y, location.index) == (3, 2, 23)
+    assert (3, 2) in simulation.locations
+    assert (10, 2) not in simulation.locations
+    with pytest.raises(KeyError):
+        simulation.locations[10, 2]
+
+def test_views_are_reused(simulation):
+    assert simulation.locations[4, 4] is simulation.locations[4, 4]
+    assert simulation.world.location(44) is simulation.locations[4, 4]
+    assert len(list(simulation.locations.values())) == 80
+
+def test_location_is_a_view(simulation):
+    Location.simulation = simulation
+    location = Location(2, 2, capacity=3)
+    assert simulation.locations[2, 2].capacity == 3
+    assert simulation.world.capacity[22] == 3
+    location.colour = (255, 0, 0)
+    assert simulation.locations[2, 2].colour == (255, 0, 0)
+    assert simulation.locations[3, 2].colour is None
+
+def test_mass_and_occupancy(simulation, Agent):
+    world = simulation.world
+    agent = Agent(simulation.locations[1, 1])
+    assert world.mass[11] == 1
+    assert world.occupancy[11] == 1
+    assert simulation.locations[1, 1].contents == [agent]
+    agent._relocate(simulation.locations[2, 1])
+    assert world.mass[11] == 0
+    assert world.occupancy[11] == 0
+    assert world.occupancy[12] == 1
+    agent.destroy()
+    assert world.occupancy.sum() == 0
+    assert world.contents == {}
+
+def test_obstruction_rectangle(simulation):
+    simulation.create_obstruction_rectangle(1, 2, 3, 2)
+    assert simulation.locations[1, 2].capacity == 0
+    assert simulation.locations[3, 3].capacity == 0
+    assert simulation.locations[4, 3].capacity == 1
+    assert simulation.locations[1, 4].capacity == 1
+    assert simulation.locations[2, 3].colour == (255, 255, 0)
+    assert simulation.world.capacity.sum() == 80 - 6
+
+def test_class_counts(simulation, Agent):
+    class Other(Locatable):
+        simulation = Agent.simulation
+        mass = 0.5
+    location = simulation.locations[5, 5]
+    location.capacity = 2
+    agent = Agent(location)
+    other = Other(location)
+    assert location.count(Agent) == 1
+    assert location.count(Other) == 1
+    assert location.mass() == 1.5
+    # There is room for another Other, but not another Agent
+    assert location.can_fit(Other) is True
+    assert location.can_fit(Agent) is False
+    agent._relocate(simulation.locations[6, 5])
+    assert location.count(Agent) == 0
+    assert simulation.locations[6, 5].count(Agent) == 1
+    other.destroy()
+    assert location.count(Other) == 0
+    assert location.mass() == 0
+
+
+#
+# Sparse worlds
+#
+
+@pytest.fixture
+def sparse_simulation():
+    return Simulation(width=10000, height=10000, sparse=True)
+
+def test_sparse_stores_nothing_by_default(sparse_simulation):
+    world = sparse_simulation.world
+    assert world.sparse is True
+    assert len(world) == 10000 * 10000
+    location = sparse_simulation.random_location()
+    assert location.capacity == 1
+    assert location.contents == []
+    assert world.capacity == {} and world.mass == {} and world.contents == {}
+
+def test_sparse_views(sparse_simulation):
+    location = sparse_simulation.locations[5000, 5000]
+    # The same view is returned while it is in use
+    assert sparse_simulation.locations[5000, 5000] is location
+    assert location.up() is sparse_simulation.locations[5000, 4999]
+    assert location.neighbourhood() == {
+        sparse_simulation.locations[x, y]
+        for x, y in [(5000, 5000), (4999, 5000), (5001, 5000), (5000, 4999), (5000, 5001)]
+    }
+
+def test_sparse_agents(sparse_simulation):
+    class Agent(Mobile):
+        simulation = sparse_simulation
+    world = sparse_simulation.world
+    sparse_simulation.seed(Agent, 100, None)
+    assert len(Agent.objects) == 100
+    assert len(world.contents) == 100
+    agent = Agent.objects[0]
+    start = agent.location
+    assert start.count(Agent) == 1
+    assert start.can_fit(Agent) is False
+    agent.move_to_location(start.right())
+    assert start.contents == []
+    assert start.index not in world.mass
+    assert agent.location.count(Agent) == 1
+
+def test_sparse_capacity(sparse_simulation):
+    world = sparse_simulation.world
+    sparse_simulation.create_obstruction_rectangle(10, 10, 3, 2)
+    assert len(world.capacity) == 6
+    assert sparse_simulation.locations[11, 11].capacity == 0
+    assert sparse_simulation.locations[11, 11].colour == (255, 255, 0)
+    # Restoring the default forgets the cell again
+    sparse_simulation.locations[11, 11].capacity = 1
+    assert len(world.capacity) == 5
+
+@pytest.mark.parametrize('sparse', [False, True], ids=['dense', 'sparse'])
+def test_rectangles_and_colours_match_between_worlds(sparse):
+    simulation = Simulation(width=10, height=8, sparse=sparse)
+    # Rectangles are clipped, rather than counted from the far edge
+    simulation.create_obstruction_rectangle(-2, 0, 5, 1)
+    blocked = [x for x in range(10) if simulation.locations[x, 0].capacity == 0]
+    assert blocked == [0, 1, 2]
+    simulation.create_obstruction_rectangle(8, -3, 5, 4)
+    assert [simulation.locations[x, 0].capacity for x in (7, 8, 9)] == [1, 0, 0]
+    assert simulation.locations[9, 1].capacity == 1
+    # Alpha is accepted, and dropped
+    simulation.locations[5, 5].colour = (1, 2, 3, 255)
+    assert simulation.locations[5, 5].colour == (1, 2, 3)
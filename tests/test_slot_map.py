@@ -0,0 +1,92 @@
+#
+# Test the slot map used for agents' object lists
+#
+
+from simulated_agency.agents import Mobile
+from simulated_agency.simulation.simulation import Simulation
+from simulated_agency.slot_map import SlotMap
+from simulated_agency.states import State
+
+
+#
+# Tests
+#
+
+def test_add_discard_and_purge():
+    slot_map = SlotMap()
+    handles = [slot_map.add(item) for item in 'abcde']
+    slot_map.discard(handles[1])
+    slot_map.discard(handles[4])
+    # Discarded items disappear straight away
+    assert len(slot_map) == 3
+    assert list(slot_map) == ['a', 'c', 'd']
+    assert slot_map[1] == 'c'
+    # And purging only changes the order
+    slot_map.purge()
+    assert sorted(slot_map) == ['a', 'c', 'd']
+    assert [handle.get() for handle in handles] == ['a', None, 'c', 'd', None]
+
+def test_handles_outlive_their_slots():
+    slot_map = SlotMap()
+    old = slot_map.add('old')
+    slot_map.discard(old)
+    slot_map.purge()
+    new = slot_map.add('new')
+    # The slot is reused, but the old handle knows its item has gone
+    assert new.slot == old.slot
+    assert not old.alive
+    assert old.get() is None
+    assert new.get() == 'new'
+    # Discarding twice does nothing
+    slot_map.discard(old)
+    assert slot_map == ['new']
+
+def test_destroyed_agents_are_purged_at_the_end_of_the_tick():
+
+    class Idle(State):
+        def handle(self):
+            super().handle()
+
+    simulation = Simulation(width=10, height=10)
+
+    class Agent(Mobile):
+        pass
+
+    simulation.bind(Agent)
+    agents = [Agent(simulation.locations[x, 0], Idle) for x in range(5)]
+    handle = agents[2].ref
+    agents[2].destroy()
+    agents[2].destroy()
+    assert handle.get() is None
+    assert len(Agent.objects) == 4
+    assert Agent.objects._discarded
+    simulation.step()
+    assert not Agent.objects._discarded
+    assert agents[2].age == 0
+    assert all(agent.age == 1 for agent in Agent.objects)
+
+def test_agents_only_keep_their_slot():
+
+    class Idle(State):
+        def handle(self):
+            super().handle()
+
+    simulation = Simulation(width=10, height=10)
+
+    class Agent(Mobile):
+        pass
+
+    simulation.bind(Agent)
+    agent, other = [Agent(simulation.locations[x, 0], Idle) for x in range(2)]
+    # Handles are made on demand, and compare equal
+    assert 'ref' not in vars(agent)
+    assert agent.ref == agent.ref and agent.ref != other.ref
+    assert agent.ref.get() is agent
+    handle = agent.ref
+    agent.destroy()
+    simulation.step()
+    # The slot is reused, but neither handle is fooled
+    new = Agent(simulation.locations[5, 5], Idle)
+    assert new.slot == agent.slot
+    assert handle.get() is None and agent.ref.get() is None
+    assert new.ref.get() is new
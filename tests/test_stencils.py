@@ -0,0 +1,63 @@
+
+#
+# Test the neighbourhood stencils
+#
+
+import pytest
+
+from simulated_agency.simulation import Simulation
+from simulated_agency.stencils import compile_stencil as stencil, register_stencil, stencil_builders
+
+
+def test_stencils_are_shared():
+    sim = Simulation(width=10, height=10)
+    sim.neighbourhood_strategy = 'moore'
+    assert sim.stencil(2) is sim.stencil(2)
+    assert sim.stencil(2) is not sim.stencil(2, border_only=True)
+    assert len(stencil('moore', 2)) == 25
+    assert len(stencil('moore', 2, border_only=True)) == 16
+    assert len(stencil('von_neumann', 2)) == 13
+
+def test_bad_stencils():
+    with pytest.raises(Exception):
+        stencil('moore', 0)
+    with pytest.raises(Exception):
+        stencil('no_such_strategy', 1)
+
+def test_hexagonal():
+    hexagonal = stencil('hexagonal', 1)
+    assert set(hexagonal.offsets_for(0)) == {
+        (0, 0), (-1, 0), (1, 0), (-1, -1), (0, -1), (-1, 1), (0, 1)
+    }
+    assert set(hexagonal.offsets_for(1)) == {
+        (0, 0), (-1, 0), (1, 0), (0, -1), (1, -1), (0, 1), (1, 1)
+    }
+    # Hexagonal rings of radius r have 6r cells
+    assert len(stencil('hexagonal', 3, border_only=True)) == 18
+
+def test_custom_stencil():
+    @register_stencil('horizontal')
+    def horizontal(radius, border_only):
+        return [(dx, 0) for dx in range(-radius, radius + 1)]
+    try:
+        sim = Simulation(width=10, height=10)
+        sim.neighbourhood_strategy = 'horizontal'
+        l = sim.locations
+        assert l[0, 5].neighbourhood() == { l[9, 5], l[0, 5], l[1, 5] }
+        # Re-registering the strategy replaces the cached stencil
+        register_stencil('horizontal')(lambda radius, border_only: [(0, 0)])
+        assert l[0, 5].neighbourhood() == { l[0, 5] }
+    finally:
+        del stencil_builders['horizontal']
+
+def test_large_stencils_match_small():
+    sim = Simulation(width=10, height=10)
+    sim.wrap_x = False
+    sim.neighbourhood_strategy = 'moore'
+    location = sim.locations[1, 1]
+    # Radius 3 is applied in Python, radius 20 with arrays, but
+    # both cover the whole of this small world
+    assert len(location.neighbourhood(radius=20)) == 100
+    assert location.neighbourhood(radius=3) == {
+        sim.locations[x, y % 10] for x in range(0, 5) for y in range(-2, 5)
+    }